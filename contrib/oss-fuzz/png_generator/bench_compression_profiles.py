@@ -0,0 +1,108 @@
+# bench_compression_profiles.py
+"""
+测量 libpng 在不同 zlib 压缩配置下的解码吞吐量。
+
+    python bench_compression_profiles.py --size 1024x1024 --profiles sweep
+    python bench_compression_profiles.py --seeds ../../../randPNG_seeds
+"""
+import argparse
+import json
+import os
+import random
+import struct
+import time
+
+from libpng_ctypes import LibPNG
+from png_generator_utils import (
+    compress_with_profile,
+    compression_profile_sweep,
+    parse_compression_profile,
+    png_chunk
+)
+
+def synthetic_scanlines(width, height, seed=0):
+    """RGB 8 位图像：渐变加少量噪声，每行以过滤类型 0 开头。"""
+    rng = random.Random(seed)
+    row_size = width * 3
+    noise = rng.getrandbits(8 * row_size).to_bytes(row_size, 'big')
+    first = bytes((i * 255 // max(row_size - 1, 1) + (noise[i] & 0x0f)) & 0xff for i in range(row_size))
+    # 后续行由首行循环平移得到，避免逐像素生成整幅图的开销
+    raw = bytearray()
+    for y in range(height):
+        shift = (y * 3) % row_size
+        raw += b'\x00' + first[shift:] + first[:shift]
+    return bytes(raw)
+
+def build_png(width, height, raw, profile):
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + png_chunk(b'IHDR', ihdr)
+            + png_chunk(b'IDAT', compress_with_profile(raw, profile)) + png_chunk(b'IEND', b''))
+
+def time_decode(libpng, data, repeat):
+    """返回 (最短一次解码耗时, DecodeResult)。"""
+    best = None
+    out = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = libpng.decode(data, out=out)
+        elapsed = time.perf_counter() - start
+        if result.ok:
+            out = result.pixels.obj
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_synthetic(libpng, profiles, width, height, repeat):
+    raw = synthetic_scanlines(width, height)
+    print(f"{'profile':<24} {'size':>10} {'ratio':>7} {'decode MB/s':>12}")
+    for profile in profiles:
+        data = build_png(width, height, raw, profile)
+        elapsed, result = time_decode(libpng, data, repeat)
+        if not result.ok:
+            print(f"{profile.name:<24} {len(data):>10} {'':>7} {'error: ' + result.message:>12}")
+            continue
+        mbps = len(raw) / elapsed / 1e6
+        print(f"{profile.name:<24} {len(data):>10} {len(raw) / len(data):>7.2f} {mbps:>12.1f}")
+
+def bench_seeds(libpng, seed_dir, repeat):
+    """按 manifest.jsonl 中记录的压缩配置统计种子的解码吞吐量。"""
+    stats = {}
+    with open(os.path.join(seed_dir, 'manifest.jsonl')) as manifest:
+        for line in manifest:
+            entry = json.loads(line)
+            path = os.path.join(seed_dir, entry['file'])
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            elapsed, result = time_decode(libpng, data, repeat)
+            count, ok, size, total = stats.get(entry['compression_profile'], (0, 0, 0, 0.0))
+            stats[entry['compression_profile']] = (count + 1, ok + result.ok, size + len(data), total + elapsed)
+    print(f"{'profile':<24} {'seeds':>6} {'ok':>6} {'seeds/s':>10} {'input MB/s':>11}")
+    for name, (count, ok, size, total) in sorted(stats.items()):
+        print(f"{name:<24} {count:>6} {ok:>6} {count / total:>10.0f} {size / total / 1e6:>11.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark libpng decoding per zlib compression profile.')
+    parser.add_argument('--libpng', default=None, help='path to the libpng shared library')
+    parser.add_argument('--size', default='512x512', help='synthetic image size WxH')
+    parser.add_argument('--repeat', type=int, default=5, help='decodes per image (best time is kept)')
+    parser.add_argument('--profiles', default='sweep',
+                        help="comma-separated profile names, or 'sweep' for all presets")
+    parser.add_argument('--seeds', default=None,
+                        help='seed directory with manifest.jsonl; benchmarks the seeds instead')
+    args = parser.parse_args()
+
+    libpng = LibPNG(args.libpng)
+    print(f"libpng {libpng.version()} ({libpng.path})")
+    if args.seeds:
+        bench_seeds(libpng, args.seeds, args.repeat)
+        return
+    width, height = (int(v) for v in args.size.lower().split('x'))
+    if args.profiles == 'sweep':
+        profiles = compression_profile_sweep()
+    else:
+        profiles = [parse_compression_profile(name) for name in args.profiles.split(',')]
+    bench_synthetic(libpng, profiles, width, height, args.repeat)
+
+if __name__ == "__main__":
+    main()
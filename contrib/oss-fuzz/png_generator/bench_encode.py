@@ -0,0 +1,216 @@
+# bench_encode.py
+"""
+测量 libpng 写 PNG (pngwrite.c/pngwutil.c) 在不同过滤器与压缩设置下的编码吞吐量、
+输出大小和 libpng 堆内存峰值。输入为合成图像，或由已有 PNG 解码 (png_set_expand) 得到的像素。
+
+设置写作 FILTERS/PROFILE[/bSIZE]：
+    FILTERS  png_set_filter 的过滤器组合，如 paeth、sub+up、all；default 为 libpng 的默认选择
+    PROFILE  png_generator_utils 的压缩配置名称，如 l9-rle-w12 (不支持 -s 拆分)；
+             default 表示级别、策略、窗口都用 libpng 的默认值 (ld、default、w15 也分别表示默认值)
+    bSIZE    png_set_compression_buffer_size
+
+    python bench_encode.py --size 1024x1024 -j 8
+    python bench_encode.py --images ../../pngsuite --settings default/default,paeth/l9-default-w15,all/l1-rle-w15
+    python bench_encode.py --json today.json --compare yesterday.json
+"""
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from libpng_ctypes import LibPNGShim, build_shim, find_libpng, parse_filters, parse_transforms
+from png_generator_utils import COMPRESSION_STRATEGIES, iter_files, parse_compression_profile
+
+DEFAULT_SETTINGS = (
+    [f'{filters}/default' for filters in ('default', 'none', 'sub', 'up', 'avg', 'paeth', 'all')]
+    + [f'default/l{level}-default-w15' for level in (0, 1, 3, 6, 9)]
+    + [f'default/l6-{strategy}-w15' for strategy in COMPRESSION_STRATEGIES if strategy != 'default']
+    + ['default/l6-default-w9', 'default/l6-default-w12']
+    + [f'default/default/b{size}' for size in (1024, 65536, 262144)]
+)
+
+# 合成图像的格式: 名称 -> (颜色类型, 位深, 通道数)
+SYNTHETIC_FORMATS = {
+    'gray8': (0, 8, 1),
+    'rgb8': (2, 8, 3),
+    'rgba8': (6, 8, 4),
+    'rgb16': (2, 16, 3),
+    'rgba16': (6, 16, 4),
+}
+
+# png_set_expand 之后的通道数 -> 颜色类型
+_CHANNEL_COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+
+EncodeSetting = collections.namedtuple('EncodeSetting', 'name filters level strategy window_bits buffer_size')
+
+Image = collections.namedtuple('Image', 'name pixels width height bit_depth color_type')
+
+def parse_setting(name):
+    filters, _, rest = name.partition('/')
+    profile_name, _, buffer_size = rest.partition('/')
+    profile = parse_compression_profile(profile_name or 'default')
+    if profile.split:
+        raise ValueError(f"'{name}': libpng cannot split the stream with full flushes")
+    if buffer_size and not buffer_size.startswith('b'):
+        raise ValueError(f"'{name}': the buffer size is written as bSIZE")
+    return EncodeSetting(
+        name,
+        parse_filters(filters or 'default'),
+        None if profile.level < 0 else profile.level,
+        None if profile.strategy == 'default' else COMPRESSION_STRATEGIES[profile.strategy],
+        None if profile.wbits == 15 else profile.wbits,
+        int(buffer_size[1:]) if buffer_size else None,
+    )
+
+def synthetic_image(name, width, height, seed=0):
+    """渐变加噪声：首行随机生成，后续行由首行循环平移得到。"""
+    color_type, bit_depth, channels = SYNTHETIC_FORMATS[name]
+    rng = random.Random(seed)
+    row_size = width * channels * bit_depth // 8
+    noise = rng.getrandbits(8 * row_size).to_bytes(row_size, 'big')
+    first = bytes((i * 255 // max(row_size - 1, 1) + (noise[i] & 0x0f)) & 0xff for i in range(row_size))
+    pixel_size = channels * bit_depth // 8
+    rows = []
+    for y in range(height):
+        shift = (y * pixel_size) % row_size
+        rows.append(first[shift:] + first[:shift])
+    return Image(f'{name}-{width}x{height}', b''.join(rows), width, height, bit_depth, color_type)
+
+def corpus_images(shim, paths):
+    """把 PNG 文件解码成 8/16 位的灰度/RGB(A) 像素 (调色板与 tRNS 被展开)。"""
+    expand = parse_transforms('expand')
+    for file in iter_files(paths):
+        with open(file, 'rb') as f:
+            result = shim.decode_transformed(f.read(), expand, keep_pixels=True)
+        if result.pixels is None or result.end_error:
+            continue
+        yield Image(os.path.basename(file), result.pixels, result.width, result.height,
+                    result.out_bit_depth, _CHANNEL_COLOR_TYPES[result.out_channels])
+
+_shim = None
+_images = None
+_repeat = 1
+
+def _init_worker(libpng_path, images, repeat):
+    global _shim, _images, _repeat
+    _shim = LibPNGShim(libpng_path)
+    _images = images
+    _repeat = repeat
+
+def bench_one(job):
+    """用一个设置编码一幅图像 repeat 次，返回 (设置, 图像, 输入字节, 输出字节, 最短耗时, 内存峰值, 错误)。"""
+    setting, image_index = job
+    image = _images[image_index]
+    best = None
+    for _ in range(_repeat):
+        start = time.perf_counter()
+        result = _shim.encode(image.pixels, image.width, image.height, image.bit_depth, image.color_type,
+                              filters=setting.filters, level=setting.level, strategy=setting.strategy,
+                              window_bits=setting.window_bits, buffer_size=setting.buffer_size)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        if result.data is None:
+            return setting.name, image.name, len(image.pixels), 0, best, 0, result.message
+    return setting.name, image.name, len(image.pixels), len(result.data), best, result.peak_memory, None
+
+def summarize(records):
+    """按设置汇总：{设置: {images, errors, input, output, seconds, peak_memory}}。"""
+    summary = collections.OrderedDict()
+    for name, _, raw_size, size, seconds, peak, error in records:
+        entry = summary.setdefault(name, {'images': 0, 'errors': 0, 'input': 0, 'output': 0,
+                                          'seconds': 0.0, 'peak_memory': 0})
+        entry['images'] += 1
+        if error is not None:
+            entry['errors'] += 1
+            continue
+        entry['input'] += raw_size
+        entry['output'] += size
+        entry['seconds'] += seconds
+        entry['peak_memory'] = max(entry['peak_memory'], peak)
+    for entry in summary.values():
+        entry['mbps'] = entry['input'] / entry['seconds'] / 1e6 if entry['seconds'] else 0.0
+    return summary
+
+def regressions(summary, baseline, tolerance):
+    """与之前的 --json 结果相比编码速度下降超过 tolerance (比例) 的设置。"""
+    found = []
+    for name, entry in summary.items():
+        old = baseline.get(name)
+        if old and old['mbps'] and entry['mbps'] < old['mbps'] * (1 - tolerance):
+            found.append((name, old['mbps'], entry['mbps']))
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark libpng encoding per filter and compression setting.')
+    parser.add_argument('--settings', default=None,
+                        help='comma-separated settings FILTERS/PROFILE[/bSIZE]; default: a built-in sweep')
+    parser.add_argument('--size', default='512x512', help='synthetic image size WxH')
+    parser.add_argument('--formats', default='gray8,rgb8,rgba8,rgb16',
+                        help=f"synthetic image formats ({', '.join(SYNTHETIC_FORMATS)})")
+    parser.add_argument('--images', nargs='*', default=[],
+                        help='PNG files or directories (searched recursively) to re-encode instead of synthetic images')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--repeat', type=int, default=3, help='encodes per image and setting (best time is kept)')
+    parser.add_argument('--libpng', default=None, help='path to the libpng shared library')
+    parser.add_argument('--json', default=None, help='write the per-setting results to this file')
+    parser.add_argument('--compare', default=None, help='earlier --json results to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='encode MB/s drop that counts as a regression (default: 0.1)')
+    args = parser.parse_args()
+
+    try:
+        settings = [parse_setting(name) for name in (args.settings.split(',') if args.settings
+                                                     else DEFAULT_SETTINGS)]
+    except ValueError as e:
+        parser.error(str(e))
+    libpng_path = find_libpng(args.libpng)
+    build_shim(libpng_path)  # 先在主进程编译好，worker 直接载入缓存
+    shim = LibPNGShim(libpng_path)
+    if args.images:
+        images = list(corpus_images(shim, args.images))
+    else:
+        width, height = (int(v) for v in args.size.lower().split('x'))
+        images = [synthetic_image(name, width, height) for name in args.formats.split(',')]
+    if not images:
+        sys.exit('error: no images to encode')
+
+    total_input = sum(len(image.pixels) for image in images)
+    print(f"libpng {shim.version()} ({libpng_path}): {len(images)} images, {total_input / 1e6:.1f} MB, "
+          f"{len(settings)} settings, {args.jobs} workers")
+    jobs = [(setting, index) for setting in settings for index in range(len(images))]
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.jobs, initializer=_init_worker,
+                              initargs=(libpng_path, images, args.repeat)) as pool:
+        records = pool.map(bench_one, jobs, chunksize=max(1, len(jobs) // (args.jobs * 8)))
+    elapsed = time.perf_counter() - start
+    summary = summarize(records)
+
+    print(f"{'setting':<28} {'images':>6} {'errors':>6} {'encode MB/s':>12} {'output':>11} {'ratio':>7} "
+          f"{'peak heap':>10}")
+    for name, entry in summary.items():
+        ratio = entry['input'] / entry['output'] if entry['output'] else 0.0
+        print(f"{name:<28} {entry['images']:>6} {entry['errors']:>6} {entry['mbps']:>12.1f} "
+              f"{entry['output']:>11} {ratio:>7.2f} {entry['peak_memory'] / 1024:>8.0f}kB")
+    print(f'{len(records)} encodes in {elapsed:.1f}s')
+    for name, _, _, _, _, _, error in records:
+        if error is not None:
+            print(f'{name}: {error}')
+            break
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            found = regressions(summary, json.load(f), args.tolerance)
+        for name, old, new in found:
+            print(f'regression: {name}: {old:.1f} -> {new:.1f} MB/s')
+        if found:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# bench_entropy_pool.py
+"""
+对比引入 EntropyPool 之前与现在的 png_generator1.PNG：各随机负载数据块的生成耗时，
+以及打开这些数据块时每个种子的生成耗时。
+
+"之前"的代码取自 git 历史中第一次加入 EntropyPool 的提交的父提交
+(当时负载逐字节调用 random.randint 并用 bytes += 拼接)，也可以用 --before 指定。
+
+    python bench_entropy_pool.py
+    python bench_entropy_pool.py --before HEAD~5 -n 500
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+import types
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+sys.path.insert(0, _REPO_ROOT)
+import png_generator1
+
+# 打开所有用到随机负载的数据块，并保证有一个调色板
+_CRITICAL = {'IHDR': 0, 'PLTE': 0, 'IDAT': 0, 'IEND': 0}
+_ANCILLARY = {'sPLT': 0, 'hIST': 0, 'tRNS': 0, 'dSIG': 0}
+
+# (名称, PNG 的方法)
+_PAYLOAD_CHUNKS = [('PLTE', 'add_plte_chunk'), ('hIST', 'add_hist_chunk'), ('sPLT', 'add_splt_chunk'),
+                   ('dSIG', 'add_dsig_chunk'), ('tRNS', 'add_trns_chunk')]
+
+def _git(*args):
+    return subprocess.run(['git', '-C', _REPO_ROOT, *args], check=True, capture_output=True, text=True).stdout
+
+def default_before_revision():
+    """第一次加入 EntropyPool 的提交的父提交。"""
+    commits = _git('log', '--format=%H', '-S', 'class EntropyPool', '--', 'png_generator1.py').split()
+    if not commits:
+        raise RuntimeError('no commit adds EntropyPool to png_generator1.py')
+    return f'{commits[-1]}^'
+
+def load_generator(revision):
+    """把 revision 版本的 png_generator1.py 载入为一个独立的模块。"""
+    source = _git('show', f'{revision}:png_generator1.py')
+    module = types.ModuleType(f'png_generator1@{revision}')
+    module.__file__ = os.path.join(_REPO_ROOT, 'png_generator1.py')
+    exec(compile(source, f'png_generator1.py@{revision}', 'exec'), module.__dict__)
+    return module
+
+def make_png(module, seed):
+    """用 module 的 PNG 生成一个种子；旧版本只用全局 random 模块。"""
+    random.seed(seed)
+    if hasattr(module, 'EntropyPool'):
+        return module.PNG(critical_chunk_config=_CRITICAL, ancillary_chunk_config=_ANCILLARY,
+                          rng=random.Random(seed))
+    return module.PNG(critical_chunk_config=_CRITICAL, ancillary_chunk_config=_ANCILLARY)
+
+def time_per_seed(module, seeds):
+    start = time.perf_counter()
+    for seed in range(seeds):
+        make_png(module, seed)
+    return (time.perf_counter() - start) / seeds
+
+def time_chunk(module, method, repeat):
+    """在一个带调色板的种子上反复生成同一个数据块。"""
+    png = make_png(module, 0)
+    while png.color_type != 3:
+        png = make_png(module, random.randrange(1 << 32))
+    data = png.data
+    add_chunk = getattr(png, method)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        png.data = data
+        add_chunk(0)
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare payload generation before and after the entropy pool.')
+    parser.add_argument('-n', '--seeds', type=int, default=2000, help='number of seeds to time')
+    parser.add_argument('--repeat', type=int, default=200, help='generations per chunk type')
+    parser.add_argument('--before', default=None,
+                        help='git revision of png_generator1.py to compare against '
+                             '(default: the parent of the commit that added EntropyPool)')
+    args = parser.parse_args()
+
+    revision = args.before or default_before_revision()
+    before_module = load_generator(revision)
+    print(f"before: png_generator1.py at {_git('rev-parse', '--short', revision).strip()}, after: working tree")
+    print(f"{'chunk':<12} {'before us':>10} {'after us':>10} {'speedup':>8}")
+    for name, method in _PAYLOAD_CHUNKS:
+        before = time_chunk(before_module, method, args.repeat)
+        after = time_chunk(png_generator1, method, args.repeat)
+        print(f"{name:<12} {before * 1e6:>10.1f} {after * 1e6:>10.1f} {before / after:>7.1f}x")
+
+    before = time_per_seed(before_module, args.seeds)
+    after = time_per_seed(png_generator1, args.seeds)
+    print(f"{'per seed':<12} {before * 1e6:>10.1f} {after * 1e6:>10.1f} {before / after:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
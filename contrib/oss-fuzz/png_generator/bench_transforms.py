@@ -0,0 +1,199 @@
+# bench_transforms.py
+"""
+测量 libpng 在不同 png_set_* 变换组合下的解码吞吐量 (经 libpng_shim.c 调用完整读取 API)。
+按 (颜色类型, 位深, 变换组合) 汇总，并与同一批输入不做变换 (none) 的解码耗时比较，
+标出明显变慢或只在该变换下出错的组合。
+
+    python bench_transforms.py ../../../randPNG_seeds ../../../contrib/pngsuite -j 8
+    python bench_transforms.py seeds --transforms none,expand+strip_16,expand+gray_to_rgb+filler
+"""
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import time
+
+from libpng_ctypes import SHIM_TRANSFORMS, LibPNGShim, build_shim, find_libpng, parse_transforms
+from png_generator_utils import iter_files
+
+# 默认的变换矩阵：单个变换以及应用程序常用的几种组合
+DEFAULT_MATRIX = [
+    'none',
+    'expand',
+    'expand_16',
+    'strip_16',
+    'scale_16',
+    'gray_to_rgb',
+    'rgb_to_gray',
+    'gamma',
+    'background',
+    'alpha_mode',
+    'filler',
+    'expand+strip_16',
+    'expand+gray_to_rgb',
+    'expand+gamma',
+    'expand+background',
+    'expand+alpha_mode+scale_16',
+    'expand+gray_to_rgb+filler+scale_16',
+    'expand_16+gamma+swap',
+]
+
+COLOR_TYPE_NAMES = {0: 'gray', 2: 'rgb', 3: 'palette', 4: 'gray-alpha', 6: 'rgba'}
+
+_shim = None
+_matrix = None
+
+def _init_worker(libpng_path, matrix, repeat):
+    global _shim, _matrix
+    _shim = LibPNGShim(libpng_path)
+    _matrix = [(name, parse_transforms(name)) for name in matrix], repeat
+
+def _ihdr_format(data):
+    """文件中的 (颜色类型, 位深)；不是以 IHDR 开头的 PNG 时返回 None。"""
+    if len(data) < 29 or data[12:16] != b'IHDR':
+        return None
+    return data[25], data[24]
+
+def bench_file(path):
+    """
+    依次用矩阵中的每个变换组合解码一个文件，每个组合取 repeat 次中最短的耗时。
+    返回 (颜色类型, 位深, [(组合, 是否成功, 耗时, 输出字节数, 错误信息), ...])；无法识别的文件返回 None。
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    image_format = _ihdr_format(data)
+    if image_format is None:
+        return None
+    matrix, repeat = _matrix
+    results = []
+    for name, transforms in matrix:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = _shim.decode_transformed(data, transforms)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results.append((name, result.rowbytes != 0, best, result.rowbytes * result.height, result.message))
+    return image_format + (results,)
+
+class Cell:
+    """一个 (颜色类型, 位深, 变换组合) 单元的累计值。"""
+
+    def __init__(self):
+        self.files = 0
+        self.ok = 0
+        self.seconds = 0.0
+        self.output = 0
+        self.errors = collections.Counter()
+        # 本组合和 none 都成功的文件上两者的耗时，用于计算相对开销
+        self.paired_seconds = 0.0
+        self.baseline_seconds = 0.0
+
+    def slowdown(self):
+        return self.paired_seconds / self.baseline_seconds if self.baseline_seconds else None
+
+def collect(records):
+    """把 bench_file 的结果汇总成 {(颜色类型, 位深, 组合): Cell}。"""
+    cells = collections.defaultdict(Cell)
+    for color_type, bit_depth, results in records:
+        baseline = {name: (ok, seconds) for name, ok, seconds, _, _ in results}.get('none')
+        for name, ok, seconds, output, message in results:
+            cell = cells[color_type, bit_depth, name]
+            cell.files += 1
+            if not ok:
+                cell.errors[message] += 1
+                continue
+            cell.ok += 1
+            cell.seconds += seconds
+            cell.output += output
+            if baseline is not None and baseline[0]:
+                cell.paired_seconds += seconds
+                cell.baseline_seconds += baseline[1]
+    return cells
+
+def pathological(cells, slowdown_threshold):
+    """比 none 慢 slowdown_threshold 倍以上，或 none 能解码但本组合会出错的单元。"""
+    found = []
+    for (color_type, bit_depth, name), cell in sorted(cells.items()):
+        if name == 'none':
+            continue
+        slowdown = cell.slowdown()
+        if slowdown is not None and slowdown >= slowdown_threshold:
+            found.append((color_type, bit_depth, name, f'{slowdown:.1f}x slower than none'))
+        baseline = cells.get((color_type, bit_depth, 'none'))
+        if baseline is not None and cell.ok < baseline.ok:
+            message, _ = cell.errors.most_common(1)[0]
+            found.append((color_type, bit_depth, name,
+                          f'{baseline.ok - cell.ok} file(s) decode without transforms but fail: {message}'))
+    return found
+
+def print_table(cells, slowdown_threshold):
+    print(f"{'color type':<11} {'depth':>5} {'transforms':<36} {'files':>6} {'ok':>6} "
+          f"{'decodes/s':>10} {'out MB/s':>9} {'vs none':>8}")
+    for (color_type, bit_depth, name), cell in sorted(cells.items()):
+        rate = f'{cell.ok / cell.seconds:.0f}' if cell.seconds else '-'
+        mbps = f'{cell.output / cell.seconds / 1e6:.1f}' if cell.seconds else '-'
+        slowdown = cell.slowdown()
+        relative = f'{slowdown:.2f}x' if slowdown is not None else '-'
+        flag = ' !' if (slowdown is not None and slowdown >= slowdown_threshold) else ''
+        print(f"{COLOR_TYPE_NAMES.get(color_type, color_type):<11} {bit_depth:>5} {name:<36} {cell.files:>6} "
+              f"{cell.ok:>6} {rate:>10} {mbps:>9} {relative:>8}{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark libpng decoding under combinations of read transforms.')
+    parser.add_argument('paths', nargs='+', help='PNG files or directories (searched recursively)')
+    parser.add_argument('--transforms', default=None,
+                        help="comma-separated transform sets such as 'expand+strip_16' "
+                             f"(transforms: {', '.join(SHIM_TRANSFORMS)}); default: a built-in matrix")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--repeat', type=int, default=3, help='decodes per file and set (best time is kept)')
+    parser.add_argument('--libpng', default=None, help='path to the libpng shared library')
+    parser.add_argument('--slowdown', type=float, default=4.0,
+                        help='flag cells at least this many times slower than no transforms (default: 4)')
+    parser.add_argument('--json', default=None, help='also write the per-cell results to this file')
+    args = parser.parse_args()
+
+    matrix = args.transforms.split(',') if args.transforms else list(DEFAULT_MATRIX)
+    try:
+        for name in matrix:
+            parse_transforms(name)
+    except ValueError as e:
+        parser.error(str(e))
+    if 'none' not in matrix:
+        matrix.insert(0, 'none')  # 计算相对开销的基准
+
+    libpng_path = find_libpng(args.libpng)
+    build_shim(libpng_path)  # 先在主进程编译好，worker 直接载入缓存
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.jobs, initializer=_init_worker,
+                              initargs=(libpng_path, matrix, args.repeat)) as pool:
+        records = [record for record in pool.imap_unordered(bench_file, iter_files(args.paths), chunksize=8)
+                   if record is not None]
+    elapsed = time.perf_counter() - start
+    cells = collect(records)
+
+    print(f"libpng {LibPNGShim(libpng_path).version()} ({libpng_path}): {len(records)} files, "
+          f"{len(matrix)} transform sets in {elapsed:.1f}s ({args.jobs} workers)")
+    print_table(cells, args.slowdown)
+    found = pathological(cells, args.slowdown)
+    if found:
+        print(f'\nPathological combinations ({len(found)}):')
+        for color_type, bit_depth, name, reason in found:
+            print(f"  {COLOR_TYPE_NAMES.get(color_type, color_type)} {bit_depth}-bit {name}: {reason}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump([{
+                'color_type': color_type,
+                'bit_depth': bit_depth,
+                'transforms': name,
+                'files': cell.files,
+                'ok': cell.ok,
+                'seconds': cell.seconds,
+                'output_bytes': cell.output,
+                'slowdown': cell.slowdown(),
+                'errors': dict(cell.errors),
+            } for (color_type, bit_depth, name), cell in sorted(cells.items())], f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# bench_unknown_chunks.py
+"""
+测量 libpng 处理未知数据块 (png_handle_unknown) 在各种保留策略下的解码耗时与堆内存峰值：
+    discard   png_set_keep_unknown_chunks(PNG_HANDLE_CHUNK_NEVER)，读过后丢弃
+    if-safe   PNG_HANDLE_CHUNK_IF_SAFE，保存辅助数据块
+    always    PNG_HANDLE_CHUNK_ALWAYS，全部保存 (未知的关键数据块也不再报错)
+    callback  png_set_read_user_chunk_fn，由回调读取数据后丢弃
+结果按 策略 × 每个文件的私有数据块个数等级 × 数据量等级 汇总。
+种子可由仓库根目录的 png_unknown_chunks.py 生成。
+
+    python bench_unknown_chunks.py ../../../unknownPNG_seeds -j 8
+    python bench_unknown_chunks.py seeds --policies always,callback --cache-max 0 --malloc-max 0 --json out.json
+"""
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import struct
+import sys
+import time
+
+from libpng_ctypes import UNKNOWN_POLICIES, LibPNGShim, build_shim, find_libpng
+from png_generator_utils import iter_files
+
+def private_chunks(data):
+    """文件中私有数据块 (类型名第 2 个字母小写) 的个数与数据总字节数；遇到截断时停止。"""
+    count = size = 0
+    pos = 8
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack_from('>I4s', data, pos)
+        if chunk_type[1:2].islower():
+            count += 1
+            size += length
+        pos += 12 + length
+    return count, size
+
+def magnitude(value):
+    """数量级等级：0、<10、<100、<1k … 的上界。"""
+    bound = 10
+    while value >= bound:
+        bound *= 10
+    return 0 if value == 0 else bound
+
+def _label(bound, unit=''):
+    if bound == 0:
+        return '0'
+    for suffix, scale in (('M', 10 ** 6), ('k', 10 ** 3)):
+        if bound >= scale:
+            return f'<{bound // scale}{suffix}{unit}'
+    return f'<{bound}{unit}'
+
+_shim = None
+_options = None
+
+def _init_worker(libpng_path, options):
+    global _shim, _options
+    _shim = LibPNGShim(libpng_path)
+    _options = options
+
+def bench_one(job):
+    """
+    用一种策略解码一个文件 repeat 次。
+    返回 (策略, 文件, 私有数据块数, 私有数据字节, 最短耗时, 内存峰值, 保存的块数, 回调的块数, 错误)。
+    """
+    policy, path = job
+    with open(path, 'rb') as f:
+        data = f.read()
+    count, size = private_chunks(data)
+    best = None
+    for _ in range(_options['repeat']):
+        start = time.perf_counter()
+        result = _shim.decode_unknown(data, policy, _options['cache_max'], _options['malloc_max'])
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    error = result.message if result.rowbytes == 0 or result.end_error else None
+    return (policy, os.path.basename(path), count, size, best, result.peak_memory,
+            result.kept_chunks, result.callback_chunks, error)
+
+def summarize(records):
+    """按 (策略, 块数等级, 数据量等级) 汇总：{key: {files, errors, seconds, mbps, peak_memory, kept, callback}}。"""
+    summary = collections.OrderedDict()
+    for policy, _, count, size, seconds, peak, kept, callback, error in sorted(
+            records, key=lambda record: (list(UNKNOWN_POLICIES).index(record[0]),
+                                         magnitude(record[2]), magnitude(record[3]))):
+        key = f'{policy}/{_label(magnitude(count))}/{_label(magnitude(size), "B")}'
+        entry = summary.setdefault(key, {'files': 0, 'errors': 0, 'chunks': 0, 'bytes': 0, 'seconds': 0.0,
+                                         'peak_memory': 0, 'kept': 0, 'callback': 0})
+        entry['files'] += 1
+        entry['errors'] += error is not None
+        entry['chunks'] += count
+        entry['bytes'] += size
+        entry['seconds'] += seconds
+        entry['peak_memory'] = max(entry['peak_memory'], peak)
+        entry['kept'] += kept
+        entry['callback'] += callback
+    for entry in summary.values():
+        entry['mbps'] = entry['bytes'] / entry['seconds'] / 1e6 if entry['seconds'] else 0.0
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark libpng unknown chunk handling per keep policy.')
+    parser.add_argument('paths', nargs='+', help='PNG files or directories (searched recursively)')
+    parser.add_argument('--policies', default=','.join(UNKNOWN_POLICIES),
+                        help=f"comma-separated keep policies ({', '.join(UNKNOWN_POLICIES)})")
+    parser.add_argument('--cache-max', type=int, default=None,
+                        help='png_set_chunk_cache_max (0 is unlimited; default: the libpng default)')
+    parser.add_argument('--malloc-max', type=int, default=None,
+                        help='png_set_chunk_malloc_max (0 is unlimited; default: the libpng default)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--repeat', type=int, default=3, help='decodes per file and policy (best time is kept)')
+    parser.add_argument('--libpng', default=None, help='path to the libpng shared library')
+    parser.add_argument('--json', default=None, help='write the summary to this file')
+    args = parser.parse_args()
+
+    policies = args.policies.split(',')
+    for policy in policies:
+        if policy not in UNKNOWN_POLICIES:
+            parser.error(f"unknown policy '{policy}'; choose from {', '.join(UNKNOWN_POLICIES)}")
+    files = list(iter_files(args.paths))
+    if not files:
+        sys.exit('error: no PNG files')
+
+    libpng_path = find_libpng(args.libpng)
+    build_shim(libpng_path)  # 先在主进程编译好，worker 直接载入缓存
+    shim = LibPNGShim(libpng_path)
+    print(f"libpng {shim.version()} ({libpng_path}): {len(files)} files, {len(policies)} policies, "
+          f"{args.jobs} workers")
+    options = {'repeat': args.repeat, 'cache_max': args.cache_max, 'malloc_max': args.malloc_max}
+    jobs = [(policy, path) for policy in policies for path in files]
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.jobs, initializer=_init_worker, initargs=(libpng_path, options)) as pool:
+        records = pool.map(bench_one, jobs, chunksize=max(1, len(jobs) // (args.jobs * 8)))
+    elapsed = time.perf_counter() - start
+    summary = summarize(records)
+
+    print(f"{'policy/chunks/bytes':<28} {'files':>6} {'errors':>6} {'ms/file':>9} {'MB/s':>8} {'peak heap':>10} "
+          f"{'kept':>8} {'callback':>8}")
+    for key, entry in summary.items():
+        print(f"{key:<28} {entry['files']:>6} {entry['errors']:>6} {entry['seconds'] / entry['files'] * 1e3:>9.2f} "
+              f"{entry['mbps']:>8.1f} {entry['peak_memory'] / 1024:>8.0f}kB {entry['kept']:>8} "
+              f"{entry['callback']:>8}")
+    print(f'{len(records)} decodes in {elapsed:.1f}s')
+    errors = collections.Counter((policy, error) for policy, _, _, _, _, _, _, _, error in records
+                                 if error is not None)
+    for (policy, error), count in errors.most_common(10):
+        print(f'{policy}: {count} x {error}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+# crash_triage.py
+"""
+并行复现模糊测试发现的崩溃输入，按规范化后的栈顶 N 帧哈希分桶，每桶保留最小的复现输入。
+
+复现用的 harness 可以是用 -fsanitize=fuzzer,address 编译的 libFuzzer 二进制，
+也可以由 build 子命令把 libpng_read_fuzzer.cc、fuzzer_replay_main.c 与仓库中的 libpng 源码
+一起用 ASan/UBSan 编译得到 (不需要 clang)。两者都以输入文件路径为参数运行。
+结果按 (输入的 SHA-256, harness 的哈希) 缓存，再次运行时只复现新的输入。
+
+    python crash_triage.py build
+    python crash_triage.py run crashes/ -j 16 -o triage
+    python crash_triage.py run crashes/ --harness out/libpng_read_fuzzer --timeout 25
+"""
+import argparse
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+from png_generator_utils import iter_files
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_REPO_ROOT = os.path.abspath(os.path.join(_HERE, '..', '..', '..'))
+_FUZZER_SOURCE = os.path.join(_REPO_ROOT, 'contrib', 'oss-fuzz', 'libpng_read_fuzzer.cc')
+_REPLAY_MAIN = os.path.join(_HERE, 'fuzzer_replay_main.c')
+_LIBPNG_SOURCES = ['png.c', 'pngerror.c', 'pngget.c', 'pngmem.c', 'pngpread.c', 'pngread.c', 'pngrio.c',
+                   'pngrtran.c', 'pngrutil.c', 'pngset.c', 'pngtrans.c', 'pngwio.c', 'pngwrite.c',
+                   'pngwtran.c', 'pngwutil.c']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    sha256 TEXT NOT NULL,
+    harness TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    crashed INTEGER NOT NULL,
+    kind TEXT,
+    bucket TEXT,
+    frames TEXT NOT NULL,
+    report TEXT NOT NULL,
+    PRIMARY KEY (sha256, harness)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS inputs (
+    sha256 TEXT PRIMARY KEY,
+    path TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_bucket ON results (harness, bucket);
+"""
+
+# 只保留报告的头尾，避免缓存被很长的报告 (如大量泄漏) 撑大
+_REPORT_LIMIT = 16384
+
+# 不代表崩溃位置的帧：sanitizer 运行时、libFuzzer、C 库与 replay 驱动
+_SKIP_PREFIXES = ('__asan', '__interceptor', '___interceptor', '__sanitizer', '__ubsan', '__lsan', '__msan',
+                  '__tsan', 'fuzzer::', '__libc_')
+_SKIP_FUNCTIONS = ('main', '_start', 'replay')
+_SKIP_MODULES = ('libasan', 'libubsan', 'liblsan', 'libtsan', 'libclang_rt', 'libc.so', 'libstdc++',
+                 'ld-linux')
+
+_FRAME = re.compile(r'^\s*#(\d+)\s+0x[0-9a-fA-F]+\s+(.*)$')
+_SANITIZER_ERROR = re.compile(r'(?:ERROR|WARNING): (\w*Sanitizer|libFuzzer): (.+?)(?: on |\s*\(|$)')
+_ACCESS = re.compile(r'^(READ|WRITE) of size \d+')
+_RUNTIME_ERROR = re.compile(r'^(\S+?):\d+(?::\d+)?: runtime error: (.*)$')
+# gcc 产生的函数克隆后缀，如 png_read_row.part.0、foo.constprop.3
+_CLONE_SUFFIX = re.compile(r'(\.(?:part|constprop|isra|cold|lto_priv)(?:\.\d+)?)+$')
+
+Replay = collections.namedtuple('Replay', 'sha256 path size crashed kind bucket frames report')
+
+def parse_frame(line):
+    """解析一行栈帧，返回 (函数名或 None, 位置)；不是栈帧时返回 None。"""
+    match = _FRAME.match(line)
+    if match is None:
+        return None
+    rest = match.group(2).strip()
+    if not rest.startswith('in '):
+        return None, rest
+    function, _, location = rest[3:].rpartition(' ')
+    if not function:
+        return location, ''
+    return function, location
+
+def normalize_function(function):
+    """去掉参数列表、模板参数与编译器克隆后缀，使同一函数在不同构建中得到相同的名字。"""
+    if '(' in function and not function.startswith('('):
+        function = function[:function.index('(')]
+    depth = 0
+    name = []
+    for c in function:
+        if c == '<':
+            depth += 1
+        elif c == '>' and depth:
+            depth -= 1
+        elif not depth:
+            name.append(c)
+    return _CLONE_SUFFIX.sub('', ''.join(name).strip())
+
+def _interesting(function, location):
+    if function is None or function.startswith(_SKIP_PREFIXES) or function in _SKIP_FUNCTIONS:
+        return False
+    return not any(module in location for module in _SKIP_MODULES)
+
+def parse_report(stderr):
+    """
+    从 sanitizer 的输出中取出 (崩溃类型, 规范化后的栈帧列表)；没有报告时类型为 None。
+    只使用第一个栈 (出错位置)，不用 "freed by"/"allocated by" 等后续的栈。
+    """
+    kind = None
+    access = None
+    frames = []
+    in_stack = False
+    stack_done = False
+    for line in stderr.splitlines():
+        if kind is None:
+            match = _SANITIZER_ERROR.search(line)
+            if match:
+                kind = f'{match.group(1)}: {match.group(2).strip()}'
+                continue
+            match = _RUNTIME_ERROR.match(line)
+            if match:
+                # UBSan：去掉地址与数值，使同类错误的不同取值落进同一个桶
+                message = re.sub(r'-?\b\d+\b', 'N', re.sub(r'0x[0-9a-fA-F]+', 'ADDR', match.group(2)))
+                kind = f'UndefinedBehaviorSanitizer: {message}'
+                continue
+        if access is None and _ACCESS.match(line):
+            access = line.split()[0]
+            continue
+        frame = parse_frame(line)
+        if frame is None:
+            if in_stack:
+                stack_done = True
+            continue
+        if stack_done:
+            continue
+        in_stack = True
+        function, location = frame
+        if _interesting(function, location):
+            frames.append(normalize_function(function))
+    if kind is not None and access is not None:
+        kind = f'{kind} {access}'
+    return kind, frames
+
+def bucket_key(kind, frames, depth):
+    """崩溃类型与栈顶 depth 个帧的哈希。"""
+    text = '\n'.join([kind or ''] + frames[:depth])
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+def _trim_report(text):
+    if len(text) <= _REPORT_LIMIT:
+        return text
+    half = _REPORT_LIMIT // 2
+    return f'{text[:half]}\n... ({len(text) - _REPORT_LIMIT} bytes omitted) ...\n{text[-half:]}'
+
+def signal_name(number):
+    """SIGSEGV 这样的信号名；Python 没有名字的信号 (如实时信号) 用编号。"""
+    try:
+        return signal.Signals(number).name
+    except ValueError:
+        return str(number)
+
+def replay(harness, path, sha256, timeout, depth, extra_args=()):
+    """用 harness 运行一个输入并解析结果。"""
+    env = dict(os.environ)
+    env.setdefault('ASAN_OPTIONS', 'symbolize=1:detect_leaks=1:allocator_may_return_null=1')
+    env.setdefault('UBSAN_OPTIONS', 'print_stacktrace=1:halt_on_error=1')
+    size = os.path.getsize(path)
+    try:
+        completed = subprocess.run([harness, *extra_args, path], env=env, stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired as e:
+        report = (e.stderr or b'').decode(errors='replace')
+        kind = f'timeout after {timeout}s'
+        return Replay(sha256, path, size, True, kind, bucket_key(kind, [], depth), [], _trim_report(report))
+    report = completed.stderr.decode(errors='replace')
+    kind, frames = parse_report(report)
+    if kind is None and completed.returncode != 0:
+        if completed.returncode < 0:
+            kind = f'signal {signal_name(-completed.returncode)}'
+        else:
+            kind = f'exit status {completed.returncode}'
+    if kind is None:
+        return Replay(sha256, path, size, False, None, None, [], _trim_report(report))
+    return Replay(sha256, path, size, True, kind, bucket_key(kind, frames, depth), frames, _trim_report(report))
+
+def file_identity(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class TriageCache:
+    """按 (输入哈希, harness 哈希) 缓存的复现结果。"""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+
+    def results(self, harness, hashes):
+        """{输入哈希: Replay}，只包含已缓存的输入。"""
+        found = {}
+        hashes = list(hashes)
+        for start in range(0, len(hashes), 500):
+            part = hashes[start:start + 500]
+            sql = ('SELECT r.sha256, i.path, r.size, r.crashed, r.kind, r.bucket, r.frames, r.report '
+                   'FROM results r JOIN inputs i ON i.sha256 = r.sha256 '
+                   f"WHERE r.harness = ? AND r.sha256 IN ({','.join('?' * len(part))})")
+            for sha256, path, size, crashed, kind, bucket, frames, report in self._conn.execute(
+                    sql, [harness] + part):
+                found[sha256] = Replay(sha256, path, size, bool(crashed), kind, bucket, json.loads(frames), report)
+        return found
+
+    def add(self, harness, replays):
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(r.sha256, harness, r.size, int(r.crashed), r.kind, r.bucket, json.dumps(r.frames), r.report)
+                 for r in replays])
+            self._conn.executemany('INSERT OR REPLACE INTO inputs VALUES (?, ?)',
+                                   [(r.sha256, r.path) for r in replays])
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def build_harness(output=None, sanitizers='address,undefined'):
+    """
+    用 ASan/UBSan 编译 libpng (仓库源码，配置取 scripts/pnglibconf.h.prebuilt)、
+    libpng_read_fuzzer.cc 与 fuzzer_replay_main.c，按源码与选项缓存，返回可执行文件路径。
+    编译器取 CC/CXX 环境变量，默认 cc/c++。
+    """
+    sources = [_FUZZER_SOURCE, _REPLAY_MAIN] + [os.path.join(_REPO_ROOT, name) for name in _LIBPNG_SOURCES]
+    # 与 oss-fuzz 一样不检查对齐：harness 用未对齐的 int 读取取自输入末尾的变换标志
+    flags = ['-g', '-O1', '-fno-omit-frame-pointer', f'-fsanitize={sanitizers}', '-fno-sanitize=alignment']
+    digest = hashlib.sha1(' '.join(flags).encode())
+    for path in sources + [os.path.join(_REPO_ROOT, name) for name in ('png.h', 'pngpriv.h', 'pngstruct.h',
+                                                                     'pnginfo.h', 'pngconf.h')]:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    key = digest.hexdigest()[:16]
+    output = output or os.path.join(tempfile.gettempdir(), f'libpng_read_fuzzer-{key}')
+    if os.path.exists(output):
+        return output
+
+    cc = os.environ.get('CC', 'cc')
+    cxx = os.environ.get('CXX', 'c++')
+    with tempfile.TemporaryDirectory(prefix='libpng_fuzzer_build') as build_dir:
+        shutil.copyfile(os.path.join(_REPO_ROOT, 'scripts', 'pnglibconf.h.prebuilt'),
+                        os.path.join(build_dir, 'pnglibconf.h'))
+        includes = [f'-I{build_dir}', f'-I{_REPO_ROOT}']
+        commands = []
+        objects = []
+        for source in sources:
+            obj = os.path.join(build_dir, os.path.basename(source) + '.o')
+            compiler = cxx if source.endswith('.cc') else cc
+            extra = ['-std=c++11'] if source.endswith('.cc') else []
+            commands.append([compiler, *flags, *extra, *includes, '-c', source, '-o', obj])
+            objects.append(obj)
+        commands.append([cxx, *flags, *objects, '-lz', '-lm', '-o', output + f'.{os.getpid()}'])
+        with concurrent.futures.ThreadPoolExecutor(os.cpu_count()) as executor:
+            results = list(executor.map(lambda command: subprocess.run(command, capture_output=True),
+                                        commands[:-1]))
+        results.append(subprocess.run(commands[-1], capture_output=True))
+        for command, result in zip(commands, results):
+            if result.returncode != 0:
+                raise OSError(f"cannot build the harness: {' '.join(command)}\n"
+                              f"{result.stderr.decode(errors='replace')}")
+    # 多个进程可能同时编译；rename 是原子的
+    os.replace(output + f'.{os.getpid()}', output)
+    return output
+
+def buckets_of(replays):
+    """{桶: [Replay, ...]}，每桶按 (大小, 路径) 排序，第一个即最小的复现输入。"""
+    buckets = collections.defaultdict(list)
+    for r in replays:
+        if r.crashed:
+            buckets[r.bucket].append(r)
+    for members in buckets.values():
+        members.sort(key=lambda r: (r.size, r.path))
+    return buckets
+
+def write_buckets(buckets, output):
+    """
+    每个桶一个目录，内含最小的复现输入与其报告；另写 buckets.json 汇总。
+    之前运行留下、这次没有出现的桶目录 (含 report.txt 的子目录) 会被删除。
+    """
+    os.makedirs(output, exist_ok=True)
+    for name in os.listdir(output):
+        stale_dir = os.path.join(output, name)
+        if name not in buckets and os.path.isfile(os.path.join(stale_dir, 'report.txt')):
+            shutil.rmtree(stale_dir)
+    summary = []
+    for bucket, members in sorted(buckets.items(), key=lambda item: (-len(item[1]), item[0])):
+        smallest = members[0]
+        bucket_dir = os.path.join(output, bucket)
+        if os.path.exists(bucket_dir):
+            shutil.rmtree(bucket_dir)
+        os.makedirs(bucket_dir)
+        shutil.copyfile(smallest.path, os.path.join(bucket_dir, os.path.basename(smallest.path)))
+        with open(os.path.join(bucket_dir, 'report.txt'), 'w') as f:
+            f.write(smallest.report)
+        summary.append({
+            'bucket': bucket,
+            'kind': smallest.kind,
+            'frames': smallest.frames,
+            'count': len(members),
+            'reproducer': os.path.basename(smallest.path),
+            'size': smallest.size,
+            'inputs': [r.path for r in members],
+        })
+    with open(os.path.join(output, 'buckets.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay fuzzer crashes in parallel and bucket them by stack.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='build a sanitizer replay harness from libpng_read_fuzzer.cc')
+    build.add_argument('-o', '--output', default=None, help='harness path (default: cached in the temp dir)')
+    build.add_argument('--sanitizers', default='address,undefined', help='-fsanitize= value')
+
+    run = sub.add_parser('run', help='replay crashing inputs and bucket them')
+    run.add_argument('inputs', nargs='+', help='crashing inputs or directories of them')
+    run.add_argument('--harness', default=None,
+                     help='libFuzzer or replay binary (default: build one with the build command)')
+    run.add_argument('--harness-arg', action='append', default=[], metavar='ARG',
+                     help='extra argument for the harness, e.g. -rss_limit_mb=2560 (repeatable)')
+    run.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='parallel replays')
+    run.add_argument('--timeout', type=float, default=25, help='seconds per replay (default: 25)')
+    run.add_argument('--frames', type=int, default=3, help='stack frames in the bucket hash (default: 3)')
+    run.add_argument('--cache', default='triage.sqlite', help='result cache (default: triage.sqlite)')
+    run.add_argument('-o', '--output', default='triage', help='bucket directory (default: triage)')
+    run.add_argument('--show', type=int, default=30, help='buckets to print')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        print(build_harness(args.output, args.sanitizers))
+        return
+
+    try:
+        harness = os.path.abspath(args.harness) if args.harness else build_harness()
+    except OSError as e:
+        sys.exit(f'error: {e}')
+    # 分桶深度也是 harness 标识的一部分：改变 --frames 要重新计算桶
+    harness_id = hashlib.sha256(f'{file_identity(harness)}:{args.frames}:{args.harness_arg}'.encode()
+                                ).hexdigest()[:16]
+    inputs = {}
+    for path in iter_files(args.inputs, suffix=None):
+        inputs.setdefault(file_identity(path), path)
+
+    with TriageCache(args.cache) as cache:
+        cached = cache.results(harness_id, inputs)
+        new = [(sha256, path) for sha256, path in inputs.items() if sha256 not in cached]
+        print(f'{len(inputs)} inputs: {len(cached)} cached, {len(new)} to replay with {harness}')
+        replays = list(cached.values())
+        with concurrent.futures.ThreadPoolExecutor(args.jobs) as executor:
+            futures = [executor.submit(replay, harness, path, sha256, args.timeout, args.frames,
+                                       args.harness_arg) for sha256, path in new]
+            batch = []
+            for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                batch.append(future.result())
+                if len(batch) >= 100 or done == len(futures):
+                    cache.add(harness_id, batch)
+                    replays += batch
+                    batch = []
+                    print(f'\r{done}/{len(futures)} replayed', end='', file=sys.stderr)
+        if futures:
+            print(file=sys.stderr)
+
+    # 缓存中的路径可能是以前的位置，以本次输入的路径为准
+    replays = [r._replace(path=inputs[r.sha256]) for r in replays]
+    buckets = buckets_of(replays)
+    write_buckets(buckets, args.output)
+    crashed = sum(len(members) for members in buckets.values())
+    print(f'{crashed} of {len(replays)} inputs crashed, {len(buckets)} buckets in {args.output}/')
+    print(f"{'bucket':<16} {'count':>6} {'smallest':>9}  kind / top frames")
+    for bucket, members in sorted(buckets.items(), key=lambda item: (-len(item[1]), item[0]))[:args.show]:
+        smallest = members[0]
+        print(f"{bucket:<16} {len(members):>6} {smallest.size:>9}  {smallest.kind}")
+        if smallest.frames:
+            print(f"{'':<34}{' <- '.join(smallest.frames[:args.frames])}")
+
+if __name__ == '__main__':
+    main()
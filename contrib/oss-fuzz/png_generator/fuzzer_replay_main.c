@@ -0,0 +1,62 @@
+/* fuzzer_replay_main.c - run a libFuzzer target on the files named on the
+ * command line, for crash_triage.py
+ *
+ * Linking libpng_read_fuzzer.cc with this file instead of libFuzzer gives a
+ * harness that replays inputs under the sanitizers without needing clang.
+ * Like a libFuzzer binary it takes the inputs as arguments and ignores
+ * arguments that start with '-'.
+ */
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <stddef.h>
+#include <stdint.h>
+
+int LLVMFuzzerTestOneInput(const uint8_t *data, size_t size);
+
+static int
+replay(const char *path)
+{
+   FILE *fp = fopen(path, "rb");
+   unsigned char *data;
+   long size;
+
+   if (fp == NULL)
+   {
+      perror(path);
+      return 1;
+   }
+   if (fseek(fp, 0, SEEK_END) != 0 || (size = ftell(fp)) < 0 ||
+       fseek(fp, 0, SEEK_SET) != 0)
+   {
+      perror(path);
+      fclose(fp);
+      return 1;
+   }
+   /* One extra byte so that an empty file gets a valid pointer. */
+   data = (unsigned char *)malloc((size_t)size + 1);
+   if (data == NULL || fread(data, 1, (size_t)size, fp) != (size_t)size)
+   {
+      fprintf(stderr, "%s: read error\n", path);
+      free(data);
+      fclose(fp);
+      return 1;
+   }
+   fclose(fp);
+
+   fprintf(stderr, "Running: %s\n", path);
+   LLVMFuzzerTestOneInput(data, (size_t)size);
+   free(data);
+   return 0;
+}
+
+int
+main(int argc, char **argv)
+{
+   int i, status = 0;
+
+   for (i = 1; i < argc; i++)
+      if (argv[i][0] != '-')
+         status |= replay(argv[i]);
+   return status;
+}
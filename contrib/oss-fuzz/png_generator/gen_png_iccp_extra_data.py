@@ -1,19 +1,20 @@
 # gen_png_iccp_extra_data.py
-import zlib
 from png_generator_utils import (
+    DEFAULT_COMPRESSION_PROFILE,
+    compress_with_profile,
     create_minimal_png_structure,
     create_iccp_chunk,
     write_png,
     minimal_icc_profile_bytes
 )
 
-def generate_extra_data_iccp_png(filename="iccp_extra_data.png"):
+def generate_extra_data_iccp_png(filename="iccp_extra_data.png", compression_profile=DEFAULT_COMPRESSION_PROFILE):
     profile_name = "ExtraDataProfile"
     compression_method = b"\x00"
 
     uncompressed_data_with_extra = minimal_icc_profile_bytes + (b"GARBAGE_DATA_AFTER_PROFILE_ENDS_HERE" * 3)
 
-    compressed_profile_with_extra = zlib.compress(uncompressed_data_with_extra)
+    compressed_profile_with_extra = compress_with_profile(uncompressed_data_with_extra, compression_profile)
 
     iccp_chunk = create_iccp_chunk(profile_name, compression_method, compressed_profile_with_extra)
 
@@ -1,18 +1,19 @@
 # gen_png_iccp_happy_path.py
-import zlib
 from png_generator_utils import (
+    DEFAULT_COMPRESSION_PROFILE,
+    compress_with_profile,
     create_minimal_png_structure,
     create_iccp_chunk,
     write_png,
     minimal_icc_profile_bytes
 )
 
-def generate_happy_path_png(filename="iccp_happy_path.png"):
+def generate_happy_path_png(filename="iccp_happy_path.png", compression_profile=DEFAULT_COMPRESSION_PROFILE):
     profile_name = "TestProfileValid"
     compression_method = b"\x00"  # zlib/deflate
 
     # 使用已定义的 minimal_icc_profile_bytes
-    compressed_profile = zlib.compress(minimal_icc_profile_bytes)
+    compressed_profile = compress_with_profile(minimal_icc_profile_bytes, compression_profile)
 
     iccp_chunk = create_iccp_chunk(profile_name, compression_method, compressed_profile)
 
@@ -0,0 +1,31 @@
+# gen_png_iccp_large_profile.py
+from icc_profile_builder import compressed_icc_profile
+from png_generator_utils import (
+    DEFAULT_COMPRESSION_PROFILE,
+    create_minimal_png_structure,
+    create_iccp_chunk,
+    write_png
+)
+
+def generate_large_profile_iccp_png(filename="iccp_large_profile.png",
+                                    tag_count=400, data_size=64 * 1024 * 1024,
+                                    compression_profile=DEFAULT_COMPRESSION_PROFILE):
+    profile_name = "LargeSyntheticProfile"
+    compression_method = b"\x00"
+
+    # 数百个标签 + 大 LUT，用于测量 png_icc_check_header/png_icc_check_tag_table 的开销
+    compressed_profile = compressed_icc_profile(tag_count=tag_count,
+                                                tag_types=('XYZ', 'curv', 'mft2', 'mAB'),
+                                                data_size=data_size,
+                                                color_space='RGB',
+                                                compression_profile=compression_profile)
+
+    iccp_chunk = create_iccp_chunk(profile_name, compression_method, compressed_profile)
+
+    sig, ihdr, idat, iend = create_minimal_png_structure(width=1, height=1, color_type=2, bit_depth=8,
+                                                         compression_profile=compression_profile)
+
+    write_png(filename, [sig, ihdr, iccp_chunk, idat, iend])
+
+if __name__ == "__main__":
+    generate_large_profile_iccp_png()
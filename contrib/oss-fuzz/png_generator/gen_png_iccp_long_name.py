@@ -1,19 +1,20 @@
 # gen_png_iccp_long_name.py
-import zlib
 from png_generator_utils import (
+    DEFAULT_COMPRESSION_PROFILE,
+    compress_with_profile,
     create_minimal_png_structure,
     create_iccp_chunk,
     write_png,
     minimal_icc_profile_bytes
 )
 
-def generate_long_name_iccp_png(filename="iccp_long_name.png"):
+def generate_long_name_iccp_png(filename="iccp_long_name.png", compression_profile=DEFAULT_COMPRESSION_PROFILE):
     # iCCP 关键字（配置文件名称）最大长度为 79 个字符 + 空终止符
     profile_name = "A" * 79
     compression_method = b"\x00"
 
     # 为此测试使用一个标准的、小的压缩配置文件
-    compressed_profile = zlib.compress(minimal_icc_profile_bytes)
+    compressed_profile = compress_with_profile(minimal_icc_profile_bytes, compression_profile)
 
     iccp_chunk = create_iccp_chunk(profile_name, compression_method, compressed_profile)
 
@@ -1,13 +1,14 @@
 # gen_png_iccp_oom_profile.py
-import zlib
 import struct
 from png_generator_utils import (
+    DEFAULT_COMPRESSION_PROFILE,
+    compress_with_profile,
     create_minimal_png_structure,
     create_iccp_chunk,
     write_png
 )
 
-def generate_oom_profile_iccp_png(filename="iccp_oom_profile.png"):
+def generate_oom_profile_iccp_png(filename="iccp_oom_profile.png", compression_profile=DEFAULT_COMPRESSION_PROFILE):
     profile_name_str = "LargeProfileOOM"
     compression_method_byte = b"\x00"
 
@@ -26,7 +27,7 @@ def generate_oom_profile_iccp_png(filename="iccp_oom_profile.png"):
     
     uncompressed_icc_content_for_oom = uncompressed_icc_header + struct.pack('>I', 0) # 头部 + 0 个标签
 
-    compressed_profile_data_for_oom = zlib.compress(uncompressed_icc_content_for_oom)
+    compressed_profile_data_for_oom = compress_with_profile(uncompressed_icc_content_for_oom, compression_profile)
 
     iccp_chunk = create_iccp_chunk(profile_name_str, compression_method_byte, compressed_profile_data_for_oom)
 
@@ -1,17 +1,18 @@
 # gen_png_iccp_truncated.py
-import zlib
 from png_generator_utils import (
+    DEFAULT_COMPRESSION_PROFILE,
+    compress_with_profile,
     create_minimal_png_structure,
     create_iccp_chunk,
     write_png,
     minimal_icc_profile_bytes
 )
 
-def generate_truncated_iccp_png(filename="iccp_truncated.png"):
+def generate_truncated_iccp_png(filename="iccp_truncated.png", compression_profile=DEFAULT_COMPRESSION_PROFILE):
     profile_name = "TruncatedProfile"
     compression_method = b"\x00"
 
-    compressed_profile_full = zlib.compress(minimal_icc_profile_bytes)
+    compressed_profile_full = compress_with_profile(minimal_icc_profile_bytes, compression_profile)
     # 截断压缩数据
     if len(compressed_profile_full) > 20:
         truncated_compressed_profile = compressed_profile_full[:-20] # 删除最后20字节
@@ -0,0 +1,222 @@
+# icc_profile_builder.py
+import functools
+import random
+import struct
+
+from png_generator_utils import (
+    DEFAULT_COMPRESSION_PROFILE,
+    compress_pieces_with_profile,
+    parse_compression_profile
+)
+
+ICC_HEADER_SIZE = 128
+ICC_TAG_ENTRY_SIZE = 12
+ICC_TAG_TYPES = ('XYZ', 'curv', 'mft2', 'mAB')
+
+# 大块数据按 1 MiB 分片产出，避免一次性拼接几百 MB 的 bytes；
+# 整个 Profile 共用一个小于 zlib 32 KiB 窗口的填充块，压缩后体积很小
+_PIECE_SIZE = 1 << 20
+_FILL_BLOCK_SIZE = 1 << 12
+
+# PCS Illuminant D50 (s15Fixed16Number)，libpng 会逐字节核对这个值
+_D50_XYZ = struct.pack('>iii', 0x0000F6D6, 0x00010000, 0x0000D32D)
+
+_STANDARD_TAG_SIGNATURES = {
+    'XYZ': [b'wtpt', b'rXYZ', b'gXYZ', b'bXYZ', b'bkpt', b'lumi'],
+    'curv': [b'rTRC', b'gTRC', b'bTRC', b'kTRC'],
+    'mft2': [b'A2B0', b'A2B1', b'A2B2'],
+    'mAB': [b'A2B0', b'A2B1', b'A2B2'],
+}
+
+
+def _align4(n):
+    return (n + 3) & ~3
+
+
+def _fill_piece(rng):
+    """由一个伪随机块重复组成的 1 MiB 填充片段。"""
+    block = rng.getrandbits(8 * _FILL_BLOCK_SIZE).to_bytes(_FILL_BLOCK_SIZE, 'big')
+    return block * (_PIECE_SIZE // _FILL_BLOCK_SIZE)
+
+
+def _fill_pieces(length, piece):
+    """用填充片段产出 length 字节。"""
+    while length >= _PIECE_SIZE:
+        yield piece
+        length -= _PIECE_SIZE
+    if length:
+        yield piece[:length]
+
+
+def _lut_grid_points(budget, in_chans, out_chans):
+    """在预算内选择最大的 CLUT 网格点数 (2..255)。"""
+    grid = int((max(budget, 1) / (out_chans * 2)) ** (1.0 / in_chans))
+    grid = max(2, min(255, grid))
+    while grid > 2 and grid ** in_chans * out_chans * 2 > budget:
+        grid -= 1
+    return grid
+
+
+class _Tag:
+    """ICC 标签：签名、类型、数据长度以及产出数据片段的方法。"""
+
+    def __init__(self, signature, tag_type, in_chans, out_chans, budget):
+        self.signature = signature
+        self.tag_type = tag_type
+        self.in_chans = in_chans
+        self.out_chans = out_chans
+        if tag_type == 'XYZ':
+            self.size = 20
+        elif tag_type == 'curv':
+            self.entries = max(0, budget // 2)
+            self.size = 12 + 2 * self.entries
+        elif tag_type == 'mft2':
+            self.grid = _lut_grid_points(budget, in_chans, out_chans)
+            self.clut_size = self.grid ** in_chans * out_chans * 2
+            self.size = 52 + (in_chans + out_chans) * 256 * 2 + self.clut_size
+        elif tag_type == 'mAB':
+            self.grid = _lut_grid_points(budget, in_chans, out_chans)
+            self.clut_size = self.grid ** in_chans * out_chans * 2
+            self.b_offset = 32
+            self.clut_offset = self.b_offset + 12 * out_chans
+            self.a_offset = self.clut_offset + _align4(20 + self.clut_size)
+            self.size = self.a_offset + 12 * in_chans
+        else:
+            raise ValueError(f"Unknown ICC tag type '{tag_type}'")
+
+    def pieces(self, fill):
+        if self.tag_type == 'XYZ':
+            yield b'XYZ \x00\x00\x00\x00' + _D50_XYZ
+        elif self.tag_type == 'curv':
+            yield b'curv\x00\x00\x00\x00' + struct.pack('>I', self.entries)
+            if self.entries <= 4096:
+                last = max(self.entries - 1, 1)
+                yield struct.pack(f'>{self.entries}H',
+                                  *(i * 65535 // last for i in range(self.entries)))
+            else:
+                yield from _fill_pieces(2 * self.entries, fill)
+        elif self.tag_type == 'mft2':
+            identity = struct.pack('>9i', 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x10000)
+            ramp = struct.pack('>256H', *(i * 257 for i in range(256)))
+            yield b'mft2\x00\x00\x00\x00' + bytes([self.in_chans, self.out_chans, self.grid, 0]) \
+                + identity + struct.pack('>HH', 256, 256)
+            yield ramp * self.in_chans
+            yield from _fill_pieces(self.clut_size, fill)
+            yield ramp * self.out_chans
+        elif self.tag_type == 'mAB':
+            # B 曲线 + CLUT + A 曲线；M 曲线与矩阵偏移为 0
+            identity_curve = b'curv\x00\x00\x00\x00\x00\x00\x00\x00'
+            yield b'mAB \x00\x00\x00\x00' + bytes([self.in_chans, self.out_chans, 0, 0]) \
+                + struct.pack('>IIIII', self.b_offset, 0, 0, self.clut_offset, self.a_offset)
+            yield identity_curve * self.out_chans
+            grid_points = bytes([self.grid] * self.in_chans) + b'\x00' * (16 - self.in_chans)
+            yield grid_points + b'\x02\x00\x00\x00'
+            yield from _fill_pieces(self.clut_size, fill)
+            yield b'\x00' * (_align4(20 + self.clut_size) - 20 - self.clut_size)
+            yield identity_curve * self.in_chans
+
+
+def _plan_tags(tag_count, tag_types, data_size, color_space):
+    in_chans = 1 if color_space == 'GRAY' else 3
+    out_chans = 3
+    bulk_tags = sum(1 for i in range(tag_count)
+                    if tag_types[i % len(tag_types)] != 'XYZ')
+    budget = data_size // bulk_tags if bulk_tags else 0
+    used = set()
+    tags = []
+    for i in range(tag_count):
+        tag_type = tag_types[i % len(tag_types)]
+        signature = None
+        for candidate in _STANDARD_TAG_SIGNATURES[tag_type]:
+            if candidate not in used:
+                signature = candidate
+                break
+        if signature is None:
+            # 私有标签签名：'t' + 三位十六进制序号，超出后直接用序号
+            signature = (f't{i:03x}'.encode('ascii') if i < 0x1000
+                         else struct.pack('>I', 0x74000000 + i))
+        used.add(signature)
+        tags.append(_Tag(signature, tag_type, in_chans, out_chans, budget))
+    return tags
+
+
+def iter_icc_profile_pieces(tag_count=3, tag_types=('XYZ', 'curv'), data_size=0,
+                            color_space='RGB', seed=0):
+    """
+    按片段产出一个结构合法的 ICC Profile。
+    tag_count: 标签数量
+    tag_types: 依次循环使用的标签类型 (XYZ, curv, mft2, mAB)
+    data_size: curv/mft2/mAB 标签数据的总字节预算 (近似值)
+    color_space: 'RGB' 或 'GRAY'，必须与 PNG 的颜色类型相符
+    """
+    if tag_count < 1:
+        raise ValueError("ICC profile needs at least one tag")
+    tag_types = tuple(tag_types)
+    for tag_type in tag_types:
+        if tag_type not in ICC_TAG_TYPES:
+            raise ValueError(f"Unknown ICC tag type '{tag_type}'")
+    if color_space not in ('RGB', 'GRAY'):
+        raise ValueError(f"Unsupported ICC color space '{color_space}'")
+
+    fill = _fill_piece(random.Random(seed))
+    tags = _plan_tags(tag_count, tag_types, data_size, color_space)
+
+    offset = ICC_HEADER_SIZE + 4 + ICC_TAG_ENTRY_SIZE * tag_count
+    tag_table = struct.pack('>I', tag_count)
+    for tag in tags:
+        offset = _align4(offset)
+        tag_table += tag.signature + struct.pack('>II', offset, tag.size)
+        offset += tag.size
+    # libpng 要求 Profile 总长度为 4 的倍数
+    profile_size = _align4(offset)
+    if profile_size > 0xFFFFFFFF:
+        raise ValueError(f"ICC profile too large: {profile_size} bytes")
+
+    # mAB 是 v4 的标签类型，其余情况声明为 v2.1
+    version = 0x04200000 if 'mAB' in tag_types else 0x02100000
+    header = struct.pack('>I4sI4s4s4s', profile_size, b'TEST', version, b'mntr',
+                         color_space.encode('ascii').ljust(4), b'XYZ ')
+    header += b'\x00' * 12                      # Date
+    header += b'acspAPPL'                       # 签名与主平台
+    header += b'\x00' * 20                      # Flags, 设备厂商/型号/属性
+    header += struct.pack('>I', 0)              # Rendering Intent (perceptual)
+    header += _D50_XYZ
+    header += b'CREA'
+    header += b'\x00' * (ICC_HEADER_SIZE - len(header))
+    yield header
+    yield tag_table
+
+    written = ICC_HEADER_SIZE + len(tag_table)
+    for tag in tags:
+        if written & 3:
+            yield b'\x00' * (4 - (written & 3))
+            written = _align4(written)
+        for piece in tag.pieces(fill):
+            written += len(piece)
+            yield piece
+    if profile_size > written:
+        yield b'\x00' * (profile_size - written)
+
+
+def build_icc_profile(**kwargs):
+    """返回完整的未压缩 ICC Profile 字节串，参数同 iter_icc_profile_pieces。"""
+    return b''.join(iter_icc_profile_pieces(**kwargs))
+
+
+@functools.lru_cache(maxsize=32)
+def _compressed_icc_profile(tag_count, tag_types, data_size, color_space, seed, compression_profile):
+    pieces = iter_icc_profile_pieces(tag_count=tag_count, tag_types=tag_types,
+                                     data_size=data_size, color_space=color_space,
+                                     seed=seed)
+    return compress_pieces_with_profile(pieces, compression_profile)
+
+
+def compressed_icc_profile(tag_count=3, tag_types=('XYZ', 'curv'), data_size=0,
+                           color_space='RGB', seed=0,
+                           compression_profile=DEFAULT_COMPRESSION_PROFILE):
+    """
+    返回压缩后的 ICC Profile (可直接用于 iCCP 数据块)。
+    结果按参数 (含压缩配置) 缓存 (LRU)，相同参数的种子复用压缩结果。
+    """
+    return _compressed_icc_profile(tag_count, tuple(tag_types), data_size, color_space, seed,
+                                   parse_compression_profile(compression_profile))
@@ -0,0 +1,183 @@
+# libpng_batch.py
+"""
+用 libpng 简化 API 批量解码内存中的 PNG，输出缓冲区按大小分级放在池中反复使用。
+
+ctypes 调用期间会释放 GIL，因此线程池中的解码是真正并行的；同时在途的图像数有上限，
+缓冲区总量只取决于并发度与图像大小，而与解码的图像总数无关。
+
+    decoder = BatchDecoder(LibPNG(), workers=8)
+    for item in decoder.decode_iter(datas):
+        with item:
+            use(item.result.pixels)   # 离开 with 后缓冲区回到池中，pixels 不能再用
+
+    python libpng_batch.py ../../../randPNG_seeds --loops 100 -j 8
+"""
+import argparse
+import collections
+import concurrent.futures
+import gc
+import os
+import resource
+import sys
+import threading
+import time
+
+from libpng_ctypes import PNG_FORMAT_RGBA, LibPNG
+from png_generator_utils import iter_files
+
+_MIN_SIZE_CLASS = 4096
+
+def size_class(size):
+    """不小于 size 的 2 的幂 (至少 4096)。"""
+    return max(_MIN_SIZE_CLASS, 1 << (size - 1).bit_length())
+
+class BufferPool:
+    """
+    按大小分级的可重用输出缓冲区 (bytearray 或 NumPy uint8 数组)。
+    每级最多保留 max_free 个空闲缓冲区，多出的在 release 时丢弃。
+    """
+
+    def __init__(self, max_free=16, use_numpy=False):
+        self.max_free = max_free
+        self.use_numpy = use_numpy
+        if use_numpy:
+            import numpy as np
+            self._new = lambda size: np.empty(size, dtype=np.uint8)
+        else:
+            self._new = bytearray
+        self._free = collections.defaultdict(list)
+        self._lock = threading.Lock()
+        self.allocated = 0        # 新分配的缓冲区个数
+        self.reused = 0           # 从池中取出的次数
+        self.allocated_bytes = 0  # 新分配的总字节数
+
+    def acquire(self, size):
+        """取出一个至少 size 字节的缓冲区。"""
+        size = size_class(size)
+        with self._lock:
+            free = self._free[size]
+            if free:
+                self.reused += 1
+                return free.pop()
+            self.allocated += 1
+            self.allocated_bytes += size
+        return self._new(size)
+
+    def release(self, buffer):
+        with self._lock:
+            free = self._free[len(buffer)]
+            if len(free) < self.max_free:
+                free.append(buffer)
+
+    def retained_bytes(self):
+        with self._lock:
+            return sum(size * len(free) for size, free in self._free.items())
+
+class BatchItem:
+    """
+    一张图像的解码结果。result 为 LibPNG.decode 的 DecodeResult，
+    其 pixels 指向池中的缓冲区，调用 release (或退出 with) 之后不能再使用。
+    """
+
+    def __init__(self, index, result, buffer, pool):
+        self.index = index
+        self.result = result
+        self._buffer = buffer
+        self._pool = pool
+
+    def release(self):
+        if self._buffer is not None:
+            self._pool.release(self._buffer)
+            self._buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+class BatchDecoder:
+    """
+    用线程池并行调用简化 API。最多同时有 workers + backlog 张图像在解码或等待调用者取走，
+    结果按输入顺序产生。
+    """
+
+    def __init__(self, libpng, workers=os.cpu_count(), fmt=None, pool=None, backlog=None):
+        self.libpng = libpng
+        self.workers = workers
+        self.fmt = fmt
+        self.backlog = workers if backlog is None else backlog
+        self.pool = pool if pool is not None else BufferPool(max_free=workers + self.backlog)
+
+    def _decode(self, index, data):
+        buffers = []
+
+        def allocate(size):
+            buffers.append(self.pool.acquire(size))
+            return buffers[-1]
+
+        result = self.libpng.decode(data, self.fmt, allocate=allocate)
+        if not result.ok and buffers:
+            # 失败的解码不占用缓冲区
+            self.pool.release(buffers.pop())
+        return BatchItem(index, result, buffers[0] if buffers else None, self.pool)
+
+    def decode_iter(self, datas):
+        """按顺序对 datas 中的每个 PNG 数据产生一个 BatchItem；调用者负责 release。"""
+        pending = collections.deque()
+        limit = self.workers + self.backlog
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            for index, data in enumerate(datas):
+                pending.append(executor.submit(self._decode, index, data))
+                if len(pending) >= limit:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == 'darwin' else rss / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode PNG files in bulk with pooled output buffers.')
+    parser.add_argument('paths', nargs='+', help='PNG files or directories (searched recursively)')
+    parser.add_argument('--loops', type=int, default=10, help='decode the inputs this many times')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='decoding threads')
+    parser.add_argument('--rgba', action='store_true', help='decode to 8-bit RGBA instead of the file format')
+    parser.add_argument('--numpy', action='store_true', help='pool NumPy arrays instead of bytearrays')
+    parser.add_argument('--no-pool', action='store_true',
+                        help='allocate a new buffer per image, for comparison')
+    parser.add_argument('--libpng', default=None, help='path to the libpng shared library')
+    args = parser.parse_args()
+
+    datas = []
+    for path in iter_files(args.paths):
+        with open(path, 'rb') as f:
+            datas.append(f.read())
+
+    libpng = LibPNG(args.libpng)
+    decoder = BatchDecoder(libpng, args.workers, PNG_FORMAT_RGBA if args.rgba else None,
+                           BufferPool(use_numpy=args.numpy) if not args.no_pool else None)
+    if args.no_pool:
+        decoder.pool.max_free = 0
+    inputs = (data for _ in range(args.loops) for data in datas)
+    gc_before = sum(stats['collections'] for stats in gc.get_stats())
+    start = time.perf_counter()
+    count = ok = pixels = 0
+    for item in decoder.decode_iter(inputs):
+        with item:
+            count += 1
+            if item.result.ok:
+                ok += 1
+                pixels += len(item.result.pixels)
+    elapsed = time.perf_counter() - start
+    gc_runs = sum(stats['collections'] for stats in gc.get_stats()) - gc_before
+    pool = decoder.pool
+    print(f"libpng {libpng.version()} ({libpng.path})")
+    print(f"{count} images ({ok} ok) in {elapsed:.2f}s: {count / elapsed:.0f} images/s, "
+          f"{pixels / elapsed / 1e6:.1f} MB/s of pixels, {args.workers} threads")
+    print(f"buffers: {pool.allocated} allocated ({pool.allocated_bytes / 1e6:.1f} MB), {pool.reused} reused, "
+          f"{pool.retained_bytes() / 1e6:.1f} MB retained; {gc_runs} GC runs; max RSS {_max_rss_mb():.0f} MB")
+
+if __name__ == "__main__":
+    main()
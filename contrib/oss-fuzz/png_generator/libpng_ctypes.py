@@ -0,0 +1,431 @@
+# libpng_ctypes.py
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+from collections import namedtuple
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+
+# 先找仓库内编译出的库 (autotools 的 .libs 或常见的 CMake 构建目录)，再找系统库
+_IN_TREE_CANDIDATES = [
+    os.path.join(_REPO_ROOT, '.libs', 'libpng16.so'),
+    os.path.join(_REPO_ROOT, 'build', 'libpng16.so'),
+    os.path.join(_REPO_ROOT, '_build', 'libpng16.so'),
+    os.path.join(_REPO_ROOT, '.libs', 'libpng16.dylib'),
+    os.path.join(_REPO_ROOT, 'build', 'libpng16.dylib'),
+]
+
+_SHIM_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'libpng_shim.c')
+
+# png.h 中简化 API 的常量
+PNG_IMAGE_VERSION = 1
+PNG_FORMAT_FLAG_ALPHA = 0x01
+PNG_FORMAT_FLAG_COLOR = 0x02
+PNG_FORMAT_FLAG_LINEAR = 0x04
+PNG_FORMAT_FLAG_COLORMAP = 0x08
+PNG_FORMAT_GRAY = 0
+PNG_FORMAT_GA = PNG_FORMAT_FLAG_ALPHA
+PNG_FORMAT_RGB = PNG_FORMAT_FLAG_COLOR
+PNG_FORMAT_RGBA = PNG_FORMAT_RGB | PNG_FORMAT_FLAG_ALPHA
+PNG_FORMAT_LINEAR_RGB_ALPHA = PNG_FORMAT_RGBA | PNG_FORMAT_FLAG_LINEAR
+
+
+class PngImage(ctypes.Structure):
+    """png_image (简化 API 的控制结构)。"""
+    _fields_ = [
+        ('opaque', ctypes.c_void_p),
+        ('version', ctypes.c_uint32),
+        ('width', ctypes.c_uint32),
+        ('height', ctypes.c_uint32),
+        ('format', ctypes.c_uint32),
+        ('flags', ctypes.c_uint32),
+        ('colormap_entries', ctypes.c_uint32),
+        ('warning_or_error', ctypes.c_uint32),
+        ('message', ctypes.c_char * 64),
+    ]
+
+
+DecodeResult = namedtuple('DecodeResult', 'ok width height format message pixels')
+
+# pixels 为 None 表示解码失败；end_error 表示像素有效但 png_read_end 出错
+RawDecodeResult = namedtuple('RawDecodeResult',
+                             'width height bit_depth color_type interlace rowbytes message end_error pixels')
+
+# bit_depth、color_type 等为文件中的格式，out_bit_depth、out_channels 为变换后的格式；
+# peak_memory 为读取期间 libpng (含 zlib) 分配的内存峰值，解码失败时也有效
+TransformedDecodeResult = namedtuple('TransformedDecodeResult',
+                                     'width height bit_depth color_type interlace rowbytes '
+                                     'out_bit_depth out_channels peak_memory message end_error pixels')
+
+# libpng_shim.c 中 SHIM_* 变换的取值 (png_set_* 的名字去掉前缀)
+SHIM_TRANSFORMS = {
+    'packing': 0x0001,
+    'expand': 0x0002,
+    'expand_16': 0x0004,
+    'strip_16': 0x0008,
+    'scale_16': 0x0010,
+    'gray_to_rgb': 0x0020,
+    'rgb_to_gray': 0x0040,
+    'gamma': 0x0080,
+    'background': 0x0100,
+    'alpha_mode': 0x0200,
+    'filler': 0x0400,
+    'bgr': 0x0800,
+    'swap': 0x1000,
+}
+
+# libpng_shim.c 中 SHIM_UNKNOWN_* 的取值：未知块交给 png_set_keep_unknown_chunks 的
+# NEVER、IF_SAFE (libpng 的 IF_SAFE 指辅助块)、ALWAYS，或由 png_set_read_user_chunk_fn 的回调处理
+UNKNOWN_POLICIES = {
+    'discard': 0,
+    'if-safe': 1,
+    'always': 2,
+    'callback': 3,
+}
+
+# kept_* 为 libpng 保存在 info 结构中的未知块，callback_* 为交给回调的未知块，
+# checksum 为回调读到的数据的校验和；解码失败时这些统计也有效
+UnknownDecodeResult = namedtuple('UnknownDecodeResult',
+                                 'width height bit_depth color_type interlace rowbytes out_bit_depth out_channels '
+                                 'peak_memory kept_chunks kept_bytes callback_chunks callback_bytes checksum '
+                                 'message end_error')
+
+
+def image_size(width, height, fmt):
+    """PNG_IMAGE_SIZE：按格式计算输出缓冲区大小。"""
+    if fmt & PNG_FORMAT_FLAG_COLORMAP:
+        channels = 1
+    else:
+        channels = (fmt & (PNG_FORMAT_FLAG_COLOR | PNG_FORMAT_FLAG_ALPHA)) + 1
+    component_size = 2 if fmt & PNG_FORMAT_FLAG_LINEAR else 1
+    return width * channels * component_size * height
+
+# png.h 中的 PNG_FILTER_* 掩码
+PNG_FILTERS = {
+    'none': 0x08,
+    'sub': 0x10,
+    'up': 0x20,
+    'avg': 0x40,
+    'paeth': 0x80,
+    'all': 0xf8,
+}
+
+# peak_memory 为编码期间 libpng (含 zlib) 分配的内存峰值；失败时 data 为 None
+EncodeResult = namedtuple('EncodeResult', 'data peak_memory message')
+
+
+def parse_filters(text):
+    """把 'sub+paeth' 这样的过滤器组合转换成 png_set_filter 的掩码；'default' 返回 None。"""
+    if text == 'default':
+        return None
+    mask = 0
+    for name in text.split('+'):
+        if name not in PNG_FILTERS:
+            raise ValueError(f"unknown filter '{name}'; choose from {', '.join(PNG_FILTERS)} or default")
+        mask |= PNG_FILTERS[name]
+    return mask
+
+
+def parse_transforms(text):
+    """把 'expand+strip_16' 这样的变换组合转换成 SHIM_* 掩码；'none' 表示不做变换。"""
+    mask = 0
+    for name in text.split('+'):
+        if name == 'none':
+            continue
+        if name not in SHIM_TRANSFORMS:
+            raise ValueError(f"unknown transform '{name}'; choose from {', '.join(SHIM_TRANSFORMS)}")
+        mask |= SHIM_TRANSFORMS[name]
+    return mask
+
+
+def find_libpng(path=None):
+    """按 参数 > LIBPNG_PATH 环境变量 > 仓库内构建 > 系统库 的顺序查找 libpng。"""
+    if path:
+        return path
+    if os.environ.get('LIBPNG_PATH'):
+        return os.environ['LIBPNG_PATH']
+    for candidate in _IN_TREE_CANDIDATES:
+        if os.path.exists(candidate):
+            return candidate
+    found = ctypes.util.find_library('png16') or ctypes.util.find_library('png')
+    if not found:
+        raise OSError("libpng not found; build it in the tree or set LIBPNG_PATH")
+    return found
+
+
+class LibPNG:
+    """通过 ctypes 调用 libpng 的简化读取 API。"""
+
+    def __init__(self, path=None):
+        self.path = find_libpng(path)
+        self.lib = ctypes.CDLL(self.path)
+        self.lib.png_access_version_number.restype = ctypes.c_uint32
+        self.lib.png_image_begin_read_from_memory.argtypes = [
+            ctypes.POINTER(PngImage), ctypes.c_void_p, ctypes.c_size_t]
+        self.lib.png_image_begin_read_from_memory.restype = ctypes.c_int
+        self.lib.png_image_finish_read.argtypes = [
+            ctypes.POINTER(PngImage), ctypes.c_void_p, ctypes.c_void_p,
+            ctypes.c_int32, ctypes.c_void_p]
+        self.lib.png_image_finish_read.restype = ctypes.c_int
+        self.lib.png_image_free.argtypes = [ctypes.POINTER(PngImage)]
+        self.lib.png_image_free.restype = None
+
+    def version(self):
+        return self.lib.png_access_version_number()
+
+    def decode(self, data, fmt=None, out=None, allocate=None):
+        """
+        用简化 API 从内存解码一张 PNG。
+        fmt: 输出格式 (None 表示使用文件自身的格式)
+        out: 可选的可写缓冲区 (bytearray)，大小不足时重新分配
+        allocate: 可选，allocate(size) 返回至少 size 字节的可写缓冲区，代替 bytearray(size) 分配
+        返回 DecodeResult；失败时 ok 为 False，message 为 libpng 的错误信息。
+        """
+        image = PngImage()
+        image.version = PNG_IMAGE_VERSION
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        if not self.lib.png_image_begin_read_from_memory(ctypes.byref(image), data, len(data)):
+            return DecodeResult(False, 0, 0, 0, image.message.decode('latin-1'), None)
+        if fmt is not None:
+            image.format = fmt
+        size = image_size(image.width, image.height, image.format)
+        if out is None or len(out) < size:
+            out = allocate(size) if allocate is not None else bytearray(size)
+        buffer = (ctypes.c_char * len(out)).from_buffer(out)
+        colormap = None
+        if image.format & PNG_FORMAT_FLAG_COLORMAP:
+            colormap = ctypes.create_string_buffer(256 * 4 * 2)
+        ok = self.lib.png_image_finish_read(ctypes.byref(image), None, buffer, 0, colormap)
+        message = image.message.decode('latin-1')
+        if not ok:
+            self.lib.png_image_free(ctypes.byref(image))
+            return DecodeResult(False, image.width, image.height, image.format, message, None)
+        return DecodeResult(True, image.width, image.height, image.format, message,
+                            memoryview(out)[:size])
+
+
+def pnglibconf_path(library_path):
+    """
+    与实际载入的库 (loaded_library_path) 对应的 pnglibconf.h：取库所在的目录或其上一级
+    (如 .libs 的上一级构建目录) 中的。找不到时 (例如发行版的系统库) 返回 None。
+    """
+    library_dir = os.path.dirname(os.path.abspath(loaded_library_path(library_path)))
+    for candidate in (library_dir, os.path.dirname(library_dir)):
+        if os.path.exists(os.path.join(candidate, 'pnglibconf.h')):
+            return os.path.join(candidate, 'pnglibconf.h')
+    return None
+
+class _DlInfo(ctypes.Structure):
+    _fields_ = [('dli_fname', ctypes.c_char_p), ('dli_fbase', ctypes.c_void_p),
+                ('dli_sname', ctypes.c_char_p), ('dli_saddr', ctypes.c_void_p)]
+
+
+def loaded_library_path(library_path):
+    """
+    实际载入的库文件：library_path 是库名 (由 find_library 找到的系统库，如 libpng16.so.16) 时，
+    用 dladdr 查出 png_access_version_number 所在的文件；查不到时原样返回。
+    只有含路径分隔符的 library_path 才当作文件，库名不会从当前目录载入。
+    """
+    if os.sep in library_path or (os.altsep and os.altsep in library_path):
+        return library_path
+    lib = ctypes.CDLL(library_path)
+    symbol = ctypes.cast(lib.png_access_version_number, ctypes.c_void_p)
+    for name in (None, ctypes.util.find_library('dl')):
+        try:
+            dladdr = ctypes.CDLL(name).dladdr
+        except (OSError, AttributeError):
+            continue
+        dladdr.argtypes = [ctypes.c_void_p, ctypes.POINTER(_DlInfo)]
+        info = _DlInfo()
+        if dladdr(symbol, ctypes.byref(info)) and info.dli_fname:
+            path = os.fsdecode(info.dli_fname)
+            if os.path.exists(path):
+                return os.path.realpath(path)
+    return library_path
+
+
+def build_identity(library_path):
+    """
+    标识一个 libpng 构建：库版本号、库文件内容与 pnglibconf.h 内容 (找得到时) 的 SHA-256 (前 16 个十六进制字符)。
+    同一份源码换了配置选项或编译器得到的是不同的构建；系统库升级后库文件内容也随之改变。
+    """
+    lib = ctypes.CDLL(library_path)
+    lib.png_access_version_number.restype = ctypes.c_uint32
+    digest = hashlib.sha256(str(lib.png_access_version_number()).encode())
+    path = loaded_library_path(library_path)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    else:
+        digest.update(library_path.encode())
+    config = pnglibconf_path(library_path)
+    if config is not None:
+        with open(config, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def _shim_include_dirs(library_path):
+    """
+    编译 shim 用的头文件目录：png.h 取自仓库，pnglibconf.h 见 pnglibconf_path；
+    库旁边没有 pnglibconf.h 时用 scripts/pnglibconf.h.prebuilt 编译 (不计入 build_identity)。
+    """
+    config = pnglibconf_path(library_path)
+    if config is not None:
+        return [os.path.dirname(config), _REPO_ROOT]
+    config = os.path.join(_REPO_ROOT, 'scripts', 'pnglibconf.h.prebuilt')
+    prebuilt_dir = os.path.join(tempfile.gettempdir(), 'libpng_shim_include')
+    os.makedirs(prebuilt_dir, exist_ok=True)
+    with open(config, 'rb') as f:
+        prebuilt = f.read()
+    with open(os.path.join(prebuilt_dir, 'pnglibconf.h'), 'wb') as f:
+        f.write(prebuilt)
+    return [prebuilt_dir, _REPO_ROOT]
+
+def build_shim(library_path, source=_SHIM_SOURCE):
+    """
+    编译 libpng_shim.c (按源码和库路径缓存在临时目录)，返回共享库路径。
+    编译器取 CC 环境变量，默认 cc。
+    """
+    with open(source, 'rb') as f:
+        code = f.read()
+    key = hashlib.sha1(code + os.path.abspath(loaded_library_path(library_path)).encode()).hexdigest()[:16]
+    output = os.path.join(tempfile.gettempdir(), f'libpng_shim-{key}.so')
+    if os.path.exists(output):
+        return output
+    command = [os.environ.get('CC', 'cc'), '-O2', '-shared', '-fPIC', '-o', output + f'.{os.getpid()}', source]
+    command += [f'-I{path}' for path in _shim_include_dirs(library_path)]
+    if sys.platform == 'darwin':
+        command += ['-undefined', 'dynamic_lookup']
+    try:
+        subprocess.run(command, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        raise OSError(f"cannot build {source}: {e.stderr.decode(errors='replace')}") from e
+    # 多个进程可能同时编译；rename 是原子的
+    os.replace(output + f'.{os.getpid()}', output)
+    return output
+
+
+class LibPNGShim:
+    """
+    通过 libpng_shim.c 调用 libpng 的完整读取 API (需要 setjmp 的部分放在 C 里)。
+    shim 本身不链接 libpng，由先以 RTLD_GLOBAL 载入的库提供符号。
+    """
+
+    def __init__(self, path=None):
+        self.path = find_libpng(path)
+        self.lib = ctypes.CDLL(self.path, mode=ctypes.RTLD_GLOBAL)
+        self.lib.png_access_version_number.restype = ctypes.c_uint32
+        self.shim = ctypes.CDLL(build_shim(self.path))
+        self.shim.shim_decode_raw.argtypes = [
+            ctypes.c_char_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_void_p),
+            ctypes.POINTER(ctypes.c_uint32), ctypes.c_char_p, ctypes.c_size_t]
+        self.shim.shim_decode_raw.restype = ctypes.c_int
+        self.shim.shim_decode_transformed.argtypes = [
+            ctypes.c_char_p, ctypes.c_size_t, ctypes.c_uint, ctypes.POINTER(ctypes.c_void_p),
+            ctypes.POINTER(ctypes.c_uint32), ctypes.c_char_p, ctypes.c_size_t]
+        self.shim.shim_decode_transformed.restype = ctypes.c_int
+        self.shim.shim_decode_unknown.argtypes = [
+            ctypes.c_char_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_long, ctypes.c_long,
+            ctypes.POINTER(ctypes.c_uint32), ctypes.POINTER(ctypes.c_uint32), ctypes.c_char_p, ctypes.c_size_t]
+        self.shim.shim_decode_unknown.restype = ctypes.c_int
+        self.shim.shim_encode.argtypes = [
+            ctypes.c_char_p, ctypes.c_uint32, ctypes.c_uint32, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+            ctypes.c_char_p, ctypes.c_int, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_void_p),
+            ctypes.POINTER(ctypes.c_size_t), ctypes.POINTER(ctypes.c_size_t), ctypes.c_char_p, ctypes.c_size_t]
+        self.shim.shim_encode.restype = ctypes.c_int
+        self.shim.shim_free.argtypes = [ctypes.c_void_p]
+        self.shim.shim_free.restype = None
+
+    def version(self):
+        return self.lib.png_access_version_number()
+
+    def decode_raw(self, data):
+        """
+        不做颜色变换地解码：位深 < 8 时每个样本一个字节 (png_set_packing)，
+        16 位样本为大端序两个字节，调色板图像返回索引；交错图像返回完整图像。
+        返回 RawDecodeResult。
+        """
+        pointer = ctypes.c_void_p()
+        info = (ctypes.c_uint32 * 9)()
+        message = ctypes.create_string_buffer(128)
+        status = self.shim.shim_decode_raw(bytes(data), len(data), ctypes.byref(pointer), info,
+                                           message, len(message))
+        text = message.value.decode('latin-1')
+        if status == 0:
+            return RawDecodeResult(0, 0, 0, 0, 0, 0, text, False, None)
+        try:
+            pixels = ctypes.string_at(pointer, info[1] * info[5])
+        finally:
+            self.shim.shim_free(pointer)
+        return RawDecodeResult(info[0], info[1], info[2], info[3], info[4], info[5], text, status == 2, pixels)
+
+    def decode_transformed(self, data, transforms, keep_pixels=False):
+        """
+        以 SHIM_* 变换掩码 (见 parse_transforms) 解码；keep_pixels 为 False 时
+        像素在 C 中解码后直接丢弃，只返回格式信息，用于测量变换本身的开销。
+        返回 TransformedDecodeResult；解码失败时 rowbytes 为 0。
+        """
+        pointer = ctypes.c_void_p()
+        info = (ctypes.c_uint32 * 9)()
+        message = ctypes.create_string_buffer(128)
+        status = self.shim.shim_decode_transformed(data if isinstance(data, bytes) else bytes(data), len(data),
+                                                   transforms, ctypes.byref(pointer) if keep_pixels else None,
+                                                   info, message, len(message))
+        text = message.value.decode('latin-1')
+        pixels = None
+        if status and keep_pixels:
+            try:
+                pixels = ctypes.string_at(pointer, info[1] * info[5])
+            finally:
+                self.shim.shim_free(pointer)
+        return TransformedDecodeResult(*info, text, status == 2, pixels)
+
+    def decode_unknown(self, data, policy, cache_max=None, malloc_max=None):
+        """
+        以 UNKNOWN_POLICIES 中的策略处理未知块并解码 (像素在 C 中丢弃)。
+        cache_max、malloc_max 传给 png_set_chunk_cache_max、png_set_chunk_malloc_max
+        (0 表示不限制)，为 None 时使用 libpng 的默认值。返回 UnknownDecodeResult。
+        """
+        info = (ctypes.c_uint32 * 9)()
+        stats = (ctypes.c_uint32 * 5)()
+        message = ctypes.create_string_buffer(128)
+        status = self.shim.shim_decode_unknown(data if isinstance(data, bytes) else bytes(data), len(data),
+                                               UNKNOWN_POLICIES[policy],
+                                               -1 if cache_max is None else cache_max,
+                                               -1 if malloc_max is None else malloc_max,
+                                               info, stats, message, len(message))
+        return UnknownDecodeResult(*info, *stats, message.value.decode('latin-1'), status == 2)
+
+    def encode(self, pixels, width, height, bit_depth, color_type, interlace=0, palette=None,
+               filters=None, level=None, strategy=None, window_bits=None, mem_level=None, buffer_size=None):
+        """
+        用 png_write_* 编码一幅图像。pixels 为不带过滤类型字节的 PNG 行
+        (位深 < 8 时按位打包，16 位为大端序)；palette 为调色板图像的 RGB 三元组字节串。
+        filters 为 PNG_FILTERS 的掩码 (见 parse_filters)，strategy 为 zlib 的 Z_* 取值；
+        为 None 的设置使用 libpng 的默认值。返回 EncodeResult。
+        """
+        settings = (ctypes.c_int * 6)(*(-1 if value is None else value for value in
+                                        (filters, level, strategy, window_bits, mem_level, buffer_size)))
+        pointer = ctypes.c_void_p()
+        size = ctypes.c_size_t()
+        peak = ctypes.c_size_t()
+        message = ctypes.create_string_buffer(128)
+        palette = bytes(palette or b'')
+        status = self.shim.shim_encode(pixels if isinstance(pixels, bytes) else bytes(pixels), width, height,
+                                       bit_depth, color_type, interlace, palette, len(palette) // 3, settings,
+                                       ctypes.byref(pointer), ctypes.byref(size), ctypes.byref(peak),
+                                       message, len(message))
+        text = message.value.decode('latin-1')
+        if not status:
+            return EncodeResult(None, 0, text)
+        try:
+            data = ctypes.string_at(pointer, size.value)
+        finally:
+            self.shim.shim_free(pointer)
+        return EncodeResult(data, peak.value, text)
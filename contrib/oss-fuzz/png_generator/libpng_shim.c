@@ -0,0 +1,691 @@
+/* libpng_shim.c - wrappers around the libpng read and write APIs, for
+ * libpng_ctypes.py
+ *
+ * The full libpng API reports errors by longjmp, which cannot cross a
+ * ctypes call, so the calls that may fail are made from here.  This file
+ * is compiled on demand by libpng_ctypes.py and is not linked against
+ * libpng: the library that libpng_ctypes.py loaded first (with RTLD_GLOBAL)
+ * provides the png_* symbols.
+ */
+
+#include <setjmp.h>
+#include <stdlib.h>
+#include <string.h>
+
+#include "png.h"
+
+#define SHIM_IMAGE_SIZE_MAX ((size_t)1 << 30)
+
+/* shim_decode_raw() return values */
+#define SHIM_ERROR 0     /* no pixels */
+#define SHIM_OK 1
+#define SHIM_END_ERROR 2 /* the pixels are valid, png_read_end failed */
+
+typedef struct
+{
+   const unsigned char *data;
+   size_t size;
+   size_t pos;
+   char *message;
+   size_t message_size;
+} shim_source;
+
+static void
+shim_error(png_structp png_ptr, png_const_charp message)
+{
+   shim_source *source = (shim_source *)png_get_error_ptr(png_ptr);
+
+   if (source->message != NULL && source->message_size > 0)
+   {
+      strncpy(source->message, message, source->message_size - 1);
+      source->message[source->message_size - 1] = '\0';
+   }
+   png_longjmp(png_ptr, 1);
+}
+
+static void
+shim_warning(png_structp png_ptr, png_const_charp message)
+{
+   (void)png_ptr;
+   (void)message;
+}
+
+static void
+shim_read(png_structp png_ptr, png_bytep out, size_t length)
+{
+   shim_source *source = (shim_source *)png_get_io_ptr(png_ptr);
+
+   if (length > source->size - source->pos)
+      png_error(png_ptr, "read beyond end of data");
+   memcpy(out, source->data + source->pos, length);
+   source->pos += length;
+}
+
+/* Allocation accounting for one png_struct, to report the peak memory that
+ * libpng (including zlib, which allocates through libpng) used for a read or
+ * write.
+ * Each block is preceded by its size.
+ */
+typedef struct
+{
+   size_t current;
+   size_t peak;
+} shim_memory;
+
+typedef union
+{
+   size_t size;
+   double align_double;
+   void *align_pointer;
+} shim_block_header;
+
+static png_uint_32
+shim_peak(const shim_memory *memory)
+{
+   return memory->peak < 0xffffffffU ? (png_uint_32)memory->peak : 0xffffffffU;
+}
+
+#ifdef PNG_USER_MEM_SUPPORTED
+static png_voidp
+shim_malloc(png_structp png_ptr, png_alloc_size_t size)
+{
+   shim_memory *memory = (shim_memory *)png_get_mem_ptr(png_ptr);
+   shim_block_header *block;
+
+   if (size > (png_alloc_size_t)-1 - sizeof *block)
+      return NULL;
+   block = (shim_block_header *)malloc(sizeof *block + size);
+   if (block == NULL)
+      return NULL;
+   block->size = size;
+   memory->current += size;
+   if (memory->current > memory->peak)
+      memory->peak = memory->current;
+   return block + 1;
+}
+
+static void
+shim_free_block(png_structp png_ptr, png_voidp pointer)
+{
+   shim_memory *memory = (shim_memory *)png_get_mem_ptr(png_ptr);
+   shim_block_header *block;
+
+   if (pointer == NULL)
+      return;
+   block = (shim_block_header *)pointer - 1;
+   memory->current -= block->size;
+   free(block);
+}
+#endif /* PNG_USER_MEM_SUPPORTED */
+
+/* Transformations for shim_decode_transformed(); keep these in sync with
+ * SHIM_TRANSFORMS in libpng_ctypes.py.
+ */
+#define SHIM_PACKING      0x0001
+#define SHIM_EXPAND       0x0002
+#define SHIM_EXPAND_16    0x0004
+#define SHIM_STRIP_16     0x0008
+#define SHIM_SCALE_16     0x0010
+#define SHIM_GRAY_TO_RGB  0x0020
+#define SHIM_RGB_TO_GRAY  0x0040
+#define SHIM_GAMMA        0x0080
+#define SHIM_BACKGROUND   0x0100
+#define SHIM_ALPHA_MODE   0x0200
+#define SHIM_FILLER       0x0400
+#define SHIM_BGR          0x0800
+#define SHIM_SWAP         0x1000
+
+#define SHIM_UNSUPPORTED(png_ptr) \
+   png_error(png_ptr, "transform not supported by this libpng")
+
+/* Ask libpng for the transformations in the transforms mask.  The gamma
+ * values are fixed: the file gamma defaults to sRGB and the screen is
+ * assumed to be a 1.8 gamma display, so that the gamma paths actually run.
+ */
+static void
+shim_set_transforms(png_structp png_ptr, unsigned int transforms)
+{
+   if ((transforms & SHIM_PACKING) != 0)
+#ifdef PNG_READ_PACK_SUPPORTED
+      png_set_packing(png_ptr);
+#else
+      SHIM_UNSUPPORTED(png_ptr);
+#endif
+   if ((transforms & SHIM_EXPAND) != 0)
+#ifdef PNG_READ_EXPAND_SUPPORTED
+      png_set_expand(png_ptr);
+#else
+      SHIM_UNSUPPORTED(png_ptr);
+#endif
+   if ((transforms & SHIM_EXPAND_16) != 0)
+#ifdef PNG_READ_EXPAND_16_SUPPORTED
+      png_set_expand_16(png_ptr);
+#else
+      SHIM_UNSUPPORTED(png_ptr);
+#endif
+   if ((transforms & SHIM_STRIP_16) != 0)
+#ifdef PNG_READ_STRIP_16_TO_8_SUPPORTED
+      png_set_strip_16(png_ptr);
+#else
+      SHIM_UNSUPPORTED(png_ptr);
+#endif
+   if ((transforms & SHIM_SCALE_16) != 0)
+#ifdef PNG_READ_SCALE_16_TO_8_SUPPORTED
+      png_set_scale_16(png_ptr);
+#else
+      SHIM_UNSUPPORTED(png_ptr);
+#endif
+   if ((transforms & SHIM_GRAY_TO_RGB) != 0)
+#ifdef PNG_READ_GRAY_TO_RGB_SUPPORTED
+      png_set_gray_to_rgb(png_ptr);
+#else
+      SHIM_UNSUPPORTED(png_ptr);
+#endif
+   if ((transforms & SHIM_RGB_TO_GRAY) != 0)
+#ifdef PNG_READ_RGB_TO_GRAY_SUPPORTED
+      png_set_rgb_to_gray_fixed(png_ptr, PNG_ERROR_ACTION_NONE, -1, -1);
+#else
+      SHIM_UNSUPPORTED(png_ptr);
+#endif
+   if ((transforms & SHIM_ALPHA_MODE) != 0)
+#ifdef PNG_READ_ALPHA_MODE_SUPPORTED
+      png_set_alpha_mode_fixed(png_ptr, PNG_ALPHA_PREMULTIPLIED,
+          PNG_DEFAULT_sRGB);
+#else
+      SHIM_UNSUPPORTED(png_ptr);
+#endif
+   if ((transforms & SHIM_GAMMA) != 0)
+#ifdef PNG_READ_GAMMA_SUPPORTED
+      png_set_gamma_fixed(png_ptr, PNG_GAMMA_MAC_18, PNG_DEFAULT_sRGB);
+#else
+      SHIM_UNSUPPORTED(png_ptr);
+#endif
+   if ((transforms & SHIM_BACKGROUND) != 0)
+   {
+#ifdef PNG_READ_BACKGROUND_SUPPORTED
+      png_color_16 background;
+
+      /* Mid gray in the screen format, valid for any output bit depth. */
+      memset(&background, 0, sizeof background);
+      background.red = background.green = background.blue = 0x80;
+      background.gray = 0x80;
+      png_set_background_fixed(png_ptr, &background,
+          PNG_BACKGROUND_GAMMA_SCREEN, 0, PNG_FP_1);
+#else
+      SHIM_UNSUPPORTED(png_ptr);
+#endif
+   }
+   if ((transforms & SHIM_FILLER) != 0)
+#ifdef PNG_READ_FILLER_SUPPORTED
+      png_set_add_alpha(png_ptr, 0xffff, PNG_FILLER_AFTER);
+#else
+      SHIM_UNSUPPORTED(png_ptr);
+#endif
+   if ((transforms & SHIM_BGR) != 0)
+#ifdef PNG_READ_BGR_SUPPORTED
+      png_set_bgr(png_ptr);
+#else
+      SHIM_UNSUPPORTED(png_ptr);
+#endif
+   if ((transforms & SHIM_SWAP) != 0)
+#ifdef PNG_READ_SWAP_SUPPORTED
+      png_set_swap(png_ptr);
+#else
+      SHIM_UNSUPPORTED(png_ptr);
+#endif
+}
+
+/* Unknown chunk handling for shim_decode_unknown(); keep these in sync with
+ * UNKNOWN_POLICIES in libpng_ctypes.py.
+ */
+#define SHIM_UNKNOWN_DISCARD  0 /* PNG_HANDLE_CHUNK_NEVER */
+#define SHIM_UNKNOWN_IF_SAFE  1 /* PNG_HANDLE_CHUNK_IF_SAFE */
+#define SHIM_UNKNOWN_ALWAYS   2 /* PNG_HANDLE_CHUNK_ALWAYS */
+#define SHIM_UNKNOWN_CALLBACK 3 /* a read user chunk callback handles them */
+
+typedef struct
+{
+   int policy;
+   long cache_max;  /* png_set_chunk_cache_max, -1 for the default */
+   long malloc_max; /* png_set_chunk_malloc_max, -1 for the default */
+   png_uint_32 kept_chunks;
+   png_uint_32 kept_bytes;
+   png_uint_32 callback_chunks;
+   png_uint_32 callback_bytes;
+   png_uint_32 checksum;
+} shim_unknown;
+
+#ifdef PNG_READ_USER_CHUNKS_SUPPORTED
+/* Stands in for an application that parses its vendor chunks: it reads
+ * every byte of the chunk and reports the chunk as handled.
+ */
+static int
+shim_user_chunk(png_structp png_ptr, png_unknown_chunkp chunk)
+{
+   shim_unknown *unknown = (shim_unknown *)png_get_user_chunk_ptr(png_ptr);
+   png_uint_32 checksum = unknown->checksum;
+   size_t i;
+
+   for (i = 0; i < chunk->size; i++)
+      checksum = checksum * 31 + chunk->data[i];
+   unknown->checksum = checksum;
+   unknown->callback_chunks++;
+   unknown->callback_bytes += (png_uint_32)chunk->size;
+   return 1;
+}
+#endif
+
+static void
+shim_set_unknown(png_structp png_ptr, shim_unknown *unknown)
+{
+#ifdef PNG_SET_USER_LIMITS_SUPPORTED
+   if (unknown->cache_max >= 0)
+      png_set_chunk_cache_max(png_ptr, (png_uint_32)unknown->cache_max);
+   if (unknown->malloc_max >= 0)
+      png_set_chunk_malloc_max(png_ptr, (png_alloc_size_t)unknown->malloc_max);
+#endif
+#ifdef PNG_HANDLE_AS_UNKNOWN_SUPPORTED
+   switch (unknown->policy)
+   {
+      case SHIM_UNKNOWN_IF_SAFE:
+         png_set_keep_unknown_chunks(png_ptr, PNG_HANDLE_CHUNK_IF_SAFE, NULL, 0);
+         return;
+
+      case SHIM_UNKNOWN_ALWAYS:
+         png_set_keep_unknown_chunks(png_ptr, PNG_HANDLE_CHUNK_ALWAYS, NULL, 0);
+         return;
+
+      case SHIM_UNKNOWN_CALLBACK:
+#  ifdef PNG_READ_USER_CHUNKS_SUPPORTED
+         png_set_keep_unknown_chunks(png_ptr, PNG_HANDLE_CHUNK_NEVER, NULL, 0);
+         png_set_read_user_chunk_fn(png_ptr, unknown, shim_user_chunk);
+         return;
+#  else
+         break;
+#  endif
+
+      default:
+         png_set_keep_unknown_chunks(png_ptr, PNG_HANDLE_CHUNK_NEVER, NULL, 0);
+         return;
+   }
+#endif
+   png_error(png_ptr, "unknown chunk policy not supported by this libpng");
+}
+
+/* Count the unknown chunks libpng stored in info_ptr. */
+static void
+shim_count_unknown(png_structp png_ptr, png_infop info_ptr,
+    shim_unknown *unknown)
+{
+#ifdef PNG_STORE_UNKNOWN_CHUNKS_SUPPORTED
+   png_unknown_chunkp chunks;
+   int count, i;
+
+   if (info_ptr == NULL)
+      return;
+   count = png_get_unknown_chunks(png_ptr, info_ptr, &chunks);
+   for (i = 0; i < count; i++)
+   {
+      unknown->kept_chunks++;
+      unknown->kept_bytes += (png_uint_32)chunks[i].size;
+   }
+#else
+   (void)png_ptr;
+   (void)info_ptr;
+   (void)unknown;
+#endif
+}
+
+/* Decode the image with the transformations in the transforms mask and, if
+ * unknown is not NULL, its unknown chunk handling.
+ *
+ * info receives width, height, bit_depth, color_type, interlace and rowbytes
+ * of the image as stored, the bit depth and channel count of the transformed
+ * rows, then the peak number of bytes libpng had allocated while reading the
+ * image (not counting the rows, which the shim allocates).  Only the peak is
+ * set when the image cannot be decoded.  On success, *pixels is allocated
+ * with malloc; free it with shim_free.  If pixels is NULL the image is
+ * decoded and discarded, which is what a benchmark wants.
+ */
+static int
+shim_decode(const unsigned char *data, size_t size, unsigned int transforms,
+    shim_unknown *unknown, unsigned char **pixels, png_uint_32 *info,
+    char *message, size_t message_size)
+{
+   shim_source source;
+   shim_memory memory;
+   png_structp png_ptr;
+   png_infop info_ptr;
+   png_infop end_info_ptr = NULL;
+   unsigned char *volatile image = NULL;
+   png_bytepp volatile rows = NULL;
+   volatile int stage = SHIM_ERROR;
+   png_uint_32 width, height, y;
+   int bit_depth, color_type, interlace;
+   size_t rowbytes;
+
+   source.data = data;
+   source.size = size;
+   source.pos = 0;
+   source.message = message;
+   source.message_size = message_size;
+   memset(&memory, 0, sizeof memory);
+   if (pixels != NULL)
+      *pixels = NULL;
+   if (message_size > 0)
+      message[0] = '\0';
+
+#ifdef PNG_USER_MEM_SUPPORTED
+   png_ptr = png_create_read_struct_2(PNG_LIBPNG_VER_STRING, &source,
+       shim_error, shim_warning, &memory, shim_malloc, shim_free_block);
+#else
+   png_ptr = png_create_read_struct(PNG_LIBPNG_VER_STRING, &source,
+       shim_error, shim_warning);
+#endif
+   if (png_ptr == NULL)
+      return SHIM_ERROR;
+   info_ptr = png_create_info_struct(png_ptr);
+   if (info_ptr == NULL)
+   {
+      png_destroy_read_struct(&png_ptr, NULL, NULL);
+      return SHIM_ERROR;
+   }
+   if (unknown != NULL)
+   {
+      /* Unknown chunks after the image data are stored here. */
+      end_info_ptr = png_create_info_struct(png_ptr);
+      if (end_info_ptr == NULL)
+      {
+         png_destroy_read_struct(&png_ptr, &info_ptr, NULL);
+         return SHIM_ERROR;
+      }
+   }
+
+   if (setjmp(png_jmpbuf(png_ptr)))
+   {
+      info[8] = shim_peak(&memory);
+      if (unknown != NULL)
+      {
+         shim_count_unknown(png_ptr, info_ptr, unknown);
+         shim_count_unknown(png_ptr, end_info_ptr, unknown);
+      }
+      free(rows);
+      if (stage == SHIM_ERROR || pixels == NULL)
+         free(image);
+      else
+         *pixels = image;
+      png_destroy_read_struct(&png_ptr, &info_ptr, &end_info_ptr);
+      return stage == SHIM_ERROR ? SHIM_ERROR : SHIM_END_ERROR;
+   }
+
+   png_set_read_fn(png_ptr, &source, shim_read);
+   if (unknown != NULL)
+      shim_set_unknown(png_ptr, unknown);
+   png_read_info(png_ptr, info_ptr);
+   png_get_IHDR(png_ptr, info_ptr, &width, &height, &bit_depth, &color_type,
+       &interlace, NULL, NULL);
+   shim_set_transforms(png_ptr, transforms);
+   (void)png_set_interlace_handling(png_ptr);
+   png_read_update_info(png_ptr, info_ptr);
+
+   rowbytes = png_get_rowbytes(png_ptr, info_ptr);
+   if (height != 0 && rowbytes > SHIM_IMAGE_SIZE_MAX / height)
+      png_error(png_ptr, "image too large for the shim");
+   image = (unsigned char *)malloc(rowbytes * height + 1);
+   rows = (png_bytepp)malloc(sizeof (png_bytep) * (height + 1));
+   if (image == NULL || rows == NULL)
+      png_error(png_ptr, "out of memory in the shim");
+   for (y = 0; y < height; y++)
+      rows[y] = image + y * rowbytes;
+
+   png_read_image(png_ptr, rows);
+   info[0] = width;
+   info[1] = height;
+   info[2] = (png_uint_32)bit_depth;
+   info[3] = (png_uint_32)color_type;
+   info[4] = (png_uint_32)interlace;
+   info[5] = (png_uint_32)rowbytes;
+   info[6] = png_get_bit_depth(png_ptr, info_ptr);
+   info[7] = png_get_channels(png_ptr, info_ptr);
+   info[8] = shim_peak(&memory);
+   stage = SHIM_END_ERROR;
+
+   png_read_end(png_ptr, end_info_ptr);
+   info[8] = shim_peak(&memory);
+   if (unknown != NULL)
+   {
+      shim_count_unknown(png_ptr, info_ptr, unknown);
+      shim_count_unknown(png_ptr, end_info_ptr, unknown);
+   }
+   free(rows);
+   png_destroy_read_struct(&png_ptr, &info_ptr, &end_info_ptr);
+   if (pixels != NULL)
+      *pixels = image;
+   else
+      free(image);
+   return SHIM_OK;
+}
+
+/* shim_decode without any unknown chunk handling. */
+int
+shim_decode_transformed(const unsigned char *data, size_t size,
+    unsigned int transforms, unsigned char **pixels, png_uint_32 *info,
+    char *message, size_t message_size)
+{
+   return shim_decode(data, size, transforms, NULL, pixels, info, message,
+       message_size);
+}
+
+/* Decode the image, discarding the pixels, with the unknown chunk policy
+ * SHIM_UNKNOWN_*; cache_max and malloc_max are passed to
+ * png_set_chunk_cache_max and png_set_chunk_malloc_max unless they are -1.
+ *
+ * info is as for shim_decode_transformed.  stats receives the number and
+ * total size of the unknown chunks libpng stored, then the number and total
+ * size of the chunks given to the callback and a checksum of their data;
+ * these are set even when the image cannot be decoded.
+ */
+int
+shim_decode_unknown(const unsigned char *data, size_t size, int policy,
+    long cache_max, long malloc_max, png_uint_32 *info, png_uint_32 *stats,
+    char *message, size_t message_size)
+{
+   shim_unknown unknown;
+   int status;
+
+   memset(&unknown, 0, sizeof unknown);
+   unknown.policy = policy;
+   unknown.cache_max = cache_max;
+   unknown.malloc_max = malloc_max;
+   status = shim_decode(data, size, SHIM_PACKING, &unknown, NULL, info,
+       message, message_size);
+   stats[0] = unknown.kept_chunks;
+   stats[1] = unknown.kept_bytes;
+   stats[2] = unknown.callback_chunks;
+   stats[3] = unknown.callback_bytes;
+   stats[4] = unknown.checksum;
+   return status;
+}
+
+/* Decode the image without any transformation other than png_set_packing,
+ * so that every sample is returned as it is stored: one byte per sample for
+ * bit depths up to 8 (palette indices for color type 3), two big-endian
+ * bytes for bit depth 16.  info is as for shim_decode_transformed.
+ */
+int
+shim_decode_raw(const unsigned char *data, size_t size,
+    unsigned char **pixels, png_uint_32 *info, char *message,
+    size_t message_size)
+{
+   return shim_decode_transformed(data, size, SHIM_PACKING, pixels, info,
+       message, message_size);
+}
+
+/* shim_encode() settings; -1 leaves the libpng default */
+#define SHIM_ENCODE_FILTERS     0 /* PNG_FILTER_* mask */
+#define SHIM_ENCODE_LEVEL       1
+#define SHIM_ENCODE_STRATEGY    2
+#define SHIM_ENCODE_WINDOW_BITS 3
+#define SHIM_ENCODE_MEM_LEVEL   4
+#define SHIM_ENCODE_BUFFER_SIZE 5
+#define SHIM_ENCODE_SETTINGS    6
+
+typedef struct
+{
+   unsigned char *data;
+   size_t size;
+   size_t allocated;
+} shim_sink;
+
+static void
+shim_write(png_structp png_ptr, png_bytep data, size_t length)
+{
+   shim_sink *sink = (shim_sink *)png_get_io_ptr(png_ptr);
+
+   if (length > sink->allocated - sink->size)
+   {
+      size_t allocated = sink->allocated > 0 ? sink->allocated : 8192;
+      unsigned char *grown;
+
+      while (length > allocated - sink->size)
+      {
+         if (allocated > SHIM_IMAGE_SIZE_MAX)
+            png_error(png_ptr, "encoded image too large for the shim");
+         allocated *= 2;
+      }
+      grown = (unsigned char *)realloc(sink->data, allocated);
+      if (grown == NULL)
+         png_error(png_ptr, "out of memory in the shim");
+      sink->data = grown;
+      sink->allocated = allocated;
+   }
+   memcpy(sink->data + sink->size, data, length);
+   sink->size += length;
+}
+
+static void
+shim_flush(png_structp png_ptr)
+{
+   (void)png_ptr;
+}
+
+/* Encode width x height pixels, stored as PNG rows without filter bytes
+ * (packed samples for bit depths below 8, big-endian 16-bit samples), with
+ * the settings in settings[SHIM_ENCODE_SETTINGS].  palette holds
+ * palette_entries RGB triples for color type 3.
+ *
+ * On success returns SHIM_OK, sets *out (free it with shim_free) and
+ * *out_size, and stores the peak number of bytes libpng had allocated in
+ * *peak_memory.
+ */
+int
+shim_encode(const unsigned char *pixels, png_uint_32 width, png_uint_32 height,
+    int bit_depth, int color_type, int interlace, const unsigned char *palette,
+    int palette_entries, const int *settings, unsigned char **out,
+    size_t *out_size, size_t *peak_memory, char *message, size_t message_size)
+{
+   shim_source errors;
+   shim_sink sink;
+   shim_memory memory;
+   png_structp png_ptr;
+   png_infop info_ptr;
+   png_bytepp volatile rows = NULL;
+   png_uint_32 y;
+   size_t rowbytes;
+
+   memset(&errors, 0, sizeof errors);
+   errors.message = message;
+   errors.message_size = message_size;
+   memset(&sink, 0, sizeof sink);
+   memset(&memory, 0, sizeof memory);
+   *out = NULL;
+   *out_size = 0;
+   *peak_memory = 0;
+   if (message_size > 0)
+      message[0] = '\0';
+
+#ifdef PNG_USER_MEM_SUPPORTED
+   png_ptr = png_create_write_struct_2(PNG_LIBPNG_VER_STRING, &errors,
+       shim_error, shim_warning, &memory, shim_malloc, shim_free_block);
+#else
+   png_ptr = png_create_write_struct(PNG_LIBPNG_VER_STRING, &errors,
+       shim_error, shim_warning);
+#endif
+   if (png_ptr == NULL)
+      return SHIM_ERROR;
+   info_ptr = png_create_info_struct(png_ptr);
+   if (info_ptr == NULL)
+   {
+      png_destroy_write_struct(&png_ptr, NULL);
+      return SHIM_ERROR;
+   }
+
+   if (setjmp(png_jmpbuf(png_ptr)))
+   {
+      free(rows);
+      free(sink.data);
+      png_destroy_write_struct(&png_ptr, &info_ptr);
+      return SHIM_ERROR;
+   }
+
+   png_set_write_fn(png_ptr, &sink, shim_write, shim_flush);
+   png_set_IHDR(png_ptr, info_ptr, width, height, bit_depth, color_type,
+       interlace, PNG_COMPRESSION_TYPE_BASE, PNG_FILTER_TYPE_BASE);
+   if (color_type == PNG_COLOR_TYPE_PALETTE)
+   {
+      png_color colors[PNG_MAX_PALETTE_LENGTH];
+      int i;
+
+      if (palette_entries < 1 || palette_entries > PNG_MAX_PALETTE_LENGTH)
+         png_error(png_ptr, "invalid palette for the shim");
+      for (i = 0; i < palette_entries; i++)
+      {
+         colors[i].red = palette[3 * i];
+         colors[i].green = palette[3 * i + 1];
+         colors[i].blue = palette[3 * i + 2];
+      }
+      png_set_PLTE(png_ptr, info_ptr, colors, palette_entries);
+   }
+
+   if (settings[SHIM_ENCODE_FILTERS] >= 0)
+      png_set_filter(png_ptr, PNG_FILTER_TYPE_BASE,
+          settings[SHIM_ENCODE_FILTERS]);
+   if (settings[SHIM_ENCODE_LEVEL] >= 0)
+      png_set_compression_level(png_ptr, settings[SHIM_ENCODE_LEVEL]);
+   if (settings[SHIM_ENCODE_STRATEGY] >= 0)
+      png_set_compression_strategy(png_ptr, settings[SHIM_ENCODE_STRATEGY]);
+   if (settings[SHIM_ENCODE_WINDOW_BITS] >= 0)
+      png_set_compression_window_bits(png_ptr,
+          settings[SHIM_ENCODE_WINDOW_BITS]);
+   if (settings[SHIM_ENCODE_MEM_LEVEL] >= 0)
+      png_set_compression_mem_level(png_ptr, settings[SHIM_ENCODE_MEM_LEVEL]);
+   if (settings[SHIM_ENCODE_BUFFER_SIZE] >= 0)
+      png_set_compression_buffer_size(png_ptr,
+          (size_t)settings[SHIM_ENCODE_BUFFER_SIZE]);
+
+   png_write_info(png_ptr, info_ptr);
+   if (interlace != PNG_INTERLACE_NONE)
+      (void)png_set_interlace_handling(png_ptr);
+
+   rowbytes = png_get_rowbytes(png_ptr, info_ptr);
+   rows = (png_bytepp)malloc(sizeof (png_bytep) * (height + 1));
+   if (rows == NULL)
+      png_error(png_ptr, "out of memory in the shim");
+   for (y = 0; y < height; y++)
+      rows[y] = (png_bytep)pixels + y * rowbytes;
+   png_write_image(png_ptr, rows);
+   png_write_end(png_ptr, info_ptr);
+
+   free(rows);
+   png_destroy_write_struct(&png_ptr, &info_ptr);
+   *out = sink.data;
+   *out_size = sink.size;
+   *peak_memory = memory.peak;
+   return SHIM_OK;
+}
+
+void
+shim_free(void *pointer)
+{
+   free(pointer);
+}
@@ -1,8 +1,425 @@
 # png_generator_utils.py
+import contextlib
+import json
+import mmap
+import multiprocessing
+import os
+import random
+import time
 import zlib
 import struct
+from collections import namedtuple
 
-def create_minimal_png_structure(width=1, height=1, color_type=2, bit_depth=8):
+COMPRESSION_STRATEGIES = {
+    'default': zlib.Z_DEFAULT_STRATEGY,
+    'filtered': zlib.Z_FILTERED,
+    'huffman': zlib.Z_HUFFMAN_ONLY,
+    'rle': zlib.Z_RLE,
+    'fixed': zlib.Z_FIXED,
+}
+
+class CompressionProfile(namedtuple('CompressionProfile', 'level strategy wbits split')):
+    """
+    zlib 压缩配置。
+    level: 0-9 (0 为 stored blocks), -1 为 zlib 默认
+    strategy: COMPRESSION_STRATEGIES 中的名称
+    wbits: 窗口大小 9-15 (zlib 的 deflate 会把 8 悄悄改成 9)
+    split: 每隔多少输入字节做一次 Z_FULL_FLUSH (0 表示不拆分)
+    """
+    __slots__ = ()
+
+    @property
+    def name(self):
+        level = 'd' if self.level < 0 else str(self.level)
+        name = f"l{level}-{self.strategy}-w{self.wbits}"
+        if self.split:
+            name += f"-s{self.split}"
+        return name
+
+DEFAULT_COMPRESSION_PROFILE = CompressionProfile(-1, 'default', 15, 0)
+
+def parse_compression_profile(name):
+    """解析 'l6-rle-w12-s4096' 形式的名称 ('default' 为 zlib 默认配置)。"""
+    if isinstance(name, CompressionProfile):
+        return name
+    if name in (None, '', 'default'):
+        return DEFAULT_COMPRESSION_PROFILE
+    parts = name.split('-')
+    try:
+        level = -1 if parts[0] == 'ld' else int(parts[0][1:])
+        strategy = parts[1]
+        wbits = int(parts[2][1:])
+        split = int(parts[3][1:]) if len(parts) > 3 else 0
+    except (IndexError, ValueError):
+        raise ValueError(f"Invalid compression profile '{name}'")
+    if not parts[0].startswith('l') or not parts[2].startswith('w') \
+            or (len(parts) > 3 and not parts[3].startswith('s')) or len(parts) > 4:
+        raise ValueError(f"Invalid compression profile '{name}'")
+    if not -1 <= level <= 9:
+        raise ValueError(f"Invalid compression level {level}")
+    if strategy not in COMPRESSION_STRATEGIES:
+        raise ValueError(f"Unknown compression strategy '{strategy}'")
+    if not 9 <= wbits <= 15:
+        raise ValueError(f"Invalid window bits {wbits}")
+    if split < 0:
+        raise ValueError(f"Invalid split size {split}")
+    return CompressionProfile(level, strategy, wbits, split)
+
+def compression_profile_sweep():
+    """常用的压缩配置组合：各级别、各策略、各窗口大小、stored blocks 以及拆分 flush。"""
+    profiles = [DEFAULT_COMPRESSION_PROFILE]
+    profiles += [CompressionProfile(level, 'default', 15, 0) for level in range(0, 10)]
+    profiles += [CompressionProfile(6, strategy, 15, 0)
+                 for strategy in COMPRESSION_STRATEGIES if strategy != 'default']
+    profiles += [CompressionProfile(6, 'default', wbits, 0) for wbits in range(9, 15)]
+    profiles += [CompressionProfile(6, 'default', 15, split) for split in (1, 64, 4096)]
+    profiles += [CompressionProfile(0, 'default', 15, 64)]
+    return profiles
+
+class CountingRandom(random.Random):
+    """统计底层随机数调用次数 (random()/getrandbits()) 的 Random，序列与 random.Random 相同。"""
+
+    def __init__(self, seed=None):
+        self.draws = 0
+        super().__init__(seed)
+
+    def random(self):
+        self.draws += 1
+        return super().random()
+
+    def getrandbits(self, k):
+        self.draws += 1
+        return super().getrandbits(k)
+
+class GenerationProfiler:
+    """
+    生成过程的可选插桩。
+    按数据块类型统计：次数、耗时、输出字节数、压缩耗时与压缩前后大小、随机数调用次数。
+    trace=True 时同时记录 Chrome trace 事件 (chrome://tracing / Perfetto 可直接打开)。
+    """
+    FIELDS = ('count', 'seconds', 'bytes', 'zlib_seconds', 'zlib_in', 'zlib_out', 'rng_draws')
+
+    def __init__(self, trace=False):
+        self.stats = {}
+        self.trace_events = [] if trace else None
+        self._current = None
+
+    def _entry(self, name):
+        entry = self.stats.get(name)
+        if entry is None:
+            entry = self.stats[name] = dict.fromkeys(self.FIELDS, 0)
+        return entry
+
+    @contextlib.contextmanager
+    def chunk(self, name):
+        """统计一个数据块的生成；调用方往产出的 dict 中填写 bytes 与 rng_draws。"""
+        event = {'bytes': 0, 'rng_draws': 0}
+        previous, self._current = self._current, name
+        start = time.perf_counter()
+        try:
+            yield event
+        finally:
+            elapsed = time.perf_counter() - start
+            self._current = previous
+            entry = self._entry(name)
+            entry['count'] += 1
+            entry['seconds'] += elapsed
+            entry['bytes'] += event['bytes']
+            entry['rng_draws'] += event['rng_draws']
+            if self.trace_events is not None:
+                self.trace_events.append({'name': name, 'cat': 'chunk', 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                                          'ts': start * 1e6, 'dur': elapsed * 1e6, 'args': event})
+
+    def record_compression(self, start, elapsed, in_bytes, out_bytes):
+        entry = self._entry(self._current or '(none)')
+        entry['zlib_seconds'] += elapsed
+        entry['zlib_in'] += in_bytes
+        entry['zlib_out'] += out_bytes
+        if self.trace_events is not None:
+            self.trace_events.append({'name': 'zlib', 'cat': 'compression', 'ph': 'X', 'pid': os.getpid(),
+                                      'tid': 0, 'ts': start * 1e6, 'dur': elapsed * 1e6,
+                                      'args': {'in': in_bytes, 'out': out_bytes}})
+
+    def merge(self, stats, trace_events=None):
+        """合并另一个 (例如 worker 进程中的) profiler 的结果。"""
+        for name, other in stats.items():
+            entry = self._entry(name)
+            for field in self.FIELDS:
+                entry[field] += other[field]
+        if self.trace_events is not None and trace_events:
+            self.trace_events.extend(trace_events)
+
+    def summary_table(self):
+        lines = [f"{'chunk':<8} {'count':>8} {'total ms':>10} {'avg us':>9} {'bytes':>11} {'avg B':>8} "
+                 f"{'zlib ms':>9} {'ratio':>7} {'rng draws':>10}"]
+        for name, e in sorted(self.stats.items(), key=lambda item: -item[1]['seconds']):
+            count = e['count'] or 1
+            ratio = f"{e['zlib_in'] / e['zlib_out']:.2f}" if e['zlib_out'] else '-'
+            lines.append(f"{name:<8} {e['count']:>8} {e['seconds'] * 1e3:>10.1f} {e['seconds'] / count * 1e6:>9.1f} "
+                         f"{e['bytes']:>11} {e['bytes'] / count:>8.0f} {e['zlib_seconds'] * 1e3:>9.1f} "
+                         f"{ratio:>7} {e['rng_draws']:>10}")
+        return '\n'.join(lines)
+
+    def chrome_trace(self):
+        """Chrome trace (JSON 对象格式)，汇总表放在 otherData 中。"""
+        return {'traceEvents': self.trace_events or [], 'otherData': {'summary': self.stats}}
+
+_active_profiler = None
+
+@contextlib.contextmanager
+def active_profiler(profiler):
+    """在 with 块内让 compress_pieces_with_profile 把压缩开销记到 profiler 上。"""
+    global _active_profiler
+    previous, _active_profiler = _active_profiler, profiler
+    try:
+        yield profiler
+    finally:
+        _active_profiler = previous
+
+def compress_pieces_with_profile(pieces, profile=DEFAULT_COMPRESSION_PROFILE):
+    """按压缩配置把若干字节片段压缩成一个 zlib 数据流。"""
+    profile = parse_compression_profile(profile)
+    profiler = _active_profiler
+    start = time.perf_counter()
+    in_bytes = 0
+    compressor = zlib.compressobj(profile.level, zlib.DEFLATED, profile.wbits,
+                                  zlib.DEF_MEM_LEVEL, COMPRESSION_STRATEGIES[profile.strategy])
+    out = []
+    pending = 0  # 距上次 flush 已输入的字节数
+    for piece in pieces:
+        view = memoryview(piece)
+        while profile.split and len(view) >= profile.split - pending:
+            take = profile.split - pending
+            out.append(compressor.compress(view[:take]))
+            out.append(compressor.flush(zlib.Z_FULL_FLUSH))
+            view = view[take:]
+            pending = 0
+        out.append(compressor.compress(view))
+        pending += len(view)
+        in_bytes += len(piece)
+    out.append(compressor.flush())
+    result = b''.join(out)
+    if profiler is not None:
+        profiler.record_compression(start, time.perf_counter() - start, in_bytes, len(result))
+    return result
+
+def compress_with_profile(data, profile=DEFAULT_COMPRESSION_PROFILE):
+    """按压缩配置压缩 data，返回 zlib 数据流。"""
+    return compress_pieces_with_profile([data], profile)
+
+# 每种颜色类型的通道数
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# 每种颜色类型允许的位深
+VALID_BIT_DEPTHS = {0: (1, 2, 4, 8, 16), 2: (8, 16), 3: (1, 2, 4, 8), 4: (8, 16), 6: (8, 16)}
+
+# Adam7 的七遍：(x 起点, y 起点, x 步长, y 步长)
+ADAM7_PASSES = [(0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4),
+                (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2)]
+
+def adam7_pass_size(width, height, pass_index):
+    """第 pass_index 遍子图像的 (宽, 高)；任一为 0 时这一遍没有扫描行。"""
+    x0, y0, dx, dy = ADAM7_PASSES[pass_index]
+    return (width - x0 + dx - 1) // dx, (height - y0 + dy - 1) // dy
+
+def pack_samples(samples, bit_depth):
+    """把一行样本值按位深打包成字节 (1/2/4 位从高位开始，16 位为大端序)。"""
+    if bit_depth == 8:
+        return bytes(samples)
+    if bit_depth == 16:
+        return b''.join(value.to_bytes(2, 'big') for value in samples)
+    per_byte = 8 // bit_depth
+    out = bytearray((len(samples) + per_byte - 1) // per_byte)
+    for i, value in enumerate(samples):
+        out[i // per_byte] |= value << (8 - bit_depth * (i % per_byte + 1))
+    return bytes(out)
+
+def filter_scanline(filter_type, row, prior, bpp):
+    """按过滤类型 0-4 过滤一行 (prior 为上一行的原始字节，第一行为全 0)。"""
+    if filter_type == 0:
+        return bytes(row)
+    out = bytearray(len(row))
+    for i, value in enumerate(row):
+        left = row[i - bpp] if i >= bpp else 0
+        up = prior[i]
+        if filter_type == 1:
+            predictor = left
+        elif filter_type == 2:
+            predictor = up
+        elif filter_type == 3:
+            predictor = (left + up) >> 1
+        else:
+            upper_left = prior[i - bpp] if i >= bpp else 0
+            p = left + up - upper_left
+            pa, pb, pc = abs(p - left), abs(p - up), abs(p - upper_left)
+            predictor = left if pa <= pb and pa <= pc else up if pb <= pc else upper_left
+        out[i] = (value - predictor) & 0xff
+    return bytes(out)
+
+def encode_scanlines(samples, width, height, color_type, bit_depth, interlace=0, filter_types=(0,)):
+    """
+    由样本值 (按行排列，每像素 CHANNELS[color_type] 个) 生成解压后的 IDAT 数据：
+    可选 Adam7 交错，每行依次循环使用 filter_types 中的过滤类型。
+    """
+    channels = CHANNELS[color_type]
+    bpp = max(1, channels * bit_depth // 8)
+    if interlace:
+        passes = ADAM7_PASSES
+    else:
+        passes = [(0, 0, 1, 1)]
+    out = []
+    row_number = 0
+    for x0, y0, dx, dy in passes:
+        pass_width = (width - x0 + dx - 1) // dx
+        if pass_width <= 0 and interlace:
+            continue
+        prior = None
+        for y in range(y0, height, dy):
+            row = []
+            for x in range(x0, width, dx):
+                start = (y * width + x) * channels
+                row.extend(samples[start:start + channels])
+            raw = pack_samples(row, bit_depth)
+            if prior is None:
+                prior = bytes(len(raw))
+            filter_type = filter_types[row_number % len(filter_types)]
+            out.append(bytes([filter_type]) + filter_scanline(filter_type, raw, prior, bpp))
+            prior = raw
+            row_number += 1
+    return b''.join(out)
+
+def png_chunk(chunk_type, data):
+    """完整的数据块字节：长度 + 类型 + 数据 + CRC。"""
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type)))
+
+def iter_files(paths, suffix='.png'):
+    """
+    依次产生 paths 中的文件，以及其中目录下 (递归、按名称排序) 以 suffix 结尾的文件
+    (不区分大小写；suffix 为 None 时取所有文件)。
+    """
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if suffix is None or name.lower().endswith(suffix):
+                    yield os.path.join(root, name)
+
+def parse_range(text):
+    """命令行中的 'N' 或 'MIN-MAX'，返回 (MIN, MAX)。"""
+    low, _, high = text.partition('-')
+    return int(low), int(high or low)
+
+def run_seed_jobs(generate, jobs, output_dir, workers=1, index_seed=None):
+    """
+    用 workers 个进程 (1 表示在本进程中) 对每个 job 调用 generate，按 jobs 的顺序产生
+    generate 返回的 manifest 记录，并逐行写入 output_dir/manifest.jsonl。
+    记录中 'file' 为 output_dir 下的种子文件名、'size' 为其字节数；
+    index_seed 不为 None 时对每个非空种子调用 index_seed(文件名, 数据)，
+    数据用 mmap 读取，大种子不整个读入内存。
+    """
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        results = pool.imap(generate, jobs) if pool is not None else map(generate, jobs)
+        with open(os.path.join(output_dir, 'manifest.jsonl'), 'w') as manifest:
+            for record in results:
+                manifest.write(json.dumps(record) + '\n')
+                if index_seed is not None and record['size']:
+                    with open(os.path.join(output_dir, record['file']), 'rb') as f, \
+                            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        index_seed(record['file'], data)
+                yield record
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+# APNG 的 dispose_op / blend_op
+APNG_DISPOSE_OPS = {'none': 0, 'background': 1, 'previous': 2}
+APNG_BLEND_OPS = {'source': 0, 'over': 1}
+
+class ApngFrame(namedtuple('ApngFrame', 'width height x_offset y_offset delay_num delay_den dispose_op blend_op')):
+    """一帧的 fcTL 字段。"""
+    __slots__ = ()
+
+    def fctl_data(self, sequence_number):
+        return struct.pack('>IIIIIHHBB', sequence_number, self.width, self.height, self.x_offset, self.y_offset,
+                           self.delay_num, self.delay_den, self.dispose_op, self.blend_op)
+
+class SequenceNumbers:
+    """
+    fcTL/fdAT 的序号来源。fault_rate > 0 时按该概率故意出错：
+    跳号 (skip)、重复上一个 (repeat)、回到 0 (reset) 或取随机值 (random)。
+    faults 记录 (第几个序号, 错误类型)。
+    """
+    FAULTS = ('skip', 'repeat', 'reset', 'random')
+
+    def __init__(self, rng=None, fault_rate=0.0, faults=FAULTS):
+        self.rng = rng if rng is not None else random
+        self.fault_rate = fault_rate
+        self.fault_kinds = tuple(faults)
+        self.faults = []
+        self._index = 0
+        self._next = 0
+        self._last = None
+
+    def __call__(self):
+        value = self._next
+        if self.fault_rate and self.rng.random() < self.fault_rate:
+            kind = self.rng.choice(self.fault_kinds)
+            if kind == 'skip':
+                value += self.rng.randint(1, 3)
+            elif kind == 'repeat' and self._last is not None:
+                value = self._last
+            elif kind == 'reset':
+                value = 0
+            else:
+                value = self.rng.getrandbits(31)
+            self.faults.append((self._index, kind))
+        self._index += 1
+        self._last = value
+        self._next = value + 1
+        return value
+
+def iter_apng_chunks(width, height, color_type, bit_depth, frames, num_frames, frame_samples,
+                     compression_profile=DEFAULT_COMPRESSION_PROFILE, sequence=None, num_plays=0,
+                     default_image=None, palette=None, max_chunk_size=0x10000):
+    """
+    逐块产生一个 APNG 数据流的数据块字节 (含签名)，一次只处理一帧：
+    frames 为 ApngFrame 的可迭代对象 (可以是生成器)，num_frames 写入 acTL；
+    frame_samples(index, frame) 返回该帧的样本值，只在生成该帧时调用。
+    default_image 为 None 时第一帧就是 IDAT 中的默认图像，
+    否则它是不属于动画的默认图像的样本值，所有帧都写成 fdAT。
+    每帧的压缩数据按 max_chunk_size 拆成多个 IDAT/fdAT。
+    """
+    sequence = sequence if sequence is not None else SequenceNumbers()
+    yield b'\x89PNG\r\n\x1a\n'
+    yield png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, bit_depth, color_type, 0, 0, 0))
+    yield png_chunk(b'acTL', struct.pack('>II', num_frames, num_plays))
+    if palette is not None:
+        yield png_chunk(b'PLTE', palette)
+    if default_image is not None:
+        data = compress_with_profile(encode_scanlines(default_image, width, height, color_type, bit_depth),
+                                     compression_profile)
+        for start in range(0, max(len(data), 1), max_chunk_size):
+            yield png_chunk(b'IDAT', data[start:start + max_chunk_size])
+    for index, frame in enumerate(frames):
+        yield png_chunk(b'fcTL', frame.fctl_data(sequence()))
+        raw = encode_scanlines(frame_samples(index, frame), frame.width, frame.height, color_type, bit_depth)
+        data = compress_with_profile(raw, compression_profile)
+        del raw
+        for start in range(0, max(len(data), 1), max_chunk_size):
+            piece = data[start:start + max_chunk_size]
+            if index == 0 and default_image is None:
+                yield png_chunk(b'IDAT', piece)
+            else:
+                yield png_chunk(b'fdAT', struct.pack('>I', sequence()) + piece)
+    yield png_chunk(b'IEND', b'')
+
+def create_minimal_png_structure(width=1, height=1, color_type=2, bit_depth=8,
+                                 compression_profile=DEFAULT_COMPRESSION_PROFILE):
     """
     创建 PNG 文件的基本结构组件 (签名, IHDR, IDAT, IEND)。
     color_type:
@@ -11,6 +428,7 @@ def create_minimal_png_structure(width=1, height=1, color_type=2, bit_depth=8):
         3: Indexed-color
         4: Grayscale with alpha
         6: Truecolor with alpha
+    compression_profile: IDAT 使用的压缩配置
     """
     # PNG Signature
     png_signature = b"\x89PNG\r\n\x1a\n"
@@ -39,7 +457,7 @@ def create_minimal_png_structure(width=1, height=1, color_type=2, bit_depth=8):
     else:
         scanline_data = b'\x00\x00' # Fallback minimal scanline (filter + 1 byte data)
 
-    idat_compressed_data = zlib.compress(scanline_data)
+    idat_compressed_data = compress_with_profile(scanline_data, compression_profile)
     idat_chunk_body = b'IDAT' + idat_compressed_data
     idat_chunk = struct.pack('>I', len(idat_compressed_data)) + idat_chunk_body + zlib.crc32(idat_chunk_body).to_bytes(4, 'big')
 
@@ -0,0 +1,245 @@
+# png_reference_decoder.py
+"""
+独立于 libpng 的 PNG 参考解码器 (需要 NumPy)，作为差分测试的对照。
+
+只实现得到像素所需的部分：签名、IHDR、PLTE 是否存在、第一段连续的 IDAT、
+zlib 解压、按行反过滤、Adam7 反交错以及 1-16 位样本的解包。
+输出与 LibPNGShim.decode_raw 相同含义的样本值 (不做调色板展开、伽马等变换)。
+"""
+import struct
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+from png_generator_utils import ADAM7_PASSES, CHANNELS, VALID_BIT_DEPTHS
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+# samples: uint16 数组，形状为 (height, width, channels)
+ReferenceImage = namedtuple('ReferenceImage', 'width height bit_depth color_type interlace samples')
+
+
+class DecodeError(ValueError):
+    """参考解码器拒绝的输入 (错误信息尽量与 libpng 的一致)。"""
+
+
+def read_chunks(data):
+    """
+    检查签名与 CRC，返回 (IHDR 字段元组, IDAT 前各 PLTE 的长度, 第一段连续 IDAT 的数据)。
+    与 libpng 一样：关键数据块 CRC 错误是致命的 (非调色板图像的 PLTE 除外)，
+    辅助数据块 CRC 错误时丢弃该数据块；IDAT 段之后的数据块不影响像素，不再检查。
+    """
+    if data[:8] != PNG_SIGNATURE:
+        raise DecodeError('Not a PNG file')
+    ihdr = None
+    plte_lengths = []
+    idat = []
+    pos = 8
+    while True:
+        if pos + 8 > len(data):
+            raise DecodeError('read beyond end of data')
+        length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+        if length > 0x7fffffff:
+            raise DecodeError('PNG unsigned integer out of range')
+        end = pos + 12 + length
+        if end > len(data):
+            raise DecodeError('read beyond end of data')
+        body = data[pos + 8:pos + 8 + length]
+        crc_ok = zlib.crc32(body, zlib.crc32(chunk_type)) == struct.unpack('>I', data[end - 4:end])[0]
+        critical = not chunk_type[0] & 0x20
+        if chunk_type == b'PLTE' and ihdr is not None and ihdr[3] != 3:
+            critical = False
+        if not crc_ok and critical:
+            raise DecodeError('CRC error')
+        if chunk_type == b'IHDR':
+            if ihdr is not None:
+                raise DecodeError('IHDR: out of place')
+            if length != 13:
+                raise DecodeError('IHDR: invalid')
+            ihdr = struct.unpack('>IIBBBBB', body)
+        elif ihdr is None:
+            raise DecodeError(f"{chunk_type.decode('latin-1')}: missing IHDR")
+        elif chunk_type == b'IDAT':
+            idat.append(body)
+        elif idat:
+            break
+        elif chunk_type == b'PLTE':
+            if crc_ok:
+                plte_lengths.append(length)
+        elif chunk_type == b'IEND':
+            raise DecodeError('No image in file')
+        elif critical:
+            raise DecodeError(f"{chunk_type.decode('latin-1')}: unknown critical chunk")
+        pos = end
+    return ihdr, plte_lengths, b''.join(idat)
+
+
+def check_ihdr(width, height, bit_depth, color_type, compression, filter_method, interlace):
+    if width == 0 or width > 0x7fffffff or height == 0 or height > 0x7fffffff:
+        raise DecodeError('Invalid image size in IHDR')
+    if color_type not in VALID_BIT_DEPTHS:
+        raise DecodeError('Invalid color type in IHDR')
+    if bit_depth not in VALID_BIT_DEPTHS[color_type]:
+        raise DecodeError('Invalid bit depth in IHDR')
+    if compression != 0:
+        raise DecodeError('Unknown compression method in IHDR')
+    if filter_method != 0:
+        raise DecodeError('Unknown filter method in IHDR')
+    if interlace > 1:
+        raise DecodeError('Unknown interlace method in IHDR')
+
+
+def _unfilter_paeth(line, prior, bpp):
+    out = bytearray(len(line))
+    for i, value in enumerate(line):
+        up = prior[i]
+        if i >= bpp:
+            left = out[i - bpp]
+            upper_left = prior[i - bpp]
+            pa = abs(up - upper_left)
+            pb = abs(left - upper_left)
+            pc = abs(left + up - 2 * upper_left)
+            predictor = left if pa <= pb and pa <= pc else up if pb <= pc else upper_left
+        else:
+            predictor = up
+        out[i] = (value + predictor) & 0xff
+    return out
+
+
+def _unfilter_avg(line, prior, bpp):
+    out = bytearray(len(line))
+    for i, value in enumerate(line):
+        if i >= bpp:
+            predictor = (out[i - bpp] + prior[i]) >> 1
+        else:
+            predictor = prior[i] >> 1
+        out[i] = (value + predictor) & 0xff
+    return out
+
+
+def unfilter(filtered, rows, row_bytes, bpp):
+    """
+    反过滤 rows 行 (每行以过滤类型字节开头)，返回 (rows, row_bytes) 的 uint8 数组。
+    None/Sub/Up 对整行做数组运算 (Sub 按 bpp 分组后沿行累加，uint8 自然按 256 回绕)；
+    Avg/Paeth 依赖同一行中刚恢复的左邻像素，只能按字节递推。
+    """
+    lines = np.frombuffer(filtered, dtype=np.uint8, count=rows * (row_bytes + 1)).reshape(rows, row_bytes + 1)
+    filter_types = lines[:, 0]
+    if filter_types.size and filter_types.max() > 4:
+        raise DecodeError('bad adaptive filter value')
+    out = np.empty((rows, row_bytes), dtype=np.uint8)
+    prior = np.zeros(row_bytes, dtype=np.uint8)
+    padded = -row_bytes % bpp
+    for y in range(rows):
+        line = lines[y, 1:]
+        filter_type = filter_types[y]
+        if filter_type == 0:
+            out[y] = line
+        elif filter_type == 1:
+            groups = np.concatenate([line, np.zeros(padded, np.uint8)]).reshape(-1, bpp)
+            out[y] = np.cumsum(groups, axis=0, dtype=np.uint8).reshape(-1)[:row_bytes]
+        elif filter_type == 2:
+            out[y] = line + prior
+        elif filter_type == 3:
+            out[y] = np.frombuffer(_unfilter_avg(line.tolist(), prior.tolist(), bpp), np.uint8)
+        else:
+            out[y] = np.frombuffer(_unfilter_paeth(line.tolist(), prior.tolist(), bpp), np.uint8)
+        prior = out[y]
+    return out
+
+
+def unpack(rows, width, channels, bit_depth):
+    """把反过滤后的字节行解包成 (rows, width, channels) 的 uint16 样本。"""
+    count = width * channels
+    if bit_depth == 8:
+        samples = rows[:, :count].astype(np.uint16)
+    elif bit_depth == 16:
+        pairs = rows[:, :2 * count].astype(np.uint16)
+        samples = (pairs[:, 0::2] << 8) | pairs[:, 1::2]
+    else:
+        bits = np.unpackbits(rows, axis=1)[:, :count * bit_depth].reshape(len(rows), count, bit_depth)
+        weights = (1 << np.arange(bit_depth - 1, -1, -1)).astype(np.uint16)
+        samples = bits.astype(np.uint16) @ weights
+    return samples.reshape(len(rows), width, channels)
+
+
+def _inflate(idat, needed):
+    """
+    解压 IDAT 数据。和 libpng 一样，得到所需的字节后还要把 zlib 流读到结束
+    (png_read_finish_IDAT)：IDAT 数据耗尽时流仍未结束是致命错误，
+    而此时的校验和错误或多余数据只是警告。
+    """
+    inflater = zlib.decompressobj()
+    try:
+        raw = inflater.decompress(idat, needed)
+    except zlib.error as e:
+        raise DecodeError(str(e))
+    if len(raw) < needed:
+        raise DecodeError('Not enough image data')
+    try:
+        while not inflater.eof:
+            tail = inflater.unconsumed_tail
+            if not inflater.decompress(tail, 0x10000) and not tail:
+                break
+    except zlib.error:
+        return raw
+    if not inflater.eof:
+        raise DecodeError('Not enough image data')
+    return raw
+
+
+def decode(data):
+    """解码一个 PNG 数据流，返回 ReferenceImage；无法解码时抛出 DecodeError。"""
+    ihdr, plte_lengths, idat = read_chunks(data)
+    check_ihdr(*ihdr)
+    width, height, bit_depth, color_type, _, _, interlace = ihdr
+    if color_type == 3:
+        # 调色板图像的 PLTE 错误是致命的 (png_handle_PLTE)
+        if not plte_lengths:
+            raise DecodeError('Missing PLTE before IDAT')
+        if plte_lengths[0] > 768 or plte_lengths[0] % 3:
+            raise DecodeError('PLTE: invalid')
+        if len(plte_lengths) > 1:
+            raise DecodeError('PLTE: duplicate')
+    if not idat:
+        raise DecodeError('Not enough image data')
+    channels = CHANNELS[color_type]
+    bpp = max(1, channels * bit_depth // 8)
+
+    if not interlace:
+        row_bytes = (width * channels * bit_depth + 7) // 8
+        raw = _inflate(idat, height * (row_bytes + 1))
+        samples = unpack(unfilter(raw, height, row_bytes, bpp), width, channels, bit_depth)
+        return ReferenceImage(width, height, bit_depth, color_type, interlace, samples)
+
+    passes = []
+    needed = 0
+    for x0, y0, dx, dy in ADAM7_PASSES:
+        pass_width = (width - x0 + dx - 1) // dx
+        pass_height = (height - y0 + dy - 1) // dy
+        if pass_width <= 0 or pass_height <= 0:
+            continue
+        row_bytes = (pass_width * channels * bit_depth + 7) // 8
+        passes.append((x0, y0, dx, dy, pass_width, pass_height, row_bytes, needed))
+        needed += pass_height * (row_bytes + 1)
+    raw = _inflate(idat, needed)
+    samples = np.zeros((height, width, channels), dtype=np.uint16)
+    for x0, y0, dx, dy, pass_width, pass_height, row_bytes, offset in passes:
+        rows = unfilter(memoryview(raw)[offset:], pass_height, row_bytes, bpp)
+        samples[y0::dy, x0::dx] = unpack(rows, pass_width, channels, bit_depth)
+    return ReferenceImage(width, height, bit_depth, color_type, interlace, samples)
+
+
+def raw_samples(result):
+    """把 LibPNGShim.decode_raw 的结果转换成与 ReferenceImage.samples 相同形状的数组。"""
+    channels = CHANNELS[result.color_type]
+    rows = np.frombuffer(result.pixels, dtype=np.uint8).reshape(result.height, result.rowbytes)
+    count = result.width * channels
+    if result.bit_depth == 16:
+        pairs = rows[:, :2 * count].astype(np.uint16)
+        samples = (pairs[:, 0::2] << 8) | pairs[:, 1::2]
+    else:
+        samples = rows[:, :count].astype(np.uint16)
+    return samples.reshape(result.height, result.width, channels)
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+
+"""
+Generate synthetic EXIF blobs, and PNG files that embed them,
+for testing and benchmarking the pngexif tools.
+
+Use, modification and distribution are subject to the MIT License.
+Please see the accompanying file LICENSE_MIT.txt
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import random
+import struct
+import sys
+import zlib
+
+_PNG_SIGNATURE = b"\x89PNG\x0d\x0a\x1a\x0a"
+
+# The element sizes of the TIFF tag types 1 to 12.
+_TIFF_TYPE_SIZES = {
+    1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1,
+    7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8,
+}
+_TIFF_TYPE_FORMATS = {
+    1: "B", 3: "H", 4: "I", 5: "II", 6: "b",
+    8: "h", 9: "i", 10: "ii", 11: "f", 12: "d",
+}
+
+_TIFF_EXIF_IFD = 0x8769
+_GPS_IFD = 0x8825
+_INTEROPERABILITY_IFD = 0xa005
+_JPEG_INTERCHANGE_FORMAT = 0x0201
+_JPEG_INTERCHANGE_FORMAT_LENGTH = 0x0202
+_RESERVED_TAGS = (_TIFF_EXIF_IFD, _GPS_IFD, _INTEROPERABILITY_IFD,
+                  _JPEG_INTERCHANGE_FORMAT, _JPEG_INTERCHANGE_FORMAT_LENGTH)
+
+_PATTERN_SIZE = 0x10000
+
+
+def _random_value(rng, tag_type, count):
+    """Return the encoded value of a tag, minus the byte order."""
+    if tag_type == 2:
+        text = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ ")
+                       for _ in range(count - 1))
+        return None, text.encode("ascii") + b"\x00"
+    if tag_type == 7:
+        return None, bytes(bytearray(rng.randrange(256)
+                                     for _ in range(count)))
+    if tag_type in (11, 12):
+        return [rng.uniform(-1000.0, 1000.0) for _ in range(count)], None
+    values = []
+    for _ in range(count):
+        if tag_type in (5, 10):
+            values += [rng.randrange(1, 1 << 16), rng.randrange(1, 1 << 16)]
+        elif tag_type in (6, 8, 9):
+            bits = 8 * _TIFF_TYPE_SIZES[tag_type]
+            values.append(rng.randrange(-(1 << (bits - 1)), 1 << (bits - 1)))
+        else:
+            values.append(rng.randrange(1 << (8 * _TIFF_TYPE_SIZES[tag_type])))
+    return values, None
+
+
+def _random_tags(rng, tag_count, first_id):
+    """Return a list of (tag_id, tag_type, count, values, raw) entries
+       that cycles through all the TIFF tag types.
+    """
+    tags = []
+    # Keep the tag ids within 16 bits, even for huge tag counts.
+    tag_id = max(1, min(first_id, 0xffff - len(_RESERVED_TAGS) - tag_count))
+    for i in range(tag_count):
+        while tag_id in _RESERVED_TAGS:
+            tag_id += 1
+        tag_type = i % 12 + 1
+        count = rng.choice((1, 1, 2, 4, 8, 16))
+        values, raw = _random_value(rng, tag_type, count)
+        tags.append((tag_id, tag_type, count, values, raw))
+        tag_id += 1
+    return tags
+
+
+class _ExifBuilder:
+    """Lay out IFDs and out-of-line tag values in a TIFF blob."""
+
+    def __init__(self, endian):
+        self._prefix = "<" if endian == "II" else ">"
+        self._header = b"II\x2a\x00" if endian == "II" else b"MM\x00\x2a"
+
+    def _encode(self, tag_type, values, raw):
+        if raw is not None:
+            return raw
+        fmt = _TIFF_TYPE_FORMATS[tag_type]
+        return struct.pack(self._prefix + fmt[0] * len(values), *values)
+
+    def build(self, ifds, thumbnail=b""):
+        """Build a blob from a list of (name, tags, pointers) IFDs, where
+           pointers maps a pointer tag id to the name of another IFD.
+           The IFDs named "ifd0" and "ifd1" form the IFD chain.
+        """
+        offsets = {}
+        offset = 8
+        for (name, tags, pointers) in ifds:
+            entry_count = len(tags) + len(pointers)
+            if name == "ifd1" and thumbnail:
+                entry_count += 2
+            offsets[name] = offset
+            offset += 2 + 12 * entry_count + 4
+        data_offset = offset
+        data = bytearray()
+        output = bytearray(self._header)
+        output += struct.pack(self._prefix + "I", offsets["ifd0"])
+        for (name, tags, pointers) in ifds:
+            entries = []
+            for (tag_id, tag_type, count, values, raw) in tags:
+                encoded = self._encode(tag_type, values, raw)
+                if len(encoded) <= 4:
+                    field = encoded + b"\x00" * (4 - len(encoded))
+                else:
+                    field = struct.pack(self._prefix + "I",
+                                        data_offset + len(data))
+                    data += encoded
+                    if len(data) % 2:
+                        data += b"\x00"
+                entries.append((tag_id, tag_type, count, field))
+            for (tag_id, target) in pointers.items():
+                field = struct.pack(self._prefix + "I", offsets[target])
+                entries.append((tag_id, 4, 1, field))
+            if name == "ifd1" and thumbnail:
+                entries.append((_JPEG_INTERCHANGE_FORMAT, 4, 1, None))
+                entries.append((_JPEG_INTERCHANGE_FORMAT_LENGTH, 4, 1,
+                                struct.pack(self._prefix + "I",
+                                            len(thumbnail))))
+            entries.sort(key=lambda entry: entry[0])
+            output += struct.pack(self._prefix + "H", len(entries))
+            for (tag_id, tag_type, count, field) in entries:
+                if field is None:
+                    field = struct.pack(self._prefix + "I",
+                                        data_offset + len(data))
+                    data += thumbnail
+                output += struct.pack(self._prefix + "HHI",
+                                      tag_id, tag_type, count) + field
+            next_offset = offsets["ifd1"] if name == "ifd0" \
+                and "ifd1" in offsets else 0
+            output += struct.pack(self._prefix + "I", next_offset)
+        return bytes(output + data)
+
+
+def build_exif(tag_count=16, endian="II", sub_ifds=True, thumbnail_size=0,
+               seed=0):
+    """Build a synthetic EXIF blob holding tag_count tags of all types.
+       With sub_ifds, the tags are spread over IFD0 and nested EXIF, GPS
+       and Interop IFDs.  With thumbnail_size, IFD1 holds a fake JPEG
+       thumbnail of that size.
+    """
+    rng = random.Random(seed)
+    if sub_ifds:
+        counts = [tag_count - 3 * (tag_count // 4)] + [tag_count // 4] * 3
+    else:
+        counts = [tag_count, 0, 0, 0]
+    ifds = [("ifd0", _random_tags(rng, counts[0], 0x0100), {})]
+    if sub_ifds:
+        ifds[0][2].update({_TIFF_EXIF_IFD: "exif", _GPS_IFD: "gps"})
+        ifds.append(("exif", _random_tags(rng, counts[1], 0x9000),
+                     {_INTEROPERABILITY_IFD: "interop"}))
+        ifds.append(("gps", _random_tags(rng, counts[2], 0x0000), {}))
+        ifds.append(("interop", _random_tags(rng, counts[3], 0x0001), {}))
+    thumbnail = b""
+    if thumbnail_size > 0:
+        thumbnail = b"\xff\xd8" + b"\x00" * max(thumbnail_size - 4, 0) \
+            + b"\xff\xd9"
+        ifds.append(("ifd1", [], {}))
+    return _ExifBuilder(endian).build(ifds, thumbnail)
+
+
+def make_png_chunk(chunk_type, chunk_data):
+    """Return a complete PNG chunk, with its length and its CRC."""
+    checksum = zlib.crc32(chunk_data, zlib.crc32(chunk_type)) & 0xffffffff
+    return b"".join([struct.pack(">I", len(chunk_data)), chunk_type,
+                     chunk_data, struct.pack(">I", checksum)])
+
+
+def iter_png_chunks(exif, image_size=0x10000, idat_size=0x10000,
+                    text_chunks=0, exif_after_idat=False, compressed=False,
+                    seed=0):
+    """Yield the chunks of a grayscale PNG holding the given EXIF blob,
+       with about image_size bytes of stored (uncompressed) image data
+       split into IDAT chunks of idat_size bytes, and text_chunks tEXt
+       chunks before the IDAT run.
+    """
+    width = 1024
+    height = max(1, image_size // (width + 1))
+    rng = random.Random(seed)
+    pattern = bytes(bytearray(rng.randrange(256)
+                              for _ in range(_PATTERN_SIZE)))
+    pattern_rows = [b"\x00" + pattern[i * 16:i * 16 + width]
+                    for i in range(64)]
+    if compressed:
+        exif_chunk = make_png_chunk(b"zxIf", b"\x00" + zlib.compress(exif))
+    else:
+        exif_chunk = make_png_chunk(b"eXIf", exif)
+    yield _PNG_SIGNATURE
+    yield make_png_chunk(b"IHDR", struct.pack(">IIBBBBB",
+                                              width, height, 8, 0, 0, 0, 0))
+    for i in range(text_chunks):
+        yield make_png_chunk(b"tEXt", b"Comment\x00synthetic %d" % i)
+    if not exif_after_idat:
+        yield exif_chunk
+    # Emit stored deflate blocks, so that the IDAT data costs no compression
+    # time and keeps its size.
+    compressor = zlib.compressobj(0)
+    pending = b""
+    row = 0
+    while row < height:
+        rows = min(height - row, max(1, _PATTERN_SIZE // (width + 1)))
+        raw = b"".join(pattern_rows[(row + i) % 64] for i in range(rows))
+        pending += compressor.compress(raw)
+        row += rows
+        while len(pending) >= idat_size:
+            yield make_png_chunk(b"IDAT", pending[:idat_size])
+            pending = pending[idat_size:]
+    pending += compressor.flush()
+    while pending:
+        yield make_png_chunk(b"IDAT", pending[:idat_size])
+        pending = pending[idat_size:]
+    if exif_after_idat:
+        yield exif_chunk
+    yield make_png_chunk(b"IEND", b"")
+
+
+def write_png(filename, exif, **kwargs):
+    """Write a PNG file holding the given EXIF blob;
+       see iter_png_chunks for the keyword arguments.
+    """
+    with open(filename, "wb") as stream:
+        for chunk in iter_png_chunks(exif, **kwargs):
+            stream.write(chunk)
+
+
+def main():
+    """The main function."""
+    parser = argparse.ArgumentParser(
+        prog="exifgen",
+        description="Generate a synthetic EXIF blob, or a PNG holding it.")
+    parser.add_argument("output",
+                        metavar="file",
+                        help="the output PNG file, or raw EXIF file "
+                             "with --raw")
+    parser.add_argument("--tags",
+                        dest="tag_count",
+                        type=int,
+                        default=16,
+                        help="number of tags (default: %(default)d)")
+    parser.add_argument("--endian",
+                        dest="endian",
+                        choices=("II", "MM"),
+                        default="II",
+                        help="byte order (default: %(default)s)")
+    parser.add_argument("--flat",
+                        dest="sub_ifds",
+                        action="store_false",
+                        help="put all the tags in IFD0")
+    parser.add_argument("--thumbnail",
+                        dest="thumbnail_size",
+                        metavar="BYTES",
+                        type=int,
+                        default=0,
+                        help="add an IFD1 thumbnail of this size")
+    parser.add_argument("--raw",
+                        dest="raw",
+                        action="store_true",
+                        help="write the raw EXIF blob instead of a PNG")
+    parser.add_argument("--image-size",
+                        dest="image_size",
+                        metavar="BYTES",
+                        type=int,
+                        default=0x10000,
+                        help="approximate size of the image data "
+                             "(default: %(default)d)")
+    parser.add_argument("--idat-size",
+                        dest="idat_size",
+                        metavar="BYTES",
+                        type=int,
+                        default=0x10000,
+                        help="size of each IDAT chunk (default: %(default)d)")
+    parser.add_argument("--text-chunks",
+                        dest="text_chunks",
+                        metavar="N",
+                        type=int,
+                        default=0,
+                        help="number of tEXt chunks before the image data")
+    parser.add_argument("--after-idat",
+                        dest="exif_after_idat",
+                        action="store_true",
+                        help="place the EXIF chunk after the image data")
+    parser.add_argument("--compressed",
+                        dest="compressed",
+                        action="store_true",
+                        help="use a compressed zxIf chunk")
+    parser.add_argument("--seed",
+                        dest="seed",
+                        type=int,
+                        default=0,
+                        help="random seed (default: %(default)d)")
+    args = parser.parse_args()
+    exif = build_exif(tag_count=args.tag_count,
+                      endian=args.endian,
+                      sub_ifds=args.sub_ifds,
+                      thumbnail_size=args.thumbnail_size,
+                      seed=args.seed)
+    if args.raw:
+        with open(args.output, "wb") as stream:
+            stream.write(exif)
+        return
+    write_png(args.output, exif,
+              image_size=args.image_size,
+              idat_size=args.idat_size,
+              text_chunks=args.text_chunks,
+              exif_after_idat=args.exif_after_idat,
+              compressed=args.compressed,
+              seed=args.seed)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.stderr.write("INTERRUPTED\n")
+        sys.exit(130)  # SIGINT
@@ -12,6 +12,7 @@ Please see the accompanying file LICENSE_MIT.txt
 from __future__ import absolute_import, division, print_function
 
 import sys
+from array import array
 
 from bytepack import (unpack_uint32be,
                       unpack_uint32le,
@@ -79,6 +80,8 @@ _TIFF_TAGS = {
     0x0143: "Tile Length",
     0x0144: "Tile Offsets",
     0x0145: "Tile Byte Counts",
+    0x0201: "JPEG Interchange Format",
+    0x0202: "JPEG Interchange Format Length",
     0x0211: "YCbCr Coefficients",
     0x0212: "YCbCr Subsampling",
     0x0213: "YCbCr Positioning",
@@ -133,6 +136,108 @@ _TIFF_TAGS = {
 _TIFF_EXIF_IFD = 0x8769
 _GPS_IFD = 0x8825
 _INTEROPERABILITY_IFD = 0xa005
+_JPEG_INTERCHANGE_FORMAT = 0x0201
+_JPEG_INTERCHANGE_FORMAT_LENGTH = 0x0202
+
+# Bound the work done on crafted IFD chains and sub-IFD references.
+_IFD_COUNT_MAX = 256
+_TAG_COUNT_MAX = 0x10000
+
+_IFD_ENTRY_SIZE = 12
+_UINT32_TYPECODE = "I" if array("I").itemsize == 4 else "L"
+
+
+class TagRecord(object):
+    """A lightweight view of one tag stored in a TagTable."""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    @property
+    def tag_id(self):
+        """The tag id."""
+        return self._table.ids[self._index]
+
+    @property
+    def tag_type(self):
+        """The tag type."""
+        return self._table.types[self._index]
+
+    @property
+    def count(self):
+        """The number of values."""
+        return self._table.counts[self._index]
+
+    @property
+    def value_or_offset(self):
+        """The value, or the offset of the values."""
+        return self._table.values[self._index]
+
+    @property
+    def ifd(self):
+        """The name of the IFD holding the tag."""
+        return self._table.ifd_names[self._table.ifds[self._index]]
+
+    def __repr__(self):
+        return "TagRecord(ifd=%s, tag_id=0x%04x, tag_type=%d, count=%d, " \
+               "value_or_offset=0x%08x)" \
+               % (self.ifd, self.tag_id, self.tag_type, self.count,
+                  self.value_or_offset)
+
+
+class TagTable(object):
+    """Columnar storage of TIFF/EXIF tags, with one array per field.
+       The ifds column holds indices into ifd_names and ifd_offsets.
+    """
+
+    __slots__ = ("ids", "types", "counts", "values", "ifds",
+                 "ifd_names", "ifd_offsets", "ifd_starts")
+
+    def __init__(self):
+        self.ids = array("H")
+        self.types = array("H")
+        self.counts = array(_UINT32_TYPECODE)
+        self.values = array(_UINT32_TYPECODE)
+        self.ifds = array("H")
+        self.ifd_names = []
+        self.ifd_offsets = []
+        self.ifd_starts = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.ids)
+        if not 0 <= index < len(self.ids):
+            raise IndexError("tag index out of range")
+        return TagRecord(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.ids)):
+            yield TagRecord(self, index)
+
+    def append_ifd(self, ifd_name, ifd_offset, ids, types, counts, values):
+        """Append the columns of the tags found in one IFD."""
+        self.ifds.extend(array("H", [len(self.ifd_names)]) * len(ids))
+        self.ifd_names.append(ifd_name)
+        self.ifd_offsets.append(ifd_offset)
+        self.ifd_starts.append(len(self.ids))
+        self.ids.extend(ids)
+        self.types.extend(types)
+        self.counts.extend(counts)
+        self.values.extend(values)
+
+    def value_field_offset(self, index):
+        """Return the offset of the 4-byte value field of the tag at the
+           given index, within the EXIF data.
+        """
+        ifd = self.ifds[index]
+        entry = index - self.ifd_starts[ifd]
+        return self.ifd_offsets[ifd] + 2 + _IFD_ENTRY_SIZE * entry + 8
 
 
 class ExifInfo:
@@ -145,13 +250,19 @@ class ExifInfo:
     _exif_ifd_offset = 0
     _gps_ifd_offset = 0
     _interoperability_ifd_offset = 0
+    _next_ifd_offset = 0
+    _chained_ifd_offset = 0
+    _visited_ifd_offsets = None
+    _tag_budget = 0
     _hex = False
 
     def __init__(self, buffer, **kwargs):
         """Initialize the EXIF data reader."""
         self._hex = kwargs.get("hex", False)
         self._verbose = kwargs.get("verbose", False)
-        if not isinstance(buffer, bytes):
+        self._ifd_count_max = kwargs.get("ifd_count_max", _IFD_COUNT_MAX)
+        self._tag_count_max = kwargs.get("tag_count_max", _TAG_COUNT_MAX)
+        if not isinstance(buffer, (bytes, bytearray)):
             raise RuntimeError("invalid EXIF data type")
         if buffer.startswith(b"MM\x00\x2a"):
             self._endian = "MM"
@@ -167,12 +278,37 @@ class ExifInfo:
         """Return the endianness of the EXIF data."""
         return self._endian
 
-    def _tags_for_ifd(self, ifd_offset):
-        """Yield the tags found at the given TIFF IFD offset."""
+    def _enter_ifd(self, ifd_offset):
+        """Check the given TIFF IFD offset against the visited offsets
+           and the budgets; move there and return the number of entries.
+        """
         if ifd_offset < 8:
             raise RuntimeError("invalid TIFF IFD offset")
+        if ifd_offset in self._visited_ifd_offsets:
+            raise RuntimeError("circular TIFF IFD reference at 0x%08x"
+                               % ifd_offset)
+        if len(self._visited_ifd_offsets) >= self._ifd_count_max:
+            raise RuntimeError("too many TIFF IFDs in EXIF")
+        self._visited_ifd_offsets.add(ifd_offset)
         self._offset = ifd_offset
         ifd_size = self._ui16()
+        self._tag_budget -= ifd_size
+        if self._tag_budget < 0:
+            raise RuntimeError("too many TIFF tags in EXIF")
+        return ifd_size
+
+    def _read_next_ifd_offset(self, ifd_offset, ifd_size):
+        """Read the offset of the next IFD, found after the IFD entries."""
+        self._offset = ifd_offset + 2 + _IFD_ENTRY_SIZE * ifd_size
+        if self._offset + 4 <= len(self._buffer):
+            self._next_ifd_offset = self._ui32()
+        else:
+            # Tolerate a missing next-IFD offset at the end of the data.
+            self._next_ifd_offset = 0
+
+    def _tags_for_ifd(self, ifd_offset):
+        """Yield the tags found at the given TIFF IFD offset."""
+        ifd_size = self._enter_ifd(ifd_offset)
         for _ in range(0, ifd_size):
             tag_id = self._ui16()
             tag_type = self._ui16()
@@ -205,13 +341,124 @@ class ExifInfo:
                     raise RuntimeError("incorrect tag type for Interop IFD")
                 self._interoperability_ifd_offset = value_or_offset
             yield (tag_id, tag_type, count, value_or_offset)
+        self._read_next_ifd_offset(ifd_offset, ifd_size)
+
+    def _columns_for_ifd(self, ifd_offset):
+        """Decode the tags found at the given TIFF IFD offset into arrays
+           (ids, types, counts, values), without per-tag objects.
+        """
+        ifd_size = self._enter_ifd(ifd_offset)
+        start = self._offset
+        end = start + _IFD_ENTRY_SIZE * ifd_size
+        if end > len(self._buffer):
+            raise RuntimeError("out-of-bounds IFD access in EXIF")
+        entries = bytes(self._buffer[start:end])
+        halves = array("H", entries)
+        words = array(_UINT32_TYPECODE, entries)
+        if (self._endian == "MM") != (sys.byteorder == "big"):
+            halves.byteswap()
+            words.byteswap()
+        ids = halves[0::6]
+        types = halves[1::6]
+        counts = words[1::3]
+        values = words[2::3]
+        if self._endian == "MM" and (2 in types or 3 in types):
+            # FIXME: See the value_or_offset fixup in _tags_for_ifd.
+            for index in range(ifd_size):
+                if types[index] == 2:
+                    values[index] >>= 24
+                elif types[index] == 3:
+                    values[index] >>= 16
+        if 0 in counts:
+            raise RuntimeError("unsupported count=0 in tag 0x%x"
+                               % ids[counts.index(0)])
+        for (tag_id, label) in ((_TIFF_EXIF_IFD, "EXIF"),
+                                (_GPS_IFD, "GPS"),
+                                (_INTEROPERABILITY_IFD, "Interop")):
+            if tag_id not in ids:
+                continue
+            # As in _tags_for_ifd, every pointer of a kind must be a long,
+            # and the last one prevails.
+            indices = [index for index in range(ifd_size)
+                       if ids[index] == tag_id]
+            if any(types[index] != 4 for index in indices):
+                raise RuntimeError("incorrect tag type for %s IFD" % label)
+            index = indices[-1]
+            if tag_id == _TIFF_EXIF_IFD:
+                self._exif_ifd_offset = values[index]
+            elif tag_id == _GPS_IFD:
+                self._gps_ifd_offset = values[index]
+            else:
+                self._interoperability_ifd_offset = values[index]
+        self._read_next_ifd_offset(ifd_offset, ifd_size)
+        return (ids, types, counts, values)
+
+    def tag_table(self):
+        """Decode all TIFF/EXIF tags into a TagTable,
+           in the same order as tags().
+        """
+        self._reset_traversal()
+        table = TagTable()
+        ifd_offset = self._global_ifd_offset
+        ifd_num = 0
+        while True:
+            self._exif_ifd_offset = 0
+            self._gps_ifd_offset = 0
+            self._interoperability_ifd_offset = 0
+            table.append_ifd("IFD%d" % ifd_num, ifd_offset,
+                             *self._columns_for_ifd(ifd_offset))
+            next_ifd_offset = self._next_ifd_offset
+            if self._exif_ifd_offset > 0:
+                table.append_ifd("EXIF", self._exif_ifd_offset,
+                                 *self._columns_for_ifd(self._exif_ifd_offset))
+            if self._gps_ifd_offset > 0:
+                table.append_ifd("GPS", self._gps_ifd_offset,
+                                 *self._columns_for_ifd(self._gps_ifd_offset))
+            if self._interoperability_ifd_offset > 0:
+                offset = self._interoperability_ifd_offset
+                table.append_ifd("Interop", offset,
+                                 *self._columns_for_ifd(offset))
+            if next_ifd_offset == 0:
+                break
+            ifd_offset = next_ifd_offset
+            ifd_num += 1
+        return table
+
+    def _reset_traversal(self):
+        """Reset the visited IFD offsets and the tag budget."""
+        self._visited_ifd_offsets = set()
+        self._tag_budget = self._tag_count_max
 
     def tags(self):
-        """Yield all TIFF/EXIF tags."""
+        """Yield all TIFF/EXIF tags, following the IFD chain
+           (IFD0, IFD1, ...) and the sub-IFDs of each IFD in the chain.
+        """
+        self._reset_traversal()
+        ifd_offset = self._global_ifd_offset
+        ifd_num = 0
+        while True:
+            for tag in self._tags_for_chained_ifd(ifd_num, ifd_offset):
+                yield tag
+            ifd_offset = self._chained_ifd_offset
+            if ifd_offset == 0:
+                break
+            ifd_num += 1
+
+    def _tags_for_chained_ifd(self, ifd_num, ifd_offset):
+        """Yield the tags of an IFD in the chain, followed by the tags of
+           its sub-IFDs; save the offset of the next IFD in the chain.
+        """
+        self._exif_ifd_offset = 0
+        self._gps_ifd_offset = 0
+        self._interoperability_ifd_offset = 0
         if self._verbose:
-            print("TIFF IFD : 0x%08x" % self._global_ifd_offset)
-        for tag in self._tags_for_ifd(self._global_ifd_offset):
+            if ifd_num == 0:
+                print("TIFF IFD : 0x%08x" % ifd_offset)
+            else:
+                print("IFD%d : 0x%08x" % (ifd_num, ifd_offset))
+        for tag in self._tags_for_ifd(ifd_offset):
             yield tag
+        self._chained_ifd_offset = self._next_ifd_offset
         if self._exif_ifd_offset > 0:
             if self._verbose:
                 print("EXIF IFD : 0x%08x" % self._exif_ifd_offset)
@@ -229,6 +476,49 @@ class ExifInfo:
             for tag in self._tags_for_ifd(self._interoperability_ifd_offset):
                 yield tag
 
+    def thumbnail(self):
+        """Return the JPEG thumbnail found in IFD1 as a memoryview into
+           the EXIF buffer, without copying; return None if there is none.
+        """
+        self._reset_traversal()
+        for _ in self._tags_for_ifd(self._global_ifd_offset):
+            pass
+        if self._next_ifd_offset == 0:
+            return None
+        jpeg_offset = None
+        jpeg_length = None
+        for (tag_id, _, _, value_or_offset) \
+                in self._tags_for_ifd(self._next_ifd_offset):
+            if tag_id == _JPEG_INTERCHANGE_FORMAT:
+                jpeg_offset = value_or_offset
+            elif tag_id == _JPEG_INTERCHANGE_FORMAT_LENGTH:
+                jpeg_length = value_or_offset
+        if jpeg_offset is None or jpeg_length is None:
+            return None
+        if jpeg_offset + jpeg_length > len(self._buffer):
+            raise RuntimeError("out-of-bounds JPEG thumbnail in EXIF")
+        return memoryview(self._buffer)[jpeg_offset:jpeg_offset + jpeg_length]
+
+    def ascii_value(self, count, value_field_offset):
+        """Return the string value of an "ascii" tag.
+           The value, or its offset if it is longer than 4 bytes, is read
+           from the tag's value field at value_field_offset (see
+           TagTable.value_field_offset), so that the result does not
+           depend on the byte order of the EXIF data.
+        """
+        if value_field_offset + 4 > len(self._buffer):
+            raise RuntimeError("out-of-bounds ascii access in EXIF")
+        if count <= 4:
+            start = value_field_offset
+        elif self._endian == "MM":
+            start = unpack_uint32be(self._buffer, value_field_offset)
+        else:
+            start = unpack_uint32le(self._buffer, value_field_offset)
+        if start + count > len(self._buffer):
+            raise RuntimeError("out-of-bounds ascii access in EXIF")
+        data = bytes(self._buffer[start:start + count])
+        return data.split(b"\0", 1)[0].decode("latin_1")
+
     def tagid2str(self, tag_id):
         """Return an informative string representation of a TIFF tag id."""
         idstr = _TIFF_TAGS.get(tag_id, "[Unknown]")
@@ -298,6 +588,22 @@ def print_raw_exif_info(buffer, **kwargs):
                              value_or_offset=value_or_offset))
 
 
+def raw_exif_info(buffer, **kwargs):
+    """Return the EXIF information found in a raw byte stream,
+       as a dictionary that can be serialized to JSON.
+    """
+    lister = ExifInfo(buffer, **kwargs)
+    tags = []
+    for (tag_id, tag_type, count, value_or_offset) in lister.tags():
+        tags.append({"id": tag_id,
+                     "name": _TIFF_TAGS.get(tag_id, "[Unknown]"),
+                     "type": tag_type,
+                     "type_name": _TIFF_TAG_TYPES.get(tag_type, "[unknown]"),
+                     "count": count,
+                     "value": value_or_offset})
+    return {"endian": lister.endian(), "tags": tags}
+
+
 if __name__ == "__main__":
     # For testing only.
     for arg in sys.argv[1:]:
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+"""
+Extract the PNG EXIF information with asyncio, from an upload stream
+that is still arriving, without blocking the event loop.
+
+This module requires Python 3.7 or newer.
+
+Use, modification and distribution are subject to the MIT License.
+Please see the accompanying file LICENSE_MIT.txt
+"""
+
+import asyncio
+import json
+import re
+import sys
+import zlib
+
+from bytepack import unpack_uint32be
+from exifinfo import raw_exif_info
+from pngexifinfo import (_DRAIN_BUFFER_SIZE,
+                         _PNG_CHUNK_SIZE_MAX,
+                         _PNG_SIGNATURE,
+                         _READ_DATA_SIZE_MAX,
+                         _TIFF_HEADERS,
+                         _check_png,
+                         _check_png_crc,
+                         _extract_png_exif,
+                         print_debug)
+
+
+class _AsyncReader(object):
+    """Read exact amounts of data from an asyncio.StreamReader,
+       or from an async iterator of byte chunks.
+    """
+
+    def __init__(self, source):
+        self._stream = None
+        self._chunks = None
+        self._buffer = bytearray()
+        if hasattr(source, "readexactly"):
+            self._stream = source
+        else:
+            self._chunks = source.__aiter__()
+
+    async def read(self, size):
+        """Read the given number of bytes; return fewer at end of stream."""
+        if self._stream is not None:
+            try:
+                return await self._stream.readexactly(size)
+            except asyncio.IncompleteReadError as err:
+                return err.partial
+        while len(self._buffer) < size:
+            try:
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                break
+            self._buffer += chunk
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+async def _read_png_chunk_data(reader, chunk_len, checksum, chunk_sig, keep):
+    """Read the chunk data piece by piece, updating the CRC32 checksum;
+       return (data or None, checksum).
+    """
+    pieces = [] if keep else None
+    remaining = chunk_len
+    while remaining > 0:
+        piece = await reader.read(min(remaining, _DRAIN_BUFFER_SIZE))
+        _check_png(piece, chunk_sig=chunk_sig)
+        if checksum is not None:
+            checksum = zlib.crc32(piece, checksum)
+        if keep:
+            pieces.append(piece)
+        remaining -= len(piece)
+    return (b"".join(pieces) if keep else None, checksum)
+
+
+async def iter_png_exif_async(reader, **kwargs):
+    """Yield the EXIF data found in a PNG datastream, as it arrives.
+       The PNG signature must have been consumed already.
+    """
+    debug = kwargs.get("debug", False)
+    check_crc = kwargs.get("check_crc", True)
+    first_exif = kwargs.get("first_exif", False)
+    before_idat = kwargs.get("before_idat", False)
+    has_exif = False
+    while True:
+        chunk_hdr = await reader.read(8)
+        _check_png(len(chunk_hdr) == 8)
+        chunk_len = unpack_uint32be(chunk_hdr, offset=0)
+        chunk_sig = chunk_hdr[4:8].decode("latin_1", errors="ignore")
+        _check_png(re.search(r"^[A-Za-z]{4}$", chunk_sig), chunk_sig=chunk_sig)
+        _check_png(chunk_len < _PNG_CHUNK_SIZE_MAX, chunk_sig=chunk_sig)
+        if debug:
+            print_debug("processing chunk: %s" % chunk_sig)
+        if chunk_sig == "IDAT" and before_idat:
+            break
+        is_exif = chunk_sig.lower() in ["exif", "zxif"] and chunk_len > 8
+        keep = is_exif and chunk_len <= _READ_DATA_SIZE_MAX
+        checksum = zlib.crc32(chunk_hdr[4:8]) if check_crc else None
+        (chunk_data, checksum) = await _read_png_chunk_data(
+            reader, chunk_len, checksum, chunk_sig, keep)
+        chunk_crc = await reader.read(4)
+        _check_png(len(chunk_crc) == 4, chunk_sig=chunk_sig)
+        if checksum is not None:
+            _check_png_crc(chunk_crc, checksum, chunk_sig=chunk_sig)
+        if chunk_sig == "IEND":
+            _check_png(chunk_len == 0, chunk_sig=chunk_sig)
+            break
+        if keep:
+            has_exif = True
+            yield _extract_png_exif(chunk_data, **kwargs)
+            if first_exif:
+                break
+    if not has_exif:
+        raise RuntimeError("no EXIF data in PNG stream")
+
+
+async def iter_stream_exif_async(source, **kwargs):
+    """Yield the EXIF data found in an asyncio.StreamReader, or in an
+       async iterator of byte chunks, holding either a PNG datastream
+       or a raw EXIF blob.
+    """
+    reader = _AsyncReader(source)
+    header = await reader.read(8)
+    if header == _PNG_SIGNATURE:
+        async for exif_data in iter_png_exif_async(reader, **kwargs):
+            yield exif_data
+    elif header[0:4] in _TIFF_HEADERS:
+        yield header + await reader.read(_READ_DATA_SIZE_MAX)
+    elif header[0:4] == _PNG_SIGNATURE[0:4]:
+        raise RuntimeError("corrupted PNG file")
+    else:
+        raise RuntimeError("not a PNG file")
+
+
+async def read_exif_info_async(source, **kwargs):
+    """Return the EXIF information found in an asyncio.StreamReader,
+       or in an async iterator of byte chunks, as a list of dictionaries
+       (see exifinfo.raw_exif_info).  Raise RuntimeError as soon as the
+       data is found to be malformed, or if a chunk CRC does not match.
+    """
+    return [raw_exif_info(exif_data) async for exif_data
+            in iter_stream_exif_async(source, **kwargs)]
+
+
+async def _iter_file_chunks(path, chunk_size=0x4000):
+    """Yield the contents of a file in chunks, as an upload would."""
+    with open(path, "rb") as stream:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+            await asyncio.sleep(0)
+
+
+async def _main(paths):
+    results = await asyncio.gather(
+        *[read_exif_info_async(_iter_file_chunks(path)) for path in paths],
+        return_exceptions=True)
+    for (path, result) in zip(paths, results):
+        if isinstance(result, Exception):
+            print("%s: error: %s" % (path, result))
+        else:
+            print("%s: %s" % (path, json.dumps(result)))
+
+
+if __name__ == "__main__":
+    # For testing only.
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the pngexif tools on synthetic EXIF data and PNG files,
+and compare the results with those of a previous run.
+
+Use, modification and distribution are subject to the MIT License.
+Please see the accompanying file LICENSE_MIT.txt
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+from exifgen import build_exif, write_png
+from exifinfo import ExifInfo
+from pngexifinfo import iter_stream_exif
+
+# Each case is (name, build_exif arguments, write_png arguments).
+# A case without write_png arguments benchmarks ExifInfo alone.
+_CASES = [
+    ("exif-16-II", dict(tag_count=16), None),
+    ("exif-16-MM", dict(tag_count=16, endian="MM"), None),
+    ("exif-1000-flat", dict(tag_count=1000, sub_ifds=False), None),
+    ("exif-1000-nested", dict(tag_count=1000), None),
+    ("exif-20000-nested", dict(tag_count=20000), None),
+    ("png-64k-before-idat", dict(tag_count=64),
+     dict(image_size=0x10000)),
+    ("png-16m-after-idat", dict(tag_count=64),
+     dict(image_size=0x1000000, exif_after_idat=True)),
+    ("png-16m-small-idat", dict(tag_count=64),
+     dict(image_size=0x1000000, idat_size=0x2000, exif_after_idat=True)),
+    ("png-5000-text-chunks", dict(tag_count=64),
+     dict(text_chunks=5000)),
+    ("png-zxif-1000", dict(tag_count=1000),
+     dict(compressed=True)),
+]
+
+# The metrics where higher is better, and those where lower is better.
+_THROUGHPUT_METRICS = ("files_per_s", "tags_per_s", "mb_per_s")
+_COST_METRICS = ("peak_kib",)
+
+
+def _count_tags(exif_data, api="tags"):
+    """Parse the given EXIF blob; return the number of tags."""
+    if api == "table":
+        return len(ExifInfo(exif_data).tag_table())
+    count = 0
+    for _ in ExifInfo(exif_data).tags():
+        count += 1
+    return count
+
+
+def _parse_file(path, api="tags", **kwargs):
+    """Parse the given PNG file; return the number of tags."""
+    count = 0
+    with open(path, "rb") as stream:
+        for exif_data in iter_stream_exif(stream, **kwargs):
+            count += _count_tags(exif_data, api=api)
+    return count
+
+
+def _measure(func, min_time, repeat):
+    """Return the best time per call of func, and its result."""
+    result = func()
+    number = 1
+    while True:
+        elapsed = timeit.timeit(func, number=number)
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = min([elapsed] + timeit.repeat(func, number=number,
+                                         repeat=repeat - 1))
+    return (best / number, result)
+
+
+def _peak_memory(func):
+    """Return the peak memory allocated by func, in KiB."""
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak // 1024
+
+
+def run_case(workdir, name, exif_args, png_args, mode, api, min_time,
+             repeat):
+    """Run one benchmark case; return its metrics."""
+    exif = build_exif(**exif_args)
+    if png_args is None:
+        func = lambda: _count_tags(exif, api=api)
+        size = len(exif)
+    else:
+        path = os.path.join(workdir, name + ".png")
+        write_png(path, exif, **png_args)
+        if mode == "fast":
+            options = dict(fast=True, check_crc=False)
+        else:
+            options = {}
+        func = lambda: _parse_file(path, api=api, **options)
+        size = os.path.getsize(path)
+    (seconds, tag_count) = _measure(func, min_time, repeat)
+    return {
+        "files_per_s": 1.0 / seconds,
+        "tags_per_s": tag_count / seconds,
+        "mb_per_s": size / seconds / 1e6,
+        "peak_kib": _peak_memory(func),
+        "size": size,
+        "tags": tag_count,
+    }
+
+
+def compare_results(current, baseline, threshold):
+    """Return a list of (case, metric, baseline, current) regressions."""
+    regressions = []
+    for (name, metrics) in sorted(current["cases"].items()):
+        previous = baseline.get("cases", {}).get(name)
+        if previous is None:
+            continue
+        for metric in _THROUGHPUT_METRICS:
+            if metrics[metric] < previous[metric] * (1.0 - threshold):
+                regressions.append((name, metric, previous[metric],
+                                    metrics[metric]))
+        for metric in _COST_METRICS:
+            if metrics[metric] > previous[metric] * (1.0 + threshold) \
+                    and metrics[metric] - previous[metric] > 64:
+                regressions.append((name, metric, previous[metric],
+                                    metrics[metric]))
+    return regressions
+
+
+def main():
+    """The main function."""
+    parser = argparse.ArgumentParser(
+        prog="pngexifbench",
+        description="Benchmark the pngexif tools on synthetic data.")
+    parser.add_argument("cases",
+                        metavar="case",
+                        nargs="*",
+                        help="run only the cases whose names contain "
+                             "one of these strings")
+    parser.add_argument("--mode",
+                        dest="mode",
+                        choices=("default", "fast"),
+                        default="default",
+                        help="the pngexifinfo mode used for the PNG cases "
+                             "(default: %(default)s)")
+    parser.add_argument("--api",
+                        dest="api",
+                        choices=("tags", "table"),
+                        default="tags",
+                        help="decode the tags one by one with ExifInfo.tags, "
+                             "or in bulk with ExifInfo.tag_table "
+                             "(default: %(default)s)")
+    parser.add_argument("--min-time",
+                        dest="min_time",
+                        metavar="SECONDS",
+                        type=float,
+                        default=0.2,
+                        help="minimum duration of each measurement "
+                             "(default: %(default)s)")
+    parser.add_argument("--repeat",
+                        dest="repeat",
+                        type=int,
+                        default=3,
+                        help="number of measurements per case, of which "
+                             "the best is kept (default: %(default)d)")
+    parser.add_argument("--save",
+                        dest="save",
+                        metavar="FILE",
+                        help="save the results to this JSON file")
+    parser.add_argument("--compare",
+                        dest="compare",
+                        metavar="FILE",
+                        help="compare the results with this JSON file, "
+                             "and fail on regressions")
+    parser.add_argument("--threshold",
+                        dest="threshold",
+                        type=float,
+                        default=0.1,
+                        help="relative change that counts as a regression "
+                             "(default: %(default)s)")
+    parser.add_argument("--list",
+                        dest="list",
+                        action="store_true",
+                        help="list the benchmark cases")
+    args = parser.parse_args()
+    cases = [case for case in _CASES
+             if not args.cases or any(s in case[0] for s in args.cases)]
+    if args.list:
+        for case in cases:
+            print(case[0])
+        return
+    results = {
+        "python": platform.python_version(),
+        "mode": args.mode,
+        "api": args.api,
+        "cases": {},
+    }
+    print("%-24s %10s %12s %10s %10s"
+          % ("case", "files/s", "tags/s", "MB/s", "peak KiB"))
+    workdir = tempfile.mkdtemp(prefix="pngexifbench-")
+    try:
+        for (name, exif_args, png_args) in cases:
+            metrics = run_case(workdir, name, exif_args, png_args,
+                               args.mode, args.api, args.min_time,
+                               args.repeat)
+            results["cases"][name] = metrics
+            print("%-24s %10.1f %12.0f %10.1f %10d"
+                  % (name, metrics["files_per_s"], metrics["tags_per_s"],
+                     metrics["mb_per_s"], metrics["peak_kib"]))
+    finally:
+        shutil.rmtree(workdir)
+    if args.save:
+        with open(args.save, "w") as stream:
+            json.dump(results, stream, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as stream:
+            baseline = json.load(stream)
+        if baseline.get("mode") != args.mode \
+                or baseline.get("api", "tags") != args.api:
+            parser.error("cannot compare the results of the %s mode and "
+                         "the %s API with those of the %s mode and the %s API"
+                         % (args.mode, args.api, baseline.get("mode"),
+                            baseline.get("api", "tags")))
+        regressions = compare_results(results, baseline, args.threshold)
+        for (name, metric, before, after) in regressions:
+            print("REGRESSION: %s: %s: %.1f -> %.1f"
+                  % (name, metric, before, after))
+        if regressions:
+            parser.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.stderr.write("INTERRUPTED\n")
+        sys.exit(130)  # SIGINT
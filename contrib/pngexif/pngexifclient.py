@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+"""
+Query a running pngexifserver for the PNG EXIF information.
+
+Use, modification and distribution are subject to the MIT License.
+Please see the accompanying file LICENSE_MIT.txt
+"""
+
+from __future__ import absolute_import, division, print_function
+
+# Keep the imports to a minimum: this client exists to avoid the
+# start-up cost of the full pngexifinfo program.
+import getopt
+import json
+import os
+import socket
+import struct
+import sys
+
+_MESSAGE_PREFIX = struct.Struct(">II")
+_MESSAGE_SIZE_MAX = 0x10000000
+
+
+def default_socket_path():
+    """Return the default path of the server socket."""
+    path = os.environ.get("PNGEXIFINFO_SOCKET")
+    if path:
+        return path
+    return "/tmp/pngexifinfo-%d.sock" % os.getuid()
+
+
+def _read_exactly(instream, size):
+    """Read exactly the given number of bytes, or None at end of stream."""
+    data = instream.read(size)
+    if not data and size > 0:
+        return None
+    while len(data) < size:
+        more = instream.read(size - len(data))
+        if not more:
+            raise RuntimeError("truncated pngexifserver message")
+        data += more
+    return data
+
+
+def write_message(outstream, header, payload=b""):
+    """Write a message: a length prefix, a JSON header and a raw payload."""
+    header_data = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    outstream.write(_MESSAGE_PREFIX.pack(len(header_data), len(payload)))
+    outstream.write(header_data)
+    if payload:
+        outstream.write(payload)
+    outstream.flush()
+
+
+def read_message(instream):
+    """Read a message; return (header, payload), or None at end of stream."""
+    prefix = _read_exactly(instream, _MESSAGE_PREFIX.size)
+    if prefix is None:
+        return None
+    (header_len, payload_len) = _MESSAGE_PREFIX.unpack(prefix)
+    if header_len + payload_len > _MESSAGE_SIZE_MAX:
+        raise RuntimeError("oversized pngexifserver message")
+    header = json.loads(_read_exactly(instream, header_len).decode("utf-8"))
+    payload = _read_exactly(instream, payload_len) if payload_len else b""
+    return (header, payload)
+
+
+class ExifClient:
+    """Client for the pngexifserver protocol."""
+
+    def __init__(self, socket_path=None):
+        """Connect to the server listening at the given socket path."""
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(socket_path or default_socket_path())
+        self._stream = self._socket.makefile("rwb")
+        self._next_id = 0
+
+    def close(self):
+        """Close the connection."""
+        self._stream.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _query(self, header, payload=b""):
+        """Send a request and wait for its response."""
+        self._next_id += 1
+        header["id"] = self._next_id
+        write_message(self._stream, header, payload)
+        message = read_message(self._stream)
+        if message is None:
+            raise RuntimeError("connection closed by pngexifserver")
+        return message[0]
+
+    def query_path(self, path, **kwargs):
+        """Return the server response for the given file path."""
+        header = dict(kwargs, path=os.path.abspath(path))
+        return self._query(header)
+
+    def query_buffer(self, data, **kwargs):
+        """Return the server response for the given PNG or EXIF data."""
+        return self._query(dict(kwargs), payload=data)
+
+
+def format_response(response, hex_tags=False):
+    """Format a server response in the style of pngexifinfo."""
+    lines = []
+    for exif in response["exif"]:
+        lines.append("EXIF (endian=%s)" % exif["endian"])
+        for tag in exif["tags"]:
+            if hex_tags:
+                idnum = "0x%04x" % tag["id"]
+            else:
+                idnum = "%d" % tag["id"]
+            lines.append("%s (%s) (type=%d:%s) (count=%d) : 0x%08x"
+                         % (tag["name"], idnum, tag["type"],
+                            tag["type_name"], tag["count"], tag["value"]))
+    return "\n".join(lines)
+
+
+def main():
+    """The main function."""
+    usage = "usage: pngexifclient [-x] [-j] [-S socket] [--] files..."
+    try:
+        (opts, files) = getopt.getopt(sys.argv[1:], "xjfS:h",
+                                      ["hex", "json", "fast",
+                                       "socket=", "help"])
+    except getopt.GetoptError as err:
+        sys.stderr.write("%s\n%s\n" % (usage, err))
+        return 2
+    opts = dict(opts)
+    if "-h" in opts or "--help" in opts:
+        print(usage)
+        return 0
+    if not files:
+        sys.stderr.write("%s\nerror: missing file operand\n" % usage)
+        return 2
+    hex_tags = "-x" in opts or "--hex" in opts
+    as_json = "-j" in opts or "--json" in opts
+    fast = "-f" in opts or "--fast" in opts
+    socket_path = opts.get("-S", opts.get("--socket"))
+    result = 0
+    try:
+        client = ExifClient(socket_path)
+    except (IOError, OSError) as err:
+        sys.stderr.write("%s: error: cannot connect to pngexifserver: %s\n"
+                         % (sys.argv[0], err))
+        return 69  # os.EX_UNAVAILABLE
+    with client:
+        for file in files:
+            if file == "-":
+                stdin = getattr(sys.stdin, "buffer", sys.stdin)
+                response = client.query_buffer(stdin.read(), fast=fast)
+            else:
+                response = client.query_path(file, fast=fast)
+            if as_json:
+                print(json.dumps(dict(response, file=file)))
+            elif response["ok"]:
+                print(format_response(response, hex_tags=hex_tags))
+            if not response["ok"]:
+                sys.stderr.write("%s: error: %s: %s\n"
+                                 % (sys.argv[0], file, response["error"]))
+                result = response.get("status", 69)
+    return result
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.stderr.write("INTERRUPTED\n")
+        sys.exit(130)  # SIGINT
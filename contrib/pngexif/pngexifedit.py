@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+"""
+Strip, replace or insert the EXIF information in a PNG file.
+
+Only the chunk headers are parsed.  The chunks that are kept, including
+the IDAT runs, are copied byte-for-byte, inside the kernel if possible,
+so the cost of a rewrite is proportional to the size of the metadata
+rather than the size of the image.
+
+Use, modification and distribution are subject to the MIT License.
+Please see the accompanying file LICENSE_MIT.txt
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import zlib
+
+from pngexifinfo import (_PNG_CHUNK_SIZE_MAX,
+                         _PNG_SIGNATURE,
+                         _TIFF_HEADERS,
+                         iter_png_chunk_headers,
+                         print_error)
+
+_COPY_BUFFER_SIZE = 0x100000
+_EXIF_CHUNK_SIGS = ("eXIf", "zXIf", "exIf", "zxIf")
+
+
+def make_png_chunk(chunk_sig, chunk_data):
+    """Return a complete PNG chunk, with its length and its CRC."""
+    chunk_type = chunk_sig.encode("latin_1")
+    checksum = zlib.crc32(chunk_data, zlib.crc32(chunk_type)) & 0xffffffff
+    return b"".join([struct.pack(">I", len(chunk_data)),
+                     chunk_type,
+                     chunk_data,
+                     struct.pack(">I", checksum)])
+
+
+def plan_exif_rewrite(instream, exif_data=None):
+    """Return the rewrite plan of a PNG datastream, as a list of items
+       that are either (offset, size) ranges to copy from the input,
+       or bytes to write.  If exif_data is None, all the EXIF chunks are
+       dropped; otherwise, the first EXIF chunk is replaced with an eXIf
+       chunk holding exif_data (or one is inserted before the first IDAT)
+       and the other EXIF chunks are dropped.
+    """
+    instream.seek(0)
+    if instream.read(8) != _PNG_SIGNATURE:
+        raise RuntimeError("not a PNG file")
+    new_chunk = None
+    if exif_data is not None:
+        new_chunk = make_png_chunk("eXIf", exif_data)
+    plan = [(0, 8)]
+    for (offset, chunk_len, chunk_sig) in iter_png_chunk_headers(instream):
+        size = 12 + chunk_len
+        if chunk_sig in _EXIF_CHUNK_SIGS:
+            if new_chunk is not None:
+                plan.append(new_chunk)
+                new_chunk = None
+            continue
+        if new_chunk is not None and chunk_sig in ("IDAT", "IEND"):
+            plan.append(new_chunk)
+            new_chunk = None
+        last = plan[-1]
+        if isinstance(last, tuple) and last[0] + last[1] == offset:
+            # Coalesce the adjacent chunks, e.g. the IDAT runs.
+            plan[-1] = (last[0], last[1] + size)
+        else:
+            plan.append((offset, size))
+    return plan
+
+
+def _copy_range(instream, outfd, offset, size):
+    """Copy a range of bytes from instream to the current position of
+       outfd, using copy_file_range or sendfile where available.
+    """
+    infd = instream.fileno()
+    copy_file_range = getattr(os, "copy_file_range", None)
+    while size > 0 and copy_file_range is not None:
+        try:
+            copied = copy_file_range(infd, outfd, size, offset)
+        except OSError:
+            # E.g. EXDEV on older kernels, or EINVAL on special files.
+            break
+        if copied == 0:
+            raise RuntimeError("unexpected end of PNG file")
+        offset += copied
+        size -= copied
+    sendfile = getattr(os, "sendfile", None)
+    while size > 0 and sendfile is not None:
+        try:
+            copied = sendfile(outfd, infd, offset, size)
+        except OSError:
+            break
+        if copied == 0:
+            raise RuntimeError("unexpected end of PNG file")
+        offset += copied
+        size -= copied
+    if size > 0:
+        buffer = bytearray(min(size, _COPY_BUFFER_SIZE))
+        view = memoryview(buffer)
+        instream.seek(offset)
+        while size > 0:
+            count = instream.readinto(view[:min(size, len(buffer))])
+            if count == 0:
+                raise RuntimeError("unexpected end of PNG file")
+            _write_all(outfd, view[:count])
+            size -= count
+
+
+def _write_all(outfd, data):
+    """Write all the given data to outfd."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(outfd, view):]
+
+
+def execute_plan(plan, instream, outstream):
+    """Write the output described by the rewrite plan."""
+    outstream.flush()
+    outfd = outstream.fileno()
+    for item in plan:
+        if isinstance(item, tuple):
+            _copy_range(instream, outfd, item[0], item[1])
+        else:
+            _write_all(outfd, item)
+
+
+def rewrite_png_exif(infile, outfile, exif_data=None):
+    """Rewrite the EXIF information of a PNG file; see plan_exif_rewrite.
+       The output file may be the same as the input file.
+    """
+    if exif_data is not None and bytes(exif_data[0:4]) not in _TIFF_HEADERS:
+        raise RuntimeError("invalid TIFF/EXIF header in the new EXIF data")
+    with open(infile, "rb") as instream:
+        plan = plan_exif_rewrite(instream, exif_data)
+        if outfile == "-":
+            outstream = getattr(sys.stdout, "buffer", sys.stdout)
+            execute_plan(plan, instream, outstream)
+            return
+        if os.path.exists(outfile) and os.path.samefile(infile, outfile):
+            # Write to a temporary file, then replace the input atomically.
+            (outfd, tmpfile) = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(outfile)),
+                prefix=".pngexifedit-")
+            try:
+                with os.fdopen(outfd, "wb") as outstream:
+                    execute_plan(plan, instream, outstream)
+                os.chmod(tmpfile, os.stat(infile).st_mode & 0o7777)
+                os.rename(tmpfile, outfile)
+            except BaseException:
+                os.remove(tmpfile)
+                raise
+            return
+        with open(outfile, "wb") as outstream:
+            execute_plan(plan, instream, outstream)
+
+
+def main():
+    """The main function."""
+    parser = argparse.ArgumentParser(
+        prog="pngexifedit",
+        usage="%(prog)s (--strip | --replace EXIF) [options] file",
+        description="Strip, replace or insert the PNG EXIF information.")
+    parser.add_argument("file",
+                        metavar="file",
+                        help="a PNG file")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("-d",
+                       "--strip",
+                       dest="strip",
+                       action="store_true",
+                       help="remove all the EXIF chunks")
+    group.add_argument("-r",
+                       "--replace",
+                       dest="exif_file",
+                       metavar="EXIF",
+                       help="replace the EXIF chunks with the raw EXIF blob "
+                            "found in this file, or insert it if there is "
+                            "no EXIF chunk")
+    parser.add_argument("-o",
+                        "--output",
+                        dest="output",
+                        metavar="FILE",
+                        help="write the output to this file "
+                             "(use - for the standard output)")
+    parser.add_argument("-i",
+                        "--in-place",
+                        dest="in_place",
+                        action="store_true",
+                        help="overwrite the input file")
+    args = parser.parse_args()
+    if args.in_place == bool(args.output):
+        parser.error("exactly one of --output and --in-place is required")
+    try:
+        exif_data = None
+        if args.exif_file is not None:
+            with open(args.exif_file, "rb") as stream:
+                exif_data = stream.read(_PNG_CHUNK_SIZE_MAX)
+        rewrite_png_exif(args.file, args.output or args.file, exif_data)
+    except (IOError, OSError) as err:
+        print_error(str(err))
+        parser.exit(66)  # os.EX_NOINPUT
+    except RuntimeError as err:
+        print_error("%s: %s" % (args.file, str(err)))
+        parser.exit(69)  # os.EX_UNAVAILABLE
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.stderr.write("INTERRUPTED\n")
+        sys.exit(130)  # SIGINT
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+
+"""
+Maintain an incremental SQLite index of the EXIF information found in
+a tree of PNG files, and query it by tag.
+
+A rescan only re-opens the files whose path, size, modification time or
+inode number changed since the previous scan.
+
+Use, modification and distribution are subject to the MIT License.
+Please see the accompanying file LICENSE_MIT.txt
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import struct
+import sys
+import zlib
+
+from exifinfo import ExifInfo, _TIFF_TAGS
+from pngexifinfo import iter_stream_exif
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS tags (
+    path TEXT NOT NULL,
+    exif INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    tag_type INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS tags_path ON tags (path);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag_id, text);
+"""
+
+_BATCH_SIZE = 1000
+_TAG_IDS = dict((name.lower(), tag_id)
+                for (tag_id, name) in _TIFF_TAGS.items())
+
+
+def _file_key(stat):
+    """Return the (size, mtime_ns, inode) key of a stat result."""
+    mtime_ns = getattr(stat, "st_mtime_ns", None)
+    if mtime_ns is None:
+        mtime_ns = int(stat.st_mtime * 1000000000)
+    return (stat.st_size, mtime_ns, stat.st_ino)
+
+
+def iter_png_files(roots):
+    """Yield (path, key) for the PNG files found under the given roots."""
+    for root in roots:
+        if os.path.isfile(root):
+            yield (os.path.abspath(root), _file_key(os.stat(root)))
+            continue
+        for (dirpath, _, filenames) in os.walk(os.path.abspath(root)):
+            for filename in filenames:
+                if not filename.lower().endswith(".png"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    yield (path, _file_key(os.stat(path)))
+                except OSError:
+                    # The file vanished during the walk.
+                    continue
+
+
+def scan_file(path):
+    """Parse the given file; return (path, error, tag rows)."""
+    rows = []
+    try:
+        with open(path, "rb") as stream:
+            exif_blobs = iter_stream_exif(stream, fast=True, check_crc=False)
+            for (exif_num, exif_data) in enumerate(exif_blobs):
+                lister = ExifInfo(exif_data)
+                table = lister.tag_table()
+                for (index, (tag_id, tag_type, count, value)) in enumerate(
+                        zip(table.ids, table.types, table.counts,
+                            table.values)):
+                    text = None
+                    if tag_type == 2:
+                        text = lister.ascii_value(
+                            count, table.value_field_offset(index))
+                    rows.append((path, exif_num, tag_id, tag_type, count,
+                                 value, text))
+    except (IOError, OSError, RuntimeError, struct.error, zlib.error) as err:
+        return (path, str(err), rows)
+    return (path, None, rows)
+
+
+def _scan_files(paths, workers):
+    """Yield the scan results of the given paths, in any order."""
+    if workers <= 1 or len(paths) < 2:
+        for path in paths:
+            yield scan_file(path)
+        return
+    pool = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap_unordered(scan_file, paths, chunksize=64):
+            yield result
+    finally:
+        pool.terminate()
+
+
+class ExifIndex:
+    """SQLite index of the EXIF tags of a collection of PNG files."""
+
+    def __init__(self, path):
+        """Open or create the index database at the given path."""
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        """Close the index database."""
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def scan(self, roots, workers=1, prune=True):
+        """Bring the index up to date with the PNG files under the roots;
+           return the (unchanged, updated, removed) file counts.
+        """
+        known = dict((row[0], tuple(row[1:])) for row in self._conn.execute(
+            "SELECT path, size, mtime_ns, inode FROM files"))
+        seen = set()
+        changed = {}
+        for (path, key) in iter_png_files(roots):
+            seen.add(path)
+            if known.get(path) != key:
+                changed[path] = key
+        updated = 0
+        batch = []
+        for result in _scan_files(sorted(changed), workers):
+            batch.append(result)
+            if len(batch) >= _BATCH_SIZE:
+                self._store(batch, changed)
+                updated += len(batch)
+                batch = []
+        self._store(batch, changed)
+        updated += len(batch)
+        removed = []
+        if prune:
+            # Only forget the vanished files that belong to the given roots.
+            roots = [os.path.abspath(root) for root in roots]
+            prefixes = tuple(os.path.join(root, "") for root in roots)
+            removed = [(path,) for path in known
+                       if path not in seen
+                       and (path in roots or path.startswith(prefixes))]
+            with self._conn:
+                self._conn.executemany("DELETE FROM tags WHERE path = ?",
+                                       removed)
+                self._conn.executemany("DELETE FROM files WHERE path = ?",
+                                       removed)
+        return (len(seen) - len(changed), updated, len(removed))
+
+    def _store(self, results, keys):
+        """Replace the index entries of the given scan results
+           in a single transaction.
+        """
+        if not results:
+            return
+        with self._conn:
+            self._conn.executemany("DELETE FROM tags WHERE path = ?",
+                                   [(path,) for (path, _, _) in results])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                [(path,) + keys[path] + (error,)
+                 for (path, error, _) in results])
+            self._conn.executemany(
+                "INSERT INTO tags VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [row for (_, _, rows) in results for row in rows])
+
+    def query(self, tags=(), errors=False):
+        """Return the paths of the indexed files that have all the given
+           tags; each tag is a (tag_id, text) pair, and a text of None
+           matches any value.
+        """
+        sql = "SELECT path FROM files WHERE "
+        sql += "error IS NOT NULL" if errors else "error IS NULL"
+        params = []
+        for (tag_id, text) in tags:
+            sql += " AND path IN (SELECT path FROM tags WHERE tag_id = ?"
+            params.append(tag_id)
+            if text is not None:
+                sql += " AND text = ?"
+                params.append(text)
+            sql += ")"
+        sql += " ORDER BY path"
+        return [row[0] for row in self._conn.execute(sql, params)]
+
+
+def parse_tag(text):
+    """Parse a tag query of the form NAME[=VALUE] or ID[=VALUE],
+       where ID may be written in base 16 with the 0x prefix.
+    """
+    (name, sep, value) = text.partition("=")
+    name = name.strip()
+    try:
+        tag_id = int(name, 0)
+    except ValueError:
+        tag_id = _TAG_IDS.get(name.lower())
+        if tag_id is None:
+            raise argparse.ArgumentTypeError("unknown EXIF tag: '%s'" % name)
+    return (tag_id, value if sep else None)
+
+
+def main():
+    """The main function."""
+    parser = argparse.ArgumentParser(
+        prog="pngexifindex",
+        description="Index the PNG EXIF information, and query the index.")
+    parser.add_argument("index",
+                        metavar="index",
+                        help="the SQLite index database")
+    parser.add_argument("roots",
+                        metavar="path",
+                        nargs="*",
+                        help="a PNG file or a directory to (re)scan")
+    parser.add_argument("-j",
+                        "--jobs",
+                        dest="jobs",
+                        metavar="N",
+                        type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="number of parsing processes "
+                             "(default: %(default)d)")
+    parser.add_argument("--no-prune",
+                        dest="prune",
+                        action="store_false",
+                        help="keep the entries of the files that vanished")
+    parser.add_argument("-t",
+                        "--tag",
+                        dest="tags",
+                        metavar="TAG[=VALUE]",
+                        action="append",
+                        type=parse_tag,
+                        default=[],
+                        help="list the files having this tag, e.g. "
+                             "'GPS IFD' or 'Make=Canon' (repeatable)")
+    parser.add_argument("--errors",
+                        dest="errors",
+                        action="store_true",
+                        help="list the files that could not be parsed")
+    parser.add_argument("-v",
+                        "--verbose",
+                        dest="verbose",
+                        action="store_true",
+                        help="run in verbose mode")
+    args = parser.parse_args()
+    if not args.roots and not args.tags and not args.errors:
+        parser.error("nothing to scan or query")
+    with ExifIndex(args.index) as index:
+        if args.roots:
+            (unchanged, updated, removed) = index.scan(args.roots,
+                                                       workers=args.jobs,
+                                                       prune=args.prune)
+            if args.verbose:
+                sys.stderr.write("%d unchanged, %d updated, %d removed\n"
+                                 % (unchanged, updated, removed))
+        if args.tags or args.errors:
+            for path in index.query(tags=args.tags, errors=args.errors):
+                print(path)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.stderr.write("INTERRUPTED\n")
+        sys.exit(130)  # SIGINT
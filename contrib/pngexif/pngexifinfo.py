@@ -23,6 +23,10 @@ from exifinfo import print_raw_exif_info
 _PNG_SIGNATURE = b"\x89PNG\x0d\x0a\x1a\x0a"
 _PNG_CHUNK_SIZE_MAX = 0x7fffffff
 _READ_DATA_SIZE_MAX = 0x3ffff
+_DRAIN_BUFFER_SIZE = 0x10000
+_EXIF_SIZE_MAX = 0x1000000
+_INFLATE_STEP_SIZE = 0x10000
+_TIFF_HEADERS = (b"MM\x00\x2a", b"II\x2a\x00")
 
 
 def print_error(msg):
@@ -51,33 +55,95 @@ def _check_png_crc(data, checksum, chunk_sig):
     raise RuntimeError("bad PNG checksum in '%s'" % chunk_sig)
 
 
+def _drain_png_chunk(instream, buffer, chunk_len, checksum, chunk_sig):
+    """Read and discard the chunk data through a reusable buffer;
+       return the updated CRC32 checksum, or None if checksum is None.
+    """
+    view = memoryview(buffer)
+    remaining = chunk_len
+    while remaining > 0:
+        size = instream.readinto(view[:min(remaining, len(buffer))])
+        _check_png(size, chunk_sig=chunk_sig)
+        if checksum is not None:
+            checksum = zlib.crc32(view[:size], checksum)
+        remaining -= size
+    return checksum
+
+
+def _stream_is_seekable(instream):
+    """Check whether the given stream supports seeking."""
+    try:
+        return instream.seekable()
+    except (AttributeError, ValueError):
+        return False
+
+
+def _inflate_png_exif(data, offset, size_max, data_len=None):
+    """Inflate the compressed EXIF data found at the given offset,
+       in bounded steps, without exceeding the given output size.
+    """
+    decompressor = zlib.decompressobj()
+    pending = memoryview(data)[offset:]
+    result = bytearray()
+    while not decompressor.eof:
+        output = decompressor.decompress(pending, _INFLATE_STEP_SIZE)
+        if not output and not pending:
+            raise RuntimeError("truncated compressed data in PNG EXIF")
+        pending = decompressor.unconsumed_tail
+        if len(result) < 4 <= len(result) + len(output):
+            # Reject non-TIFF data before inflating any further.
+            if bytes((result + output)[0:4]) not in _TIFF_HEADERS:
+                raise RuntimeError("invalid TIFF/EXIF header in PNG EXIF")
+        result += output
+        if data_len is not None and len(result) > data_len:
+            raise RuntimeError(
+                "incorrect uncompressed-length field in PNG EXIF")
+        if len(result) > size_max:
+            raise RuntimeError("decompressed PNG EXIF exceeds %d bytes"
+                               % size_max)
+    return result
+
+
 def _extract_png_exif(data, **kwargs):
     """Extract the EXIF header and data from a PNG chunk."""
     debug = kwargs.get("debug", False)
+    size_max = kwargs.get("exif_size_max", _EXIF_SIZE_MAX)
     if unpack_uint8(data, 0) == 0:
         if debug:
             print_debug("found compressed EXIF, compression method 0")
         if (unpack_uint8(data, 1) & 0x0f) == 0x08:
-            data = zlib.decompress(data[1:])
+            data = _inflate_png_exif(data, 1, size_max)
         elif unpack_uint8(data, 1) == 0 \
                 and (unpack_uint8(data, 5) & 0x0f) == 0x08:
             if debug:
                 print_debug("found uncompressed-length EXIF field")
             data_len = unpack_uint32be(data, 1)
-            data = zlib.decompress(data[5:])
+            if data_len > size_max:
+                raise RuntimeError("uncompressed-length field in PNG EXIF "
+                                   "exceeds %d bytes" % size_max)
+            data = _inflate_png_exif(data, 5, size_max, data_len)
             if data_len != len(data):
                 raise RuntimeError(
                     "incorrect uncompressed-length field in PNG EXIF")
         else:
             raise RuntimeError("invalid compression method in PNG EXIF")
-    if data.startswith(b"MM\x00\x2a") or data.startswith(b"II\x2a\x00"):
+    if bytes(data[0:4]) in _TIFF_HEADERS:
         return data
     raise RuntimeError("invalid TIFF/EXIF header in PNG EXIF")
 
 
-def print_png_exif_info(instream, **kwargs):
-    """Print the EXIF information found in the given PNG datastream."""
+def iter_png_exif(instream, **kwargs):
+    """Yield the EXIF data found in the given PNG datastream."""
     debug = kwargs.get("debug", False)
+    streaming = kwargs.get("streaming", False) \
+        or not _stream_is_seekable(instream)
+    # In fast mode, IDAT chunks are skipped using their headers only,
+    # and the remaining chunks are CRC-checked only upon request.
+    fast = kwargs.get("fast", False)
+    check_crc = kwargs.get("check_crc", not fast)
+    first_exif = kwargs.get("first_exif", False)
+    before_idat = kwargs.get("before_idat", False)
+    drain_buffer = None
     has_exif = False
     while True:
         chunk_hdr = instream.read(8)
@@ -88,15 +154,41 @@ def print_png_exif_info(instream, **kwargs):
         _check_png(chunk_len < _PNG_CHUNK_SIZE_MAX, chunk_sig=chunk_sig)
         if debug:
             print_debug("processing chunk: %s" % chunk_sig)
-        if chunk_len <= _READ_DATA_SIZE_MAX:
+        if chunk_sig == "IDAT":
+            if before_idat:
+                # The spec places eXIf before IDAT; nothing else to find.
+                break
+            skip_chunk = fast
+        else:
+            skip_chunk = False
+        if skip_chunk and not streaming:
+            instream.seek(chunk_len + 4, io.SEEK_CUR)
+            continue
+        if not skip_chunk and chunk_len <= _READ_DATA_SIZE_MAX:
             # The chunk size does not exceed an arbitrary, reasonable limit.
             chunk_data = instream.read(chunk_len)
             chunk_crc = instream.read(4)
             _check_png(len(chunk_data) == chunk_len and len(chunk_crc) == 4,
                        chunk_sig=chunk_sig)
-            checksum = zlib.crc32(chunk_hdr[4:8])
-            checksum = zlib.crc32(chunk_data, checksum)
-            _check_png_crc(chunk_crc, checksum, chunk_sig=chunk_sig)
+            if check_crc:
+                checksum = zlib.crc32(chunk_hdr[4:8])
+                checksum = zlib.crc32(chunk_data, checksum)
+                _check_png_crc(chunk_crc, checksum, chunk_sig=chunk_sig)
+        elif streaming:
+            # The chunk is too big or unneeded, and the stream may not be
+            # seekable. Skip it by draining it through a fixed-size buffer.
+            if drain_buffer is None:
+                drain_buffer = bytearray(_DRAIN_BUFFER_SIZE)
+            checksum = None
+            if check_crc and not skip_chunk:
+                checksum = zlib.crc32(chunk_hdr[4:8])
+            checksum = _drain_png_chunk(instream, drain_buffer, chunk_len,
+                                        checksum, chunk_sig=chunk_sig)
+            chunk_crc = instream.read(4)
+            _check_png(len(chunk_crc) == 4, chunk_sig=chunk_sig)
+            if checksum is not None:
+                _check_png_crc(chunk_crc, checksum, chunk_sig=chunk_sig)
+            continue
         else:
             # The chunk is too big. Skip it.
             instream.seek(chunk_len + 4, io.SEEK_CUR)
@@ -106,25 +198,77 @@ def print_png_exif_info(instream, **kwargs):
             break
         if chunk_sig.lower() in ["exif", "zxif"] and chunk_len > 8:
             has_exif = True
-            exif_data = _extract_png_exif(chunk_data, **kwargs)
-            print_raw_exif_info(exif_data, **kwargs)
+            yield _extract_png_exif(chunk_data, **kwargs)
+            if first_exif:
+                break
     if not has_exif:
         raise RuntimeError("no EXIF data in PNG stream")
 
 
+def iter_png_chunk_headers(instream):
+    """Yield (offset, chunk_len, chunk_sig) for each chunk in the given
+       seekable PNG datastream, reading the chunk headers only.
+       The stream must be positioned after the PNG signature.
+    """
+    offset = instream.tell()
+    instream.seek(0, io.SEEK_END)
+    stream_size = instream.tell()
+    while True:
+        instream.seek(offset)
+        chunk_hdr = instream.read(8)
+        _check_png(len(chunk_hdr) == 8)
+        chunk_len = unpack_uint32be(chunk_hdr, offset=0)
+        chunk_sig = chunk_hdr[4:8].decode("latin_1", errors="ignore")
+        _check_png(re.search(r"^[A-Za-z]{4}$", chunk_sig), chunk_sig=chunk_sig)
+        _check_png(chunk_len < _PNG_CHUNK_SIZE_MAX, chunk_sig=chunk_sig)
+        _check_png(offset + 12 + chunk_len <= stream_size, chunk_sig=chunk_sig)
+        yield (offset, chunk_len, chunk_sig)
+        if chunk_sig == "IEND":
+            break
+        offset += 12 + chunk_len
+
+
+def print_png_exif_info(instream, **kwargs):
+    """Print the EXIF information found in the given PNG datastream."""
+    for exif_data in iter_png_exif(instream, **kwargs):
+        print_raw_exif_info(exif_data, **kwargs)
+
+
+def iter_stream_exif(instream, **kwargs):
+    """Yield the EXIF data found in the given binary stream,
+       which holds either a PNG datastream or a raw EXIF blob.
+       The stream does not need to be seekable.
+    """
+    header = instream.read(4)
+    if header == _PNG_SIGNATURE[0:4]:
+        if instream.read(4) != _PNG_SIGNATURE[4:8]:
+            raise RuntimeError("corrupted PNG file")
+        for exif_data in iter_png_exif(instream=instream, **kwargs):
+            yield exif_data
+    elif header in _TIFF_HEADERS:
+        yield header + instream.read(_READ_DATA_SIZE_MAX)
+    else:
+        raise RuntimeError("not a PNG file")
+
+
+def print_stream_exif_info(instream, **kwargs):
+    """Print the EXIF information found in the given binary stream.
+       The stream does not need to be seekable.
+    """
+    for exif_data in iter_stream_exif(instream, **kwargs):
+        print_raw_exif_info(exif_data, **kwargs)
+
+
 def print_exif_info(file, **kwargs):
-    """Print the EXIF information found in the given file."""
+    """Print the EXIF information found in the given file.
+       The file "-" denotes the standard input.
+    """
+    if file == "-":
+        stream = getattr(sys.stdin, "buffer", sys.stdin)
+        print_stream_exif_info(stream, **kwargs)
+        return
     with open(file, "rb") as stream:
-        header = stream.read(4)
-        if header == _PNG_SIGNATURE[0:4]:
-            if stream.read(4) != _PNG_SIGNATURE[4:8]:
-                raise RuntimeError("corrupted PNG file")
-            print_png_exif_info(instream=stream, **kwargs)
-        elif header == b"II\x2a\x00" or header == b"MM\x00\x2a":
-            data = header + stream.read(_READ_DATA_SIZE_MAX)
-            print_raw_exif_info(data, **kwargs)
-        else:
-            raise RuntimeError("not a PNG file")
+        print_stream_exif_info(stream, **kwargs)
 
 
 def main():
@@ -136,7 +280,8 @@ def main():
     parser.add_argument("files",
                         metavar="file",
                         nargs="*",
-                        help="a PNG file or a raw EXIF blob")
+                        help="a PNG file or a raw EXIF blob "
+                             "(use - for the standard input)")
     parser.add_argument("-x",
                         "--hex",
                         dest="hex",
@@ -147,6 +292,37 @@ def main():
                         dest="verbose",
                         action="store_true",
                         help="run in verbose mode")
+    parser.add_argument("-s",
+                        "--stream",
+                        dest="streaming",
+                        action="store_true",
+                        help="never seek; skip large chunks by reading them")
+    parser.add_argument("-f",
+                        "--fast",
+                        dest="fast",
+                        action="store_true",
+                        help="skip IDAT chunks without reading them, "
+                             "and do not check CRCs")
+    parser.add_argument("--check-crc",
+                        dest="check_crc",
+                        action="store_true",
+                        help="check the CRCs of the chunks read in fast mode")
+    parser.add_argument("--first",
+                        dest="first_exif",
+                        action="store_true",
+                        help="stop after the first EXIF chunk")
+    parser.add_argument("--before-idat",
+                        dest="before_idat",
+                        action="store_true",
+                        help="stop at the first IDAT chunk, accepting only "
+                             "spec-conforming EXIF placement")
+    parser.add_argument("--max-exif-size",
+                        dest="exif_size_max",
+                        metavar="BYTES",
+                        type=int,
+                        default=_EXIF_SIZE_MAX,
+                        help="reject compressed EXIF data that inflates to "
+                             "more than this size (default: %(default)d)")
     parser.add_argument("--debug",
                         dest="debug",
                         action="store_true",
@@ -159,6 +335,12 @@ def main():
         try:
             print_exif_info(file,
                             hex=args.hex,
+                            streaming=args.streaming,
+                            fast=args.fast,
+                            check_crc=args.check_crc or not args.fast,
+                            first_exif=args.first_exif,
+                            before_idat=args.before_idat,
+                            exif_size_max=args.exif_size_max,
                             debug=args.debug,
                             verbose=args.verbose)
         except (IOError, OSError) as err:
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+"""
+Serve the PNG EXIF information to pngexifclient, or to any other program
+speaking the same length-prefixed protocol.
+
+Every message starts with two 32-bit big-endian lengths, followed by a
+JSON header and a raw payload of the respective lengths.  A request
+header holds an "id" and either a "path", or an empty "path" and the PNG
+(or raw EXIF) data in the payload.  The optional "fast", "first_exif" and
+"before_idat" fields have the same meaning as in pngexifinfo.  A response
+header echoes the "id" and holds either "ok": true and a list of "exif"
+results, or "ok": false and an "error".  Responses on a connection may
+arrive out of order.
+
+Use, modification and distribution are subject to the MIT License.
+Please see the accompanying file LICENSE_MIT.txt
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import errno
+import io
+import multiprocessing
+import os
+import stat
+import struct
+import sys
+import threading
+import zlib
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from exifinfo import raw_exif_info
+from pngexifclient import default_socket_path, read_message, write_message
+from pngexifinfo import iter_stream_exif
+
+_REQUEST_OPTIONS = ("fast", "check_crc", "first_exif", "before_idat")
+
+
+def handle_request(header, payload):
+    """Process one request; return the response header."""
+    if not isinstance(header, dict):
+        return {"id": None, "ok": False, "status": 65,  # os.EX_DATAERR
+                "error": "request header is not a JSON object"}
+    response = {"id": header.get("id")}
+    try:
+        options = dict((key, header[key])
+                       for key in _REQUEST_OPTIONS if key in header)
+        if options.get("fast") and "check_crc" not in options:
+            options["check_crc"] = False
+        path = header.get("path")
+        if path and not isinstance(path, type(u"")):
+            # An integer would be opened as a file descriptor.
+            raise TypeError("path is not a string")
+        if path:
+            with open(path, "rb") as stream:
+                exif = [raw_exif_info(exif_data) for exif_data
+                        in iter_stream_exif(stream, **options)]
+        else:
+            stream = io.BytesIO(payload)
+            exif = [raw_exif_info(exif_data) for exif_data
+                    in iter_stream_exif(stream, **options)]
+    except (IOError, OSError) as err:
+        response.update(ok=False, error=str(err), status=66)
+    except (RuntimeError, struct.error, zlib.error) as err:
+        response.update(ok=False, error=str(err), status=69)
+    except Exception as err:  # pylint: disable=broad-except
+        # A malformed request must not leave the client waiting.
+        response.update(ok=False, error=_describe_error(err), status=70)
+    else:
+        response.update(ok=True, exif=exif)
+    return response
+
+
+def _describe_error(err):
+    """Describe an unexpected exception for an error response."""
+    return "%s: %s" % (type(err).__name__, err)
+
+
+def _handle_request_message(message):
+    """Unpack a request message for the worker pool."""
+    return handle_request(*message)
+
+
+class _ResponseWriter:
+    """Serialize the responses written by the worker pool callbacks."""
+
+    def __init__(self, outstream):
+        self._outstream = outstream
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._idle = threading.Condition(self._lock)
+
+    def submit(self, pool, message):
+        """Process the request message, inline or in the worker pool."""
+        if pool is None:
+            self._write(handle_request(*message))
+            return
+        with self._lock:
+            self._pending += 1
+        header = message[0]
+        request_id = header.get("id") if isinstance(header, dict) else None
+
+        def write_failure(err):
+            self._write_pending({"id": request_id, "ok": False,
+                                 "error": _describe_error(err),
+                                 "status": 70})  # os.EX_SOFTWARE
+
+        pool.apply_async(_handle_request_message, (message,),
+                         callback=self._write_pending,
+                         error_callback=write_failure)
+
+    def _write(self, response):
+        with self._lock:
+            write_message(self._outstream, response)
+
+    def _write_pending(self, response):
+        with self._lock:
+            try:
+                write_message(self._outstream, response)
+            except (IOError, OSError):
+                # The client went away; drop its remaining responses.
+                pass
+            self._pending -= 1
+            self._idle.notify_all()
+
+    def wait(self):
+        """Wait until all the submitted requests have been answered."""
+        with self._lock:
+            while self._pending > 0:
+                self._idle.wait()
+
+
+def serve_stream(instream, outstream, pool=None):
+    """Serve the requests read from instream until the end of stream."""
+    writer = _ResponseWriter(outstream)
+    try:
+        while True:
+            message = read_message(instream)
+            if message is None:
+                break
+            writer.submit(pool, message)
+    finally:
+        writer.wait()
+
+
+class _ExifRequestHandler(socketserver.StreamRequestHandler):
+    """Serve one client connection."""
+
+    def handle(self):
+        try:
+            serve_stream(self.rfile, self.wfile, pool=self.server.pool)
+        except (IOError, OSError, RuntimeError, ValueError) as err:
+            sys.stderr.write("%s: error: %s\n" % (sys.argv[0], err))
+
+
+class ExifServer(socketserver.ThreadingMixIn,
+                 socketserver.UnixStreamServer):
+    """Unix domain socket server for EXIF requests."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, pool=None):
+        """Listen at the given socket path, replacing any stale socket.
+           Refuse to replace anything else that exists at that path.
+        """
+        if os.path.lexists(socket_path):
+            if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+                raise OSError(errno.EEXIST,
+                              "file exists and is not a socket",
+                              socket_path)
+            os.remove(socket_path)
+        socketserver.UnixStreamServer.__init__(self, socket_path,
+                                               _ExifRequestHandler)
+        self.pool = pool
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def main():
+    """The main function."""
+    parser = argparse.ArgumentParser(
+        prog="pngexifserver",
+        usage="%(prog)s [options]",
+        description="Serve the PNG EXIF information to pngexifclient.")
+    parser.add_argument("-S",
+                        "--socket",
+                        dest="socket_path",
+                        metavar="PATH",
+                        default=default_socket_path(),
+                        help="listen at this Unix domain socket "
+                             "(default: %(default)s)")
+    parser.add_argument("--stdio",
+                        dest="stdio",
+                        action="store_true",
+                        help="serve a single client on stdin/stdout")
+    parser.add_argument("-j",
+                        "--workers",
+                        dest="workers",
+                        metavar="N",
+                        type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="number of worker processes, or 0 to process "
+                             "the requests in the server itself "
+                             "(default: %(default)d)")
+    args = parser.parse_args()
+    pool = None
+    if args.workers > 0:
+        pool = multiprocessing.Pool(args.workers)
+    try:
+        if args.stdio:
+            instream = getattr(sys.stdin, "buffer", sys.stdin)
+            outstream = getattr(sys.stdout, "buffer", sys.stdout)
+            serve_stream(instream, outstream, pool=pool)
+        else:
+            try:
+                server = ExifServer(args.socket_path, pool=pool)
+            except (IOError, OSError) as err:
+                sys.stderr.write("%s: error: %s\n" % (sys.argv[0], err))
+                return 71  # os.EX_OSERR
+            try:
+                server.serve_forever()
+            finally:
+                server.server_close()
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.stderr.write("INTERRUPTED\n")
+        sys.exit(130)  # SIGINT
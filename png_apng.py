@@ -0,0 +1,189 @@
+import argparse
+import os
+import random
+import sys
+import time
+from array import array
+
+# 共享的生成工具位于 contrib/oss-fuzz/png_generator
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'contrib', 'oss-fuzz', 'png_generator'))
+from png_seed_index import SeedIndex, seed_record
+from png_generator_utils import (
+    APNG_BLEND_OPS,
+    APNG_DISPOSE_OPS,
+    CHANNELS,
+    VALID_BIT_DEPTHS,
+    ApngFrame,
+    SequenceNumbers,
+    iter_apng_chunks,
+    parse_compression_profile,
+    parse_range,
+    run_seed_jobs
+)
+
+apngPNG_save_path = 'apngPNG_seeds'
+
+def _invalid_region(rng, width, height):
+    """故意越界或为空的帧区域。"""
+    kind = rng.choice(['zero_width', 'zero_height', 'offset_outside', 'overflow', 'huge'])
+    w, h = rng.randint(1, width), rng.randint(1, height)
+    x, y = rng.randint(0, width - w), rng.randint(0, height - h)
+    if kind == 'zero_width':
+        w = 0
+    elif kind == 'zero_height':
+        h = 0
+    elif kind == 'offset_outside':
+        x, y = width + rng.randint(0, 16), rng.randint(0, height)
+    elif kind == 'overflow':
+        w, h = width - x + rng.randint(1, 16), height - y + rng.randint(1, 16)
+    else:
+        # 偏移加尺寸超过 32 位
+        x, w = 0xffffffff - rng.randint(0, 8), rng.randint(1, 4)
+        h = min(h, 4)
+    return w, h, x, y
+
+def iter_frames(rng, count, width, height, regions='mixed', dispose='random', blend='random', full_first=True):
+    """
+    逐帧产生 ApngFrame。
+    regions: full (都是整幅)、random (画布内的随机区域)、invalid (越界/为空)、mixed (random 中夹杂约 10% invalid)
+    full_first: 第一帧是默认图像时按规范必须覆盖整个画布
+    """
+    for index in range(count):
+        mode = regions
+        if mode == 'mixed':
+            mode = 'invalid' if rng.random() < 0.1 else 'random'
+        if mode == 'full' or (index == 0 and full_first and regions != 'invalid'):
+            w, h, x, y = width, height, 0, 0
+        elif mode == 'random':
+            w, h = rng.randint(1, width), rng.randint(1, height)
+            x, y = rng.randint(0, width - w), rng.randint(0, height - h)
+        else:
+            w, h, x, y = _invalid_region(rng, width, height)
+        dispose_op = APNG_DISPOSE_OPS[rng.choice(list(APNG_DISPOSE_OPS)) if dispose == 'random' else dispose]
+        blend_op = APNG_BLEND_OPS[rng.choice(list(APNG_BLEND_OPS)) if blend == 'random' else blend]
+        yield ApngFrame(w, h, x, y, rng.randint(0, 100), rng.choice([0, 10, 100, 1000]), dispose_op, blend_op)
+
+def random_samples(rng, count, bit_depth, palette_entries=0):
+    """count 个随机样本值 (调色板图像为小于 palette_entries 的索引)。"""
+    if bit_depth == 16:
+        return array('H', rng.getrandbits(16 * count).to_bytes(2 * count, 'little')) if count else array('H')
+    values = rng.getrandbits(8 * count).to_bytes(count, 'little') if count else b''
+    if palette_entries:
+        return array('H', (value % palette_entries for value in values))
+    mask = (1 << bit_depth) - 1
+    return array('H', (value & mask for value in values))
+
+def generate_apng_seed(job):
+    """
+    生成一个 APNG 种子并直接写入文件，内存占用只与单帧大小有关。
+    job = (base_seed, seed_number, 输出目录, 选项 dict)。返回 manifest 记录。
+    """
+    base_seed, seed_number, output_dir, options = job
+    rng = random.Random(f'{base_seed}:{seed_number}')
+    color_type = rng.choice(options['color_types'])
+    bit_depth = rng.choice(VALID_BIT_DEPTHS[color_type])
+    width, height = (rng.randint(*options['width']), rng.randint(*options['height']))
+    num_frames = rng.randint(*options['frames'])
+    separate_default = {'always': True, 'never': False}.get(options['default_image'], rng.random() < 0.5)
+    palette = None
+    palette_entries = 0
+    if color_type == 3:
+        palette_entries = rng.randint(1, min(256, 1 << bit_depth))
+        palette = rng.getrandbits(24 * palette_entries).to_bytes(3 * palette_entries, 'little')
+    channels = CHANNELS[color_type]
+
+    def frame_samples(index, frame):
+        return random_samples(rng, frame.width * frame.height * channels, bit_depth, palette_entries)
+
+    default_image = None
+    if separate_default:
+        default_image = random_samples(rng, width * height * channels, bit_depth, palette_entries)
+    sequence = SequenceNumbers(rng, options['sequence_faults'])
+    frames = iter_frames(rng, num_frames, width, height, options['regions'], options['dispose'],
+                         options['blend'], full_first=not separate_default)
+    name = f'apngPNG_{seed_number:06d}_ct{color_type}-bd{bit_depth}-{width}x{height}-f{num_frames}.png'
+    path = os.path.join(output_dir, name)
+    size = 0
+    with open(path, 'wb') as f:
+        for chunk in iter_apng_chunks(width, height, color_type, bit_depth, frames, num_frames, frame_samples,
+                                      options['compression_profile'], sequence, options['num_plays'],
+                                      default_image, palette, options['max_chunk_size']):
+            f.write(chunk)
+            size += len(chunk)
+    return {
+        'file': name,
+        'size': size,
+        'frames': num_frames,
+        'separate_default_image': separate_default,
+        'sequence_faults': sequence.faults,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate animated PNG (acTL/fcTL/fdAT) seeds, one frame at a time.')
+    parser.add_argument('-n', '--count', type=int, default=10, help='number of seeds to generate')
+    parser.add_argument('-o', '--output', default=apngPNG_save_path, help='directory to save seeds')
+    parser.add_argument('--seed', type=int, default=None, help='base random seed')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--frames', default='1-64', help="frame count, or range 'MIN-MAX' (default: 1-64)")
+    parser.add_argument('--width', default='1-64', help="canvas width, or range 'MIN-MAX' (default: 1-64)")
+    parser.add_argument('--height', default='1-64', help="canvas height, or range 'MIN-MAX' (default: 1-64)")
+    parser.add_argument('--color-types', default='0,2,3,4,6', help='comma-separated color types')
+    parser.add_argument('--regions', choices=['full', 'random', 'invalid', 'mixed'], default='mixed',
+                        help='frame sizes and offsets (default: mixed, random with some invalid regions)')
+    parser.add_argument('--dispose', choices=['random'] + list(APNG_DISPOSE_OPS), default='random',
+                        help='dispose_op of the frames')
+    parser.add_argument('--blend', choices=['random'] + list(APNG_BLEND_OPS), default='random',
+                        help='blend_op of the frames')
+    parser.add_argument('--sequence-faults', type=float, default=0.0,
+                        help='probability that a sequence number is deliberately wrong')
+    parser.add_argument('--default-image', choices=['random', 'always', 'never'], default='random',
+                        help='whether the IDAT image is a separate, non-animated default image')
+    parser.add_argument('--num-plays', type=int, default=0, help='acTL num_plays (0 is infinite)')
+    parser.add_argument('--max-chunk-size', type=int, default=0x10000,
+                        help='split the compressed data of each frame into chunks of this size')
+    parser.add_argument('--compression-profile', default='default', help="zlib profile such as 'l9-rle-w12'")
+    parser.add_argument('--index', action='store_true', help='also write OUTPUT/index.sqlite')
+    args = parser.parse_args()
+
+    try:
+        compression_profile = parse_compression_profile(args.compression_profile)
+    except ValueError as e:
+        parser.error(str(e))
+    options = {
+        'frames': parse_range(args.frames),
+        'width': parse_range(args.width),
+        'height': parse_range(args.height),
+        'color_types': [int(value) for value in args.color_types.split(',')],
+        'regions': args.regions,
+        'dispose': args.dispose,
+        'blend': args.blend,
+        'sequence_faults': args.sequence_faults,
+        'default_image': args.default_image,
+        'num_plays': args.num_plays,
+        'max_chunk_size': args.max_chunk_size,
+        'compression_profile': compression_profile,
+    }
+    base_seed = args.seed if args.seed is not None else random.randrange(1 << 32)
+    os.makedirs(args.output, exist_ok=True)
+    print(f"Base seed: {base_seed}")
+
+    jobs = [(base_seed, number, args.output, options) for number in range(args.count)]
+    index = SeedIndex(os.path.join(args.output, 'index.sqlite')) if args.index else None
+    start = time.perf_counter()
+    total_frames = total_size = 0
+    index_seed = None
+    if index is not None:
+        def index_seed(name, data):
+            index.add(seed_record(name, data, compression_profile=compression_profile.name))
+    for record in run_seed_jobs(generate_apng_seed, jobs, args.output, args.jobs, index_seed):
+        total_frames += record['frames']
+        total_size += record['size']
+    if index is not None:
+        index.close()
+    elapsed = time.perf_counter() - start
+    print(f"Generated {args.count} seeds, {total_frames} frames, {total_size / 1e6:.1f} MB "
+          f"in {elapsed:.1f}s in '{args.output}'")
+
+if __name__ == "__main__":
+    main()
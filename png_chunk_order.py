@@ -0,0 +1,320 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import time
+import zlib
+
+from png_generator1 import PNG, ancillary_chunk_names
+from png_seed_index import SeedIndex, seed_record
+
+_PNGRUTIL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pngrutil.c')
+
+# png_struct::mode 中与数据块位置检查有关的位 (见 pngpriv.h)
+HAVE_IHDR = 0x01
+HAVE_PLTE = 0x02
+HAVE_IDAT = 0x04
+AFTER_IDAT = 0x08
+_MODE_SYMBOLS = {
+    '0': 0,
+    'hIHDR': HAVE_IHDR,
+    'hPLTE': HAVE_PLTE,
+    'hIDAT': HAVE_IDAT,
+    'hCOL': HAVE_PLTE | HAVE_IDAT,
+    'aIDAT': AFTER_IDAT,
+}
+
+# 数据块可以放的位置 (槽位)，按在文件中的先后顺序排列
+SLOTS = ('before_plte', 'after_plte', 'between_idat', 'after_idat')
+
+# 彼此的先后顺序会影响 libpng 处理结果的数据块 (色彩空间、调色板相关)；
+# 其他数据块在同一位置内的先后顺序视为等价
+ORDER_SENSITIVE = {'gAMA', 'cHRM', 'sRGB', 'iCCP', 'cICP', 'mDCV', 'cLLI', 'sBIT',
+                   'PLTE', 'tRNS', 'bKGD', 'hIST'}
+
+# PLTE 自身的几种放法
+PLTE_VARIANTS = ('normal', 'duplicate', 'after_idat', 'absent')
+
+def load_chunk_rules(path=_PNGRUTIL):
+    """
+    从 pngrutil.c 的 read_chunks 表读取每种数据块的位置规则：
+    返回 {名称: (pos_before, pos_after, multiple)}，与当前源码保持一致。
+    """
+    with open(path) as f:
+        source = f.read()
+    rules = {}
+    pattern = r'#\s*define\s+CD(\w{4})\s+[^,]+,\s*[^,]+,\s*(\w+),\s*(\w+),\s*([01])'
+    for name, before, after, multiple in re.findall(pattern, source):
+        rules[name] = (_MODE_SYMBOLS[before], _MODE_SYMBOLS[after], multiple == '1')
+    if 'IHDR' not in rules or 'IDAT' not in rules:
+        raise ValueError(f"no chunk position rules found in {path}")
+    return rules
+
+def simulate(order, color_type, rules, idat_count=1):
+    """
+    按 png_read_info/png_handle_chunk 的位置与重复检查模拟读取一个数据块序列。
+    返回 [(名称, 结果, mode)]；结果为 ok/out_of_place/duplicate/too_many_idats/ignored/fatal，
+    遇到致命错误 (关键数据块出错) 或 IEND 时停止。
+    zlib 流分布在前 idat_count 个 IDAT 中；读完前遇到其他数据块时
+    png_read_IDAT_data 报 "Not enough image data"，同样是致命错误。
+    """
+    mode = 0
+    seen = set()
+    trace = []
+    idat_seen = 0
+    for name in order:
+        critical = name[0].isupper()
+        if name == 'IDAT':
+            if mode & HAVE_IHDR == 0 or (color_type == 3 and mode & HAVE_PLTE == 0):
+                trace.append((name, 'fatal', mode))
+                break
+            outcome = 'too_many_idats' if mode & AFTER_IDAT else 'ok'
+            mode |= HAVE_IDAT
+            idat_seen += 1
+            trace.append((name, outcome, mode))
+            continue
+        if mode & HAVE_IDAT and mode & AFTER_IDAT == 0 and idat_seen < idat_count:
+            trace.append((name, 'fatal', mode))
+            break
+        if mode & HAVE_IDAT:
+            mode |= AFTER_IDAT
+        if name != 'IHDR' and mode & HAVE_IHDR == 0:
+            trace.append((name, 'fatal', mode))
+            break
+        if name == 'PLTE':
+            # png_handle_PLTE 自己做检查；只有调色板图像里的错误是致命的
+            if mode & HAVE_PLTE:
+                outcome = 'duplicate'
+            elif mode & HAVE_IDAT:
+                outcome = 'out_of_place'
+            elif color_type in (0, 4):
+                outcome = 'ignored'
+            else:
+                outcome = 'ok'
+                mode |= HAVE_PLTE
+            if outcome != 'ok' and color_type == 3:
+                outcome = 'fatal'
+        elif name not in rules:
+            outcome = 'unknown'
+        else:
+            before, after, multiple = rules[name]
+            if mode & before or mode & after != after:
+                outcome = 'out_of_place'
+            elif not multiple and name in seen:
+                outcome = 'duplicate'
+            else:
+                outcome = 'ok'
+                seen.add(name)
+            if name == 'IHDR' and outcome == 'ok':
+                mode |= HAVE_IHDR
+            if outcome != 'ok' and critical:
+                outcome = 'fatal'
+        trace.append((name, outcome, mode))
+        if outcome == 'fatal' or name == 'IEND':
+            break
+    return trace
+
+def equivalence_key(trace):
+    """
+    两个顺序在 libpng 的规则下等价，当且仅当：
+    每个数据块的处理结果相同，被处理的数据块看到的位置 (mode) 相同，
+    且顺序敏感的数据块之间的相对顺序相同。被跳过的数据块与位置无关。
+    """
+    sensitive = []
+    others = []
+    for name, outcome, mode in trace:
+        item = (name, outcome, mode & (HAVE_PLTE | HAVE_IDAT | AFTER_IDAT)) if outcome == 'ok' else (name, outcome)
+        (sensitive if name in ORDER_SENSITIVE else others).append(item)
+    return tuple(sensitive), tuple(sorted(others))
+
+class ChunkCache:
+    """
+    每种 (颜色类型, 位深) 只生成一次各个数据块的字节；
+    IDAT 预先拆成若干段，之后每个顺序只需要拼接。
+    """
+    def __init__(self, color_type, bit_depth, idat_splits=2, seed=0):
+        png = PNG.empty(color_type, bit_depth, rng=random.Random(f'{seed}:{color_type}:{bit_depth}'))
+        self.chunks = {}
+        for name in ['IHDR', 'PLTE', 'IEND'] + list(ancillary_chunk_names):
+            self.chunks[name] = png.chunk_bytes(name, 0)
+        # 有些数据块对这种颜色类型不会生成 (例如灰度图像的 PLTE、hIST)，
+        # 但 libpng 在检查内容之前先检查位置，所以仍然放一个最小的数据块
+        if not self.chunks['PLTE']:
+            self.chunks['PLTE'] = png._create_chunk(b'PLTE', bytes(v for i in range(16) for v in (i * 17,) * 3))
+        for name, chunk in self.chunks.items():
+            if not chunk:
+                self.chunks[name] = png._create_chunk(name.encode('latin-1'), b'')
+        idat = png.chunk_bytes('IDAT', 0)
+        payload = idat[8:-4]
+        step = max(1, -(-len(payload) // idat_splits))
+        self.idat_pieces = [png._create_chunk(b'IDAT', payload[i:i + step])
+                            for i in range(0, len(payload), step)]
+        # libpng 需要读到 zlib 流结束为止的 IDAT；之后的 IDAT 段可以缺失
+        self.idat_needed = len(self.idat_pieces)
+        inflater = zlib.decompressobj()
+        for count, piece in enumerate(self.idat_pieces, 1):
+            try:
+                inflater.decompress(piece[8:-4])
+            except zlib.error:
+                break
+            if inflater.eof:
+                self.idat_needed = count
+                break
+
+    def assemble(self, order):
+        """按顺序拼接数据块；第 k 个 IDAT 使用第 k 段。"""
+        out = [b'\x89PNG\r\n\x1a\n']
+        idat_index = 0
+        for name in order:
+            if name == 'IDAT':
+                out.append(self.idat_pieces[min(idat_index, len(self.idat_pieces) - 1)])
+                idat_index += 1
+            else:
+                out.append(self.chunks[name])
+        return b''.join(out)
+
+def placements(max_copies=2):
+    """一个数据块的所有放法：若干个 (可重复的) 槽位，按槽位排序。"""
+    result = []
+    for copies in range(1, max_copies + 1):
+        result += list(itertools.combinations_with_replacement(SLOTS, copies))
+    return result
+
+def canonical_slot(name):
+    return 'before_plte' if name in PNG.known_ancillary_chunks_before_plte else 'after_plte'
+
+def build_order(idat_count, plte_variant, layout):
+    """
+    由各槽位中的数据块列表构造完整的数据块顺序。
+    layout: {槽位: [数据块名称, ...]}
+    """
+    order = ['IHDR'] + layout.get('before_plte', [])
+    if plte_variant in ('normal', 'duplicate'):
+        order.append('PLTE')
+    order += layout.get('after_plte', [])
+    if plte_variant == 'duplicate':
+        order.append('PLTE')
+    order.append('IDAT')
+    if idat_count > 1:
+        order += layout.get('between_idat', [])
+        order += ['IDAT'] * (idat_count - 1)
+    else:
+        order += layout.get('between_idat', [])
+    order += layout.get('after_idat', [])
+    if plte_variant == 'after_idat':
+        order.append('PLTE')
+    order.append('IEND')
+    return order
+
+def enumerate_orders(chunks, base=(), arity=2, max_copies=2, idat_count=2):
+    """
+    系统地枚举数据块顺序：base 中的数据块放在规范位置，
+    每次让 chunks 中的 arity 个数据块取遍所有槽位与重复次数；
+    同一槽位内的可变数据块取遍所有排列。
+    产生 (PLTE 放法, 顺序) 。
+    """
+    options = placements(max_copies)
+    for plte_variant in PLTE_VARIANTS:
+        for varying in itertools.combinations(chunks, arity):
+            fixed = [name for name in base if name not in varying]
+            for choice in itertools.product(options, repeat=len(varying)):
+                slots = {slot: [] for slot in SLOTS}
+                for name in fixed:
+                    slots[canonical_slot(name)].append(name)
+                moving = {slot: [] for slot in SLOTS}
+                for name, slots_of_name in zip(varying, choice):
+                    for slot in slots_of_name:
+                        moving[slot].append(name)
+                per_slot = [list(itertools.permutations(moving[slot])) or [()] for slot in SLOTS]
+                for arrangement in itertools.product(*per_slot):
+                    layout = {slot: slots[slot] + list(names) for slot, names in zip(SLOTS, arrangement)}
+                    yield plte_variant, build_order(idat_count, plte_variant, layout)
+
+def explore(color_type, bit_depth, chunks, base=(), arity=2, max_copies=2, idat_splits=2, rules=None, seed=0,
+            stats=None):
+    """
+    枚举并剪枝；产生 (顺序, 模拟结果, 文件字节)，每个等价类只产生一个代表。
+    stats 字典中累计枚举数 (enumerated) 与剪枝后剩下的数目 (unique)。
+    """
+    rules = rules or load_chunk_rules()
+    cache = ChunkCache(color_type, bit_depth, idat_splits=idat_splits, seed=seed)
+    seen_keys = set()
+    stats = stats if stats is not None else {}
+    stats.setdefault('enumerated', 0)
+    stats.setdefault('unique', 0)
+    for plte_variant, order in enumerate_orders(chunks, base, arity, max_copies, len(cache.idat_pieces)):
+        stats['enumerated'] += 1
+        trace = simulate(order, color_type, rules, cache.idat_needed)
+        key = equivalence_key(trace)
+        if key in seen_keys:
+            continue
+        seen_keys.add(key)
+        stats['unique'] += 1
+        yield order, trace, cache.assemble(order)
+
+def _parse_names(text):
+    names = [name.strip() for name in text.split(',') if name.strip()]
+    unknown = [name for name in names if name not in ancillary_chunk_names]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown chunk(s): {', '.join(unknown)}")
+    return names
+
+def main():
+    parser = argparse.ArgumentParser(description='Enumerate PNG chunk orderings and multiplicities, '
+                                                 'pruned by the position rules in pngrutil.c.')
+    parser.add_argument('-o', '--output', default='orderPNG_seeds', help='directory to save seeds')
+    parser.add_argument('--chunks', type=_parse_names, default=list(ancillary_chunk_names),
+                        help='comma-separated ancillary chunks to move around (default: all)')
+    parser.add_argument('--base', type=_parse_names, default=[],
+                        help='comma-separated chunks always present at their usual position')
+    parser.add_argument('--arity', type=int, default=1,
+                        help='number of chunks moved at the same time (default: 1)')
+    parser.add_argument('--max-copies', type=int, default=2, help='maximum occurrences of a moved chunk')
+    parser.add_argument('--idat-splits', type=int, default=2, help='number of IDAT chunks')
+    parser.add_argument('--color-types', default='0,2,3,4,6', help='comma-separated color types')
+    parser.add_argument('--bit-depth', type=int, choices=[8, 16], default=8,
+                        help='bit depth (color type 3 always uses 8)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the chunk contents')
+    parser.add_argument('--index', action='store_true', help='also write OUTPUT/index.sqlite')
+    parser.add_argument('--dry-run', action='store_true', help='only count the orderings')
+    args = parser.parse_args()
+
+    rules = load_chunk_rules()
+    if not args.dry_run:
+        os.makedirs(args.output, exist_ok=True)
+    manifest = None if args.dry_run else open(os.path.join(args.output, 'manifest.jsonl'), 'w')
+    index = SeedIndex(os.path.join(args.output, 'index.sqlite')) if args.index and not args.dry_run else None
+    start = time.perf_counter()
+    total_enumerated = total_unique = 0
+    for color_type in [int(value) for value in args.color_types.split(',')]:
+        bit_depth = 8 if color_type == 3 else args.bit_depth
+        stats = {}
+        for order, trace, data in explore(color_type, bit_depth, args.chunks, args.base, args.arity,
+                                          args.max_copies, args.idat_splits, rules, args.seed, stats):
+            if manifest is None:
+                continue
+            name = f'order_ct{color_type}_{hashlib.sha1(data).hexdigest()[:16]}.png'
+            with open(os.path.join(args.output, name), 'wb') as f:
+                f.write(data)
+            manifest.write(json.dumps({
+                'file': name,
+                'order': order,
+                'outcomes': [outcome for _, outcome, _ in trace],
+            }) + '\n')
+            if index is not None:
+                index.add(seed_record(name, data))
+        total_enumerated += stats['enumerated']
+        total_unique += stats['unique']
+        print(f"color type {color_type}: {stats['enumerated']} orderings, {stats['unique']} after pruning")
+    if manifest is not None:
+        manifest.close()
+    if index is not None:
+        index.close()
+    print(f"Total: {total_enumerated} orderings, {total_unique} unique, "
+          f"{time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+# 共享的生成工具位于 contrib/oss-fuzz/png_generator
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'contrib', 'oss-fuzz', 'png_generator'))
+import numpy as np
+
+from libpng_ctypes import LibPNGShim, build_shim, find_libpng
+from png_generator1 import PNG
+from png_generator_utils import iter_files
+from png_reference_decoder import DecodeError, decode, raw_samples
+
+# 差分结果
+MATCH = 'match'                      # 两边都解码成功且像素一致
+PIXEL_MISMATCH = 'pixel_mismatch'    # 两边都解码成功但像素不同
+INTENDED_MISMATCH = 'intended_mismatch'  # 两边一致但与生成器想要的像素不同
+LIBPNG_ONLY = 'libpng_only'          # 只有 libpng 解码成功
+REFERENCE_ONLY = 'reference_only'    # 只有参考解码器解码成功
+BOTH_FAILED = 'both_failed'
+
+_shim = None
+
+def _init_worker(libpng_path):
+    global _shim
+    _shim = LibPNGShim(libpng_path)
+
+def _first_difference(a, b):
+    """第一个不同的样本：(y, x, channel, a 的值, b 的值)；形状不同时返回形状。"""
+    if a.shape != b.shape:
+        return {'shape': [list(a.shape), list(b.shape)]}
+    y, x, channel = (int(v) for v in np.argwhere(a != b)[0])
+    return {'y': y, 'x': x, 'channel': channel, 'values': [int(a[y, x, channel]), int(b[y, x, channel])]}
+
+def compare(data, intended=None):
+    """
+    用 libpng (经 shim) 和参考解码器分别解码 data 并比较样本值；
+    intended 为生成器想要的样本值 (形状相同的数组) 时一并比较。返回一条结果记录。
+    """
+    record = {}
+    result = _shim.decode_raw(data)
+    if result.pixels is not None:
+        record['libpng_end_error'] = result.message if result.end_error else None
+    else:
+        record['libpng_error'] = result.message
+    try:
+        reference = decode(data)
+    except DecodeError as e:
+        reference = None
+        record['reference_error'] = str(e)
+
+    if result.pixels is None:
+        record['outcome'] = BOTH_FAILED if reference is None else REFERENCE_ONLY
+        return record
+    if reference is None:
+        record['outcome'] = LIBPNG_ONLY
+        return record
+    libpng_samples = raw_samples(result)
+    if not np.array_equal(libpng_samples, reference.samples):
+        record['outcome'] = PIXEL_MISMATCH
+        record['difference'] = _first_difference(reference.samples, libpng_samples)
+    elif intended is not None and not np.array_equal(intended, libpng_samples):
+        record['outcome'] = INTENDED_MISMATCH
+        record['difference'] = _first_difference(intended, libpng_samples)
+    else:
+        record['outcome'] = MATCH
+    return record
+
+def compare_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    record = compare(data)
+    record['file'] = path
+    return record
+
+def synthetic_seed(base_seed, seed_number):
+    """
+    由 (base_seed, seed_number) 确定地生成一个保留了预期像素的种子：
+    随机的尺寸、颜色类型、位深、交错方式、逐行过滤类型与像素值。
+    返回 (PNG 数据, 预期样本数组, 描述)。
+    """
+    rng = random.Random(f'{base_seed}:{seed_number}')
+    color_type = rng.choice([0, 2, 3, 4, 6])
+    bit_depth = rng.choice({0: [1, 2, 4, 8, 16], 2: [8, 16], 3: [1, 2, 4, 8], 4: [8, 16], 6: [8, 16]}[color_type])
+    width = rng.randint(1, 67)
+    height = rng.randint(1, 67)
+    interlace = rng.choice([0, 1])
+    filter_types = tuple(rng.choice(range(5)) for _ in range(rng.randint(1, 8)))
+    png = PNG.empty(color_type, bit_depth, rng=rng, width=width, height=height, interlace=interlace,
+                    filter_types=filter_types, random_pixels=True)
+    names = ['IHDR', 'PLTE', 'IDAT', 'IEND'] if color_type == 3 else ['IHDR', 'IDAT', 'IEND']
+    data = png.data + b''.join(png.chunk_bytes(name) for name in names)
+    channels = len(png.pixels) // (width * height)
+    intended = np.array(png.pixels, dtype=np.uint16).reshape(height, width, channels)
+    description = f'ct{color_type}-bd{bit_depth}-{width}x{height}-i{interlace}-f{"".join(map(str, filter_types))}'
+    return data, intended, description
+
+def compare_synthetic(job):
+    base_seed, seed_number, save_dir = job
+    data, intended, description = synthetic_seed(base_seed, seed_number)
+    record = compare(data, intended)
+    record['file'] = f'synthetic_{seed_number:06d}_{description}.png'
+    if save_dir and record['outcome'] != MATCH:
+        with open(os.path.join(save_dir, record['file']), 'wb') as f:
+            f.write(data)
+    return record
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare libpng against a NumPy reference decoder '
+                                                 'and against the pixels the generator intended.')
+    parser.add_argument('paths', nargs='*', help='PNG files or directories (searched recursively)')
+    parser.add_argument('-n', '--generate', type=int, default=0,
+                        help='also compare this many synthetic seeds with known pixels')
+    parser.add_argument('--seed', type=int, default=0, help='base random seed for --generate')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--libpng', default=None, help='path to the libpng shared library')
+    parser.add_argument('--report', default=None, help='write one JSON record per input to this file')
+    parser.add_argument('--save-failures', default=None,
+                        help='directory where synthetic seeds that do not match are saved')
+    parser.add_argument('--show', type=int, default=10, help='number of disagreements to print')
+    args = parser.parse_args()
+    if not args.paths and not args.generate:
+        parser.error('no input: give PNG paths and/or --generate N')
+
+    libpng_path = find_libpng(args.libpng)
+    build_shim(libpng_path)  # 先在主进程编译好，worker 直接载入缓存
+    if args.save_failures:
+        os.makedirs(args.save_failures, exist_ok=True)
+
+    start = time.perf_counter()
+    counts = collections.Counter()
+    shown = 0
+    report = open(args.report, 'w') if args.report else None
+    with multiprocessing.Pool(args.jobs, initializer=_init_worker, initargs=(libpng_path,)) as pool:
+        results = [pool.imap_unordered(compare_file, iter_files(args.paths), chunksize=16)]
+        if args.generate:
+            jobs = ((args.seed, number, args.save_failures) for number in range(args.generate))
+            results.append(pool.imap_unordered(compare_synthetic, jobs, chunksize=16))
+        for record in (record for iterator in results for record in iterator):
+            counts[record['outcome']] += 1
+            if report is not None:
+                report.write(json.dumps(record) + '\n')
+            if record['outcome'] not in (MATCH, BOTH_FAILED) and shown < args.show:
+                shown += 1
+                details = {k: v for k, v in record.items() if k not in ('file', 'outcome')}
+                print(f"{record['outcome']}: {record['file']}: {json.dumps(details)}")
+    if report is not None:
+        report.close()
+
+    total = sum(counts.values())
+    elapsed = time.perf_counter() - start
+    print(f"{total} inputs in {elapsed:.1f}s ({total / elapsed:.0f}/s, {args.jobs} workers): "
+          + ', '.join(f'{outcome} {count}' for outcome, count in counts.most_common()))
+    if counts[PIXEL_MISMATCH] or counts[INTENDED_MISMATCH]:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
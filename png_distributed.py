@@ -0,0 +1,369 @@
+"""
+多机生成种子：协调者把种子编号空间切成工作单元，各节点上的 worker 租用 (lease) 单元、
+按 (base_seed, seed_number) 确定地生成并写出分片 (shard)，最后合并。
+合并结果与单机运行 png_generator1.py 的输出逐字节相同。
+
+    python png_distributed.py init QUEUE -n 1000000 --seed 42     # 协调者 (共享目录，如 NFS)
+    python png_distributed.py work QUEUE -j 8                      # 每个节点
+    python png_distributed.py status QUEUE
+    python png_distributed.py merge QUEUE -o randPNG_seeds
+
+工作单元的状态就是 QUEUE/pending、QUEUE/leased、QUEUE/done 中的文件，状态转换都是原子的 rename。
+worker 持有租约期间定期更新租约文件的 mtime；超时未更新的租约会被任何 worker 收回并重新发放。
+也可以用 serve 在一台机器上通过 TCP 提供同样的队列 (work --connect HOST:PORT)，分片仍写到共享目录。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import zipfile
+
+# 共享的生成工具位于 contrib/oss-fuzz/png_generator
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'contrib', 'oss-fuzz', 'png_generator'))
+from png_generator1 import clear_output_dir, generate_seed, manifest_record
+from png_generator_utils import parse_compression_profile
+from png_seed_index import SeedIndex, seed_record
+
+_LEASE_SECONDS = 300
+_POLL_SECONDS = 5
+# 固定分片中各成员的时间戳，使分片本身也是确定的
+_ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+def _unit_name(unit):
+    return f'unit-{unit:06d}'
+
+class FileLeaseQueue:
+    """基于共享目录的租约队列。"""
+
+    def __init__(self, root, lease_seconds=None):
+        self.root = os.path.abspath(root)
+        with open(os.path.join(self.root, 'job.json')) as f:
+            self._job = json.load(f)
+        self.lease_seconds = lease_seconds or self._job['lease_seconds']
+
+    @classmethod
+    def create(cls, root, job):
+        """写入任务参数并为每个工作单元创建 pending 文件。"""
+        for name in ('pending', 'leased', 'done'):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+        os.makedirs(job['shards'], exist_ok=True)
+        for unit in range(job['units']):
+            open(os.path.join(root, 'pending', _unit_name(unit)), 'w').close()
+        with open(os.path.join(root, 'job.json'), 'w') as f:
+            json.dump(job, f, indent=2)
+        return cls(root)
+
+    def job(self):
+        return self._job
+
+    def _now(self):
+        """共享文件系统上的 "现在"：更新一个文件再读它的 mtime，避免各节点时钟不一致。"""
+        clock = os.path.join(self.root, '.clock')
+        with open(clock, 'a'):
+            os.utime(clock)
+        return os.stat(clock).st_mtime
+
+    def _leases(self):
+        """产生 (unit, worker_id, 路径)。"""
+        for name in os.listdir(os.path.join(self.root, 'leased')):
+            unit, _, worker_id = name.partition('.')
+            yield int(unit[len('unit-'):]), worker_id, os.path.join(self.root, 'leased', name)
+
+    def reap(self):
+        """把超时的租约放回 pending；返回收回的单元。"""
+        now = self._now()
+        reaped = []
+        for unit, _, path in self._leases():
+            try:
+                if now - os.stat(path).st_mtime < self.lease_seconds:
+                    continue
+                os.rename(path, os.path.join(self.root, 'pending', _unit_name(unit)))
+            except FileNotFoundError:
+                continue  # 已被别的 worker 完成或收回
+            reaped.append(unit)
+        return reaped
+
+    def claim(self, worker_id):
+        """租用一个单元，返回其编号；没有可租用的单元时返回 None。"""
+        self.reap()
+        for name in sorted(os.listdir(os.path.join(self.root, 'pending'))):
+            leased = os.path.join(self.root, 'leased', f'{name}.{worker_id}')
+            try:
+                os.rename(os.path.join(self.root, 'pending', name), leased)
+            except FileNotFoundError:
+                continue  # 被别的 worker 抢先租用
+            os.utime(leased)
+            return int(name[len('unit-'):])
+        return None
+
+    def renew(self, unit, worker_id):
+        """续租；租约已被收回时返回 False。"""
+        try:
+            os.utime(os.path.join(self.root, 'leased', f'{_unit_name(unit)}.{worker_id}'))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, unit, worker_id):
+        """
+        标记单元完成。租约已过期时也照样标记：分片是确定的，
+        另一个 worker 重新生成的分片与此相同。
+        """
+        done = os.path.join(self.root, 'done', _unit_name(unit))
+        try:
+            os.rename(os.path.join(self.root, 'leased', f'{_unit_name(unit)}.{worker_id}'), done)
+            return
+        except FileNotFoundError:
+            pass
+        open(done, 'w').close()
+        try:
+            os.remove(os.path.join(self.root, 'pending', _unit_name(unit)))
+        except FileNotFoundError:
+            pass
+
+    def status(self):
+        counts = {name: len(os.listdir(os.path.join(self.root, name))) for name in ('pending', 'leased', 'done')}
+        now = self._now()
+        counts['expired'] = sum(1 for _, _, path in self._leases()
+                                if now - os.stat(path).st_mtime >= self.lease_seconds)
+        counts['units'] = self._job['units']
+        return counts
+
+class _QueueHandler(socketserver.StreamRequestHandler):
+    """每行一个 JSON 请求 {"op": ..., "args": [...]}，回复一行 JSON {"result": ...}。"""
+
+    def handle(self):
+        for line in self.rfile:
+            request = json.loads(line)
+            with self.server.lock:
+                result = getattr(self.server.queue, request['op'])(*request.get('args', []))
+            self.wfile.write(json.dumps({'result': result}).encode() + b'\n')
+
+class QueueServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """通过 TCP 提供一个 FileLeaseQueue (队列目录只需要在这台机器上)。"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, queue):
+        super().__init__(address, _QueueHandler)
+        self.queue = queue
+        self.lock = threading.Lock()
+
+class TcpLeaseQueue:
+    """QueueServer 的客户端，方法与 FileLeaseQueue 相同。"""
+    _OPS = ('job', 'reap', 'claim', 'renew', 'complete', 'status')
+
+    def __init__(self, address):
+        host, _, port = address.rpartition(':')
+        self._address = (host or 'localhost', int(port))
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _call(self, op, *args):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._file is None:
+                        self._file = socket.create_connection(self._address).makefile('rwb')
+                    self._file.write(json.dumps({'op': op, 'args': list(args)}).encode() + b'\n')
+                    self._file.flush()
+                    line = self._file.readline()
+                    if line:
+                        return json.loads(line)['result']
+                except OSError:
+                    if attempt:
+                        raise
+                self._file = None
+            raise ConnectionError(f'queue server {self._address} closed the connection')
+
+    def __getattr__(self, name):
+        if name not in self._OPS:
+            raise AttributeError(name)
+        return lambda *args: self._call(name, *args)
+
+class _Heartbeat(threading.Thread):
+    """在生成一个单元期间定期续租。"""
+
+    def __init__(self, queue, unit, worker_id, interval):
+        super().__init__(daemon=True)
+        self.queue, self.unit, self.worker_id, self.interval = queue, unit, worker_id, interval
+        self.lost = False
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            if not self.queue.renew(self.unit, self.worker_id):
+                self.lost = True
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+def unit_seeds(job, unit):
+    start = unit * job['unit_size']
+    return range(start, min(start + job['unit_size'], job['count']))
+
+def shard_path(job, unit):
+    return os.path.join(job['shards'], f'{_unit_name(unit)}.zip')
+
+def write_shard(job, unit, pool=None):
+    """生成一个单元的种子并写成分片 (先写临时文件再 rename)。"""
+    jobs = ((job['base_seed'], seed_number, job['compression_profile'], False, False)
+            for seed_number in unit_seeds(job, unit))
+    results = pool.imap(generate_seed, jobs, chunksize=16) if pool is not None else map(generate_seed, jobs)
+    path = shard_path(job, unit)
+    temporary = f'{path}.{socket.gethostname()}.{os.getpid()}'
+    manifest = []
+    with zipfile.ZipFile(temporary, 'w', zipfile.ZIP_STORED) as shard:
+        for seed_number, result in zip(unit_seeds(job, unit), results):
+            shard.writestr(zipfile.ZipInfo(f'{seed_number:010d}', _ZIP_DATE_TIME), result['data'])
+            manifest.append(json.dumps(manifest_record(result)) + '\n')
+        shard.writestr(zipfile.ZipInfo('manifest.jsonl', _ZIP_DATE_TIME), ''.join(manifest))
+    os.replace(temporary, path)
+
+def run_worker(queue, worker_id, jobs=1, shards=None):
+    """循环租用并完成单元，直到所有单元都已完成；返回本 worker 完成的单元数。"""
+    job = dict(queue.job())
+    if shards:
+        job['shards'] = shards
+    interval = max(1, getattr(queue, 'lease_seconds', job['lease_seconds']) // 3)
+    pool = multiprocessing.Pool(jobs) if jobs > 1 else None
+    completed = 0
+    try:
+        while True:
+            unit = queue.claim(worker_id)
+            if unit is None:
+                status = queue.status()
+                if status['done'] >= status['units']:
+                    break
+                time.sleep(_POLL_SECONDS)
+                continue
+            start = time.perf_counter()
+            heartbeat = _Heartbeat(queue, unit, worker_id, interval)
+            heartbeat.start()
+            try:
+                write_shard(job, unit, pool)
+            finally:
+                heartbeat.stop()
+            queue.complete(unit, worker_id)
+            completed += 1
+            note = ' (lease had expired)' if heartbeat.lost else ''
+            print(f'{worker_id}: unit {unit} done in {time.perf_counter() - start:.1f}s{note}')
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return completed
+
+def merge(job, output, index_path=None):
+    """按单元顺序合并分片，得到与单机运行相同的输出目录。"""
+    missing = [unit for unit in range(job['units']) if not os.path.exists(shard_path(job, unit))]
+    if missing:
+        raise RuntimeError(f"{len(missing)} unit(s) have no shard yet, e.g. unit {missing[0]}")
+    clear_output_dir(output)
+    index = SeedIndex(index_path) if index_path else None
+    with open(os.path.join(output, 'manifest.jsonl'), 'w') as manifest:
+        for unit in range(job['units']):
+            with zipfile.ZipFile(shard_path(job, unit)) as shard:
+                records = shard.read('manifest.jsonl').decode().splitlines()
+                for seed_number, line in zip(unit_seeds(job, unit), records):
+                    record = json.loads(line)
+                    data = shard.read(f'{seed_number:010d}')
+                    with open(os.path.join(output, record['file']), 'wb') as f:
+                        f.write(data)
+                    manifest.write(line + '\n')
+                    if index is not None:
+                        index.add(seed_record(record['file'], data, record['critical'], record['ancillary'],
+                                              record['compression_profile']))
+    if index is not None:
+        index.close()
+
+def _open_queue(args):
+    if getattr(args, 'connect', None):
+        return TcpLeaseQueue(args.connect)
+    return FileLeaseQueue(args.queue, getattr(args, 'lease', None))
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate seeds on several machines with a leased work queue.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    init = commands.add_parser('init', help='create the work queue')
+    init.add_argument('queue', help='queue directory (on storage shared by the workers)')
+    init.add_argument('-n', '--count', type=int, required=True, help='number of seeds to generate')
+    init.add_argument('--seed', type=int, default=None, help='base random seed')
+    init.add_argument('--unit-size', type=int, default=1000, help='seeds per work unit')
+    init.add_argument('--compression-profile', default='default',
+                      help="zlib profile, 'random' or 'sweep' (see png_generator1.py)")
+    init.add_argument('--lease', type=int, default=_LEASE_SECONDS, help='lease timeout in seconds')
+    init.add_argument('--shards', default=None, help='shard directory (default: QUEUE/shards)')
+
+    work = commands.add_parser('work', help='claim and generate work units until all are done')
+    work.add_argument('queue', nargs='?', help='queue directory')
+    work.add_argument('--connect', default=None, help='use the queue served at HOST:PORT instead')
+    work.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes')
+    work.add_argument('--shards', default=None, help='shard directory, if mounted elsewhere on this node')
+    work.add_argument('--worker-id', default=None, help='default: HOST-PID')
+    work.add_argument('--lease', type=int, default=None, help='override the lease timeout of the queue')
+
+    serve = commands.add_parser('serve', help='serve a queue directory over TCP')
+    serve.add_argument('queue', help='queue directory')
+    serve.add_argument('--bind', default='0.0.0.0:7450', help='address to listen on (default: 0.0.0.0:7450)')
+
+    status = commands.add_parser('status', help='show the state of the work units')
+    status.add_argument('queue', nargs='?', help='queue directory')
+    status.add_argument('--connect', default=None, help='ask the queue served at HOST:PORT instead')
+
+    merge_parser = commands.add_parser('merge', help='merge the shards into a seed directory')
+    merge_parser.add_argument('queue', help='queue directory')
+    merge_parser.add_argument('-o', '--output', default='randPNG_seeds', help='directory to save seeds')
+    merge_parser.add_argument('--no-index', action='store_true', help='do not write the SQLite index')
+    args = parser.parse_args()
+
+    if args.command in ('work', 'status') and not args.queue and not args.connect:
+        parser.error('a queue directory or --connect HOST:PORT is required')
+
+    if args.command == 'init':
+        if args.compression_profile not in ('random', 'sweep'):
+            try:
+                parse_compression_profile(args.compression_profile)
+            except ValueError as e:
+                parser.error(str(e))
+        base_seed = args.seed if args.seed is not None else int.from_bytes(os.urandom(4), 'big')
+        job = {
+            'base_seed': base_seed,
+            'count': args.count,
+            'unit_size': args.unit_size,
+            'units': (args.count + args.unit_size - 1) // args.unit_size,
+            'compression_profile': args.compression_profile,
+            'lease_seconds': args.lease,
+            'shards': os.path.abspath(args.shards or os.path.join(args.queue, 'shards')),
+        }
+        FileLeaseQueue.create(args.queue, job)
+        print(f"{job['units']} units of {args.unit_size} seeds in {args.queue} (base seed {base_seed})")
+    elif args.command == 'work':
+        worker_id = args.worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        completed = run_worker(_open_queue(args), worker_id.replace('.', '_'), args.jobs, args.shards)
+        print(f'{worker_id}: {completed} unit(s) completed; all units are done')
+    elif args.command == 'serve':
+        host, _, port = args.bind.rpartition(':')
+        with QueueServer((host, int(port)), FileLeaseQueue(args.queue)) as server:
+            print(f'Serving {args.queue} on {args.bind}')
+            server.serve_forever()
+    elif args.command == 'status':
+        print(json.dumps(_open_queue(args).status()))
+    else:
+        job = FileLeaseQueue(args.queue).job()
+        merge(job, args.output, None if args.no_index else os.path.join(args.output, 'index.sqlite'))
+        print(f"Merged {job['count']} seeds into {args.output}")
+
+if __name__ == '__main__':
+    try:
+        main()
+    except RuntimeError as e:
+        sys.exit(f'error: {e}')
@@ -3,50 +3,121 @@ import struct
 import random 
 import datetime # Added for tIME chunk
 import os
+import sys
 import glob
+import json
+import argparse
+import multiprocessing
+from array import array
+
+# 共享的生成工具位于 contrib/oss-fuzz/png_generator
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'contrib', 'oss-fuzz', 'png_generator'))
+from icc_profile_builder import ICC_TAG_TYPES, compressed_icc_profile
+from png_seed_index import SeedIndex, seed_record
+from png_generator_utils import (
+    CHANNELS,
+    CountingRandom,
+    GenerationProfiler,
+    active_profiler,
+    compress_with_profile,
+    compression_profile_sweep,
+    encode_scanlines,
+    parse_compression_profile
+)
 
 randPNG_save_path = 'randPNG_seeds'
 
+class EntropyPool:
+    """
+    可设种子的缓冲随机源。
+    一次生成一大块随机字节，再按需切分成 bytes 或类型化数组，
+    代替逐字节调用 random.randint。
+    """
+    def __init__(self, seed=None, block_size=4096):
+        self._rng = random.Random(seed)
+        self._block_size = block_size
+        self._buffer = b''
+        self._pos = 0
+        self.draws = 0
+
+    def bytes(self, n):
+        self.draws += 1
+        if self._pos + n > len(self._buffer):
+            refill = max(n, self._block_size)
+            self._buffer = self._buffer[self._pos:] + self._rng.getrandbits(8 * refill).to_bytes(refill, 'little')
+            self._pos = 0
+        out = self._buffer[self._pos:self._pos + n]
+        self._pos += n
+        return out
+
+    def uint8(self, n):
+        return array('B', self.bytes(n))
+
+    def uint16be(self, n):
+        """n 个按大端序解释的 16 位无符号整数。"""
+        values = array('H', self.bytes(2 * n))
+        if sys.byteorder == 'little':
+            values.byteswap()
+        return values
+
 class PNG:
-    def __init__(self, critical_chunk_config=None, ancillary_chunk_config=None):
+    # PNG() 按这两个列表的顺序生成 PLTE 之前、之后的辅助数据块
+    known_ancillary_chunks_before_plte = ('sBIT', 'gAMA', 'cHRM', 'sRGB', 'cICP', 'eXIf', 'iCCP', 'sPLT')
+    known_ancillary_chunks_after_plte = ('hIST', 'tRNS', 'bKGD', 'pHYs', 'sTER',
+                                         'tEXt', 'zTXt', 'iTXt', 'tIME', 'dSIG')
+
+    def __init__(self, critical_chunk_config=None, ancillary_chunk_config=None, compression_profile=None,
+                 entropy=None, rng=None, profiler=None):
         """
         初始化PNG对象。
         critical_chunk_config: 0 (Legal) 1 (Illegal)
         ancillary_chunk_config: 0 (Legal) 1 (Illegal) 2 (Not Used)
+        compression_profile: IDAT/zTXt/iTXt/iCCP 使用的压缩配置 (名称或 CompressionProfile)
+        entropy: 批量随机字节来源 (EntropyPool)，默认由 rng 派生种子
+        rng: 随机数来源 (random.Random 实例)，默认使用全局 random 模块
+        profiler: 可选的 GenerationProfiler，按数据块统计生成开销
         """
         self.data = b'\x89PNG\r\n\x1a\n'
+        self.rng = rng if rng is not None else random
+        self.profiler = profiler
+        self.compression_profile = parse_compression_profile(compression_profile)
+        self.entropy = entropy if entropy is not None else EntropyPool(self.rng.getrandbits(64))
 
-        self.color_type = random.choice([0, 2, 3, 4, 6]) 
+        self.color_type = self.rng.choice([0, 2, 3, 4, 6]) 
         if self.color_type == 0: 
-            self.bit_depth = random.choice([1, 2, 4, 8, 16])
+            self.bit_depth = self.rng.choice([1, 2, 4, 8, 16])
         elif self.color_type == 2: 
-            self.bit_depth = random.choice([8, 16])
+            self.bit_depth = self.rng.choice([8, 16])
         elif self.color_type == 3: 
-            self.bit_depth = random.choice([1, 2, 4, 8])
+            self.bit_depth = self.rng.choice([1, 2, 4, 8])
         elif self.color_type == 4: 
-            self.bit_depth = random.choice([8, 16])
+            self.bit_depth = self.rng.choice([8, 16])
         elif self.color_type == 6: 
-            self.bit_depth = random.choice([8, 16])
+            self.bit_depth = self.rng.choice([8, 16])
         else: 
             self.bit_depth = 8 
 
         if self.color_type == 3:
             self.plte_chunk_present = True
             max_entries_for_bd = 1 << self.bit_depth
-            self.num_plte_entries = random.randint(1, min(256, max_entries_for_bd))
+            self.num_plte_entries = self.rng.randint(1, min(256, max_entries_for_bd))
         else:
-            self.plte_chunk_present = random.choice([True, False])
+            self.plte_chunk_present = self.rng.choice([True, False])
             self.num_plte_entries = 0 
         
         self.width = 1
         self.height = 1
+        self.interlace = 0
+        self.filter_types = (0,)
+        self.random_pixels = False
+        self.pixels = None
 
         crit_config = critical_chunk_config if critical_chunk_config is not None else {}
         anc_config = ancillary_chunk_config if ancillary_chunk_config is not None else {}
 
         self._add_chunk_by_name('IHDR', crit_config.get('IHDR', 0))
         
-        self.known_ancillary_chunks_before_plte = ['sBIT', 'gAMA', 'cHRM', 'sRGB', 'cICP', 'eXIf', 'iCCP', 'sPLT'] 
         for chunk_name_str in self.known_ancillary_chunks_before_plte:
             validity_code = anc_config.get(chunk_name_str, 2)
             if validity_code != 2:
@@ -56,11 +127,6 @@ class PNG:
         self._add_chunk_by_name('PLTE', crit_config.get('PLTE', plte_validity_default) )
 
 
-        self.known_ancillary_chunks_after_plte = [
-             'hIST', 'tRNS', 'bKGD', 'pHYs', 'sTER', 
-             'tEXt', 'zTXt', 'iTXt', 'tIME', 'dSIG' 
-        ] 
-
         for chunk_name_str in self.known_ancillary_chunks_after_plte:
             validity_code = anc_config.get(chunk_name_str, 2)
             if validity_code != 2:
@@ -69,7 +135,57 @@ class PNG:
         self._add_chunk_by_name('IDAT', crit_config.get('IDAT', 0))
         self._add_chunk_by_name('IEND', crit_config.get('IEND', 0))
 
+    @classmethod
+    def empty(cls, color_type, bit_depth, compression_profile=None, entropy=None, rng=None, profiler=None,
+              width=1, height=1, interlace=0, filter_types=(0,), random_pixels=False):
+        """
+        创建一个只有 PNG 签名、不自动生成任何数据块的 PNG 对象，
+        之后用 chunk_bytes() 逐个生成数据块 (例如由数据块顺序探索引擎缓存)。
+        width/height/interlace: 图像尺寸与是否 Adam7 交错
+        filter_types: IDAT 中各扫描行循环使用的过滤类型
+        random_pixels: True 时像素取随机值，否则全为 0
+        """
+        self = cls.__new__(cls)
+        self.data = b'\x89PNG\r\n\x1a\n'
+        self.rng = rng if rng is not None else random
+        self.profiler = profiler
+        self.compression_profile = parse_compression_profile(compression_profile)
+        self.entropy = entropy if entropy is not None else EntropyPool(self.rng.getrandbits(64))
+        self.color_type = color_type
+        self.bit_depth = bit_depth
+        self.plte_chunk_present = color_type in (2, 3, 6)
+        self.num_plte_entries = self.rng.randint(1, min(256, 1 << bit_depth)) if color_type == 3 else 0
+        self.width = width
+        self.height = height
+        self.interlace = interlace
+        self.filter_types = tuple(filter_types)
+        self.random_pixels = random_pixels
+        self.pixels = None
+        return self
+
+    def chunk_bytes(self, chunk_name_str, validity_code=0):
+        """单独生成一个数据块，返回它的完整字节 (长度+类型+数据+CRC)，不改变 self.data。"""
+        size_before = len(self.data)
+        self._add_chunk_by_name(chunk_name_str, validity_code)
+        chunk = self.data[size_before:]
+        self.data = self.data[:size_before]
+        return chunk
+
     def _add_chunk_by_name(self, chunk_name_str, validity_code):
+        if self.profiler is None:
+            self._dispatch_chunk(chunk_name_str, validity_code)
+            return
+        size_before = len(self.data)
+        draws_before = self._rng_draws()
+        with active_profiler(self.profiler), self.profiler.chunk(chunk_name_str) as event:
+            self._dispatch_chunk(chunk_name_str, validity_code)
+            event['bytes'] = len(self.data) - size_before
+            event['rng_draws'] = self._rng_draws() - draws_before
+
+    def _rng_draws(self):
+        return getattr(self.rng, 'draws', 0) + self.entropy.draws
+
+    def _dispatch_chunk(self, chunk_name_str, validity_code):
         if validity_code == 2 and chunk_name_str not in ['IHDR', 'PLTE', 'IDAT', 'IEND']: 
             return
 
@@ -139,10 +255,10 @@ class PNG:
         current_height = self.height
 
         if validity_code == 0: 
-            comp, filt, inter = 0, 0, 0
+            comp, filt, inter = 0, 0, self.interlace
         elif validity_code == 1: 
             current_width = 0 
-            comp, filt, inter = 0, 0, 0
+            comp, filt, inter = 0, 0, self.interlace
         else:
             raise ValueError(f"Unknown validity_code '{validity_code}' for IHDR")
         
@@ -170,15 +286,14 @@ class PNG:
                     actual_num_entries = 1
                     self.num_plte_entries = 1
             elif self.plte_chunk_present: 
-                 actual_num_entries = random.randint(1, 256)
+                 actual_num_entries = self.rng.randint(1, 256)
                  self.num_plte_entries = actual_num_entries 
             else: 
                 self.plte_chunk_present = False 
                 self.num_plte_entries = 0
                 return 
 
-            for _ in range(actual_num_entries): 
-                chunk_data += bytes([random.randint(0,255), random.randint(0,255), random.randint(0,255)])
+            chunk_data = self.entropy.bytes(3 * actual_num_entries)
             
             if actual_num_entries > 0:
                 self.plte_chunk_present = True 
@@ -205,7 +320,8 @@ class PNG:
         chunk_type = b'tIME'
         chunk_data = None
         if validity_code == 0: 
-            now = datetime.datetime.utcnow()
+            # 由 rng 决定时间而不是取当前时间，同一 (base_seed, seed_number) 总是生成相同的字节
+            now = datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=self.rng.getrandbits(31))
             chunk_data = struct.pack('>HBBBBB', now.year, now.month, now.day, now.hour, now.minute, now.second)
         elif validity_code == 1: 
             chunk_data = struct.pack('>HBBBBB', 2023, 13, 32, 25, 61, 62) 
@@ -222,18 +338,17 @@ class PNG:
 
         if validity_code == 0: 
             if self.color_type == 0: 
-                gray_transparent_sample = random.randint(0, (1 << self.bit_depth) -1 if self.bit_depth <= 16 else 255)
-                chunk_data = struct.pack('>H', gray_transparent_sample)
+                max_val = (1 << self.bit_depth) -1 if self.bit_depth <= 16 else 255
+                chunk_data = struct.pack('>H', self.entropy.uint16be(1)[0] & max_val)
             elif self.color_type == 2: 
+                # 位深都是 2 的幂，按掩码截取即为均匀分布
                 max_val = (1 << self.bit_depth) -1 if self.bit_depth else 255
-                r_trans, g_trans, b_trans = random.randint(0,max_val), random.randint(0,max_val), random.randint(0,max_val)
-                chunk_data = struct.pack('>HHH', r_trans, g_trans, b_trans)
+                chunk_data = struct.pack('>HHH', *(v & max_val for v in self.entropy.uint16be(3)))
             elif self.color_type == 3: 
                 if not self.plte_chunk_present or self.num_plte_entries == 0:
                     return
-                num_alpha_entries = random.randint(0, self.num_plte_entries)
-                alpha_values = [random.randint(0,255) for _ in range(num_alpha_entries)]
-                chunk_data = bytes(alpha_values)
+                num_alpha_entries = self.rng.randint(0, self.num_plte_entries)
+                chunk_data = self.entropy.bytes(num_alpha_entries)
             else: 
                 return
         elif validity_code == 1: 
@@ -262,13 +377,13 @@ class PNG:
             null_separator = b'\x00'
             compression_method = b'\x00' 
             original_text = b"Generated by PNGClass v1.0 (Latin-1)"
-            compressed_text = zlib.compress(original_text)
+            compressed_text = compress_with_profile(original_text, self.compression_profile)
             chunk_data = keyword + null_separator + compression_method + compressed_text
         elif validity_code == 1: 
             keyword = b"InvalidZtxt"
             null_separator = b'\x00'
             compression_method = b'\x01' 
-            compressed_text = zlib.compress(b"some data")
+            compressed_text = compress_with_profile(b"some data", self.compression_profile)
             chunk_data = keyword + null_separator + compression_method + compressed_text
         else:
             raise ValueError(f"Unknown validity_code '{validity_code}' for zTXt")
@@ -279,7 +394,7 @@ class PNG:
         chunk_type = b'sRGB'
         chunk_data = None
         if validity_code == 0: 
-            rendering_intent = random.choice([0,1,2,3])
+            rendering_intent = self.rng.choice([0,1,2,3])
             chunk_data = struct.pack('>B', rendering_intent)
         elif validity_code == 1: 
             chunk_data = struct.pack('>BB', 0, 0) 
@@ -292,7 +407,7 @@ class PNG:
         chunk_type = b'sTER'
         chunk_data = None
         if validity_code == 0: 
-            mode = random.choice([0,1]) 
+            mode = self.rng.choice([0,1]) 
             chunk_data = struct.pack('>B', mode)
         elif validity_code == 1: 
             chunk_data = struct.pack('>BB', 0, 0) 
@@ -306,9 +421,9 @@ class PNG:
         chunk_data = None
         if validity_code == 0: 
             keywords = [b"Title", b"Author", b"Description", b"Copyright", b"Creation Time", b"Software", b"Disclaimer", b"Warning", b"Source", b"Comment"]
-            keyword = random.choice(keywords)
+            keyword = self.rng.choice(keywords)
             null_separator = b'\x00'
-            text_string = f"Sample {keyword.decode('latin-1')} text (Latin-1). Random number: {random.randint(1,1000)}".encode('latin-1')
+            text_string = f"Sample {keyword.decode('latin-1')} text (Latin-1). Random number: {self.rng.randint(1,1000)}".encode('latin-1')
             chunk_data = keyword + null_separator + text_string
         elif validity_code == 1: 
             keyword = b"A" * 80 
@@ -324,9 +439,9 @@ class PNG:
         chunk_type = b'pHYs'
         chunk_data = None
         if validity_code == 0: 
-            pixels_per_unit_x = random.randint(1, 10000) 
-            pixels_per_unit_y = random.randint(1, 10000)
-            unit_specifier = random.choice([0,1]) 
+            pixels_per_unit_x = self.rng.randint(1, 10000) 
+            pixels_per_unit_y = self.rng.randint(1, 10000)
+            unit_specifier = self.rng.choice([0,1]) 
             chunk_data = struct.pack('>IIB', pixels_per_unit_x, pixels_per_unit_y, unit_specifier)
         elif validity_code == 1: 
             chunk_data = struct.pack('>II', 2835, 2835) 
@@ -342,11 +457,11 @@ class PNG:
         if self.color_type == 3: 
             max_sb_palette = 8
         
-        sb_gray = random.randint(1, max_sb)
-        sb_red = random.randint(1, max_sb_palette if self.color_type == 3 else max_sb)
-        sb_green = random.randint(1, max_sb_palette if self.color_type == 3 else max_sb)
-        sb_blue = random.randint(1, max_sb_palette if self.color_type == 3 else max_sb)
-        sb_alpha = random.randint(1, max_sb)
+        sb_gray = self.rng.randint(1, max_sb)
+        sb_red = self.rng.randint(1, max_sb_palette if self.color_type == 3 else max_sb)
+        sb_green = self.rng.randint(1, max_sb_palette if self.color_type == 3 else max_sb)
+        sb_blue = self.rng.randint(1, max_sb_palette if self.color_type == 3 else max_sb)
+        sb_alpha = self.rng.randint(1, max_sb)
 
         if validity_code == 0: 
             if self.color_type == 0: 
@@ -377,21 +492,13 @@ class PNG:
         chunk_type = b'sPLT'
         chunk_data = None
         if validity_code == 0: 
-            palette_name = f"RandPalette{random.randint(1,100)}".encode('latin-1')[:79]
+            palette_name = f"RandPalette{self.rng.randint(1,100)}".encode('latin-1')[:79]
             null_separator = b'\x00'
-            sample_depth_splt = random.choice([8, 16])
-            entries_data = b''
-            num_splt_entries = random.randint(1, 10) 
-            if sample_depth_splt == 8:
-                for _ in range(num_splt_entries):
-                    r, g, b, a = random.randint(0,255), random.randint(0,255), random.randint(0,255), random.randint(0,255)
-                    frequency = random.randint(0, 65535)
-                    entries_data += struct.pack('>BBBBH', r, g, b, a, frequency)
-            elif sample_depth_splt == 16:
-                 for _ in range(num_splt_entries):
-                    r,g,b,a = random.randint(0,65535),random.randint(0,65535),random.randint(0,65535),random.randint(0,65535)
-                    frequency = random.randint(0, 65535)
-                    entries_data += struct.pack('>HHHHH', r, g, b, a, frequency)
+            sample_depth_splt = self.rng.choice([8, 16])
+            num_splt_entries = self.rng.randint(1, 10) 
+            # 每个条目是 RGBA 样本 + 16 位频率，所有字段都是均匀随机的
+            entry_size = 6 if sample_depth_splt == 8 else 10
+            entries_data = self.entropy.bytes(entry_size * num_splt_entries)
             chunk_data = palette_name + null_separator + bytes([sample_depth_splt]) + entries_data
         elif validity_code == 1: 
             palette_name = b"InvalidDepthPalette"
@@ -410,13 +517,11 @@ class PNG:
         if self.color_type != 3 or not self.plte_chunk_present or self.num_plte_entries == 0:
             return
         if validity_code == 0: 
-            chunk_data = b''
-            for _ in range(self.num_plte_entries):
-                frequency = random.randint(0, 65535)
-                chunk_data += struct.pack('>H', frequency) 
+            # 每个条目是一个 16 位大端频率值
+            chunk_data = self.entropy.bytes(2 * self.num_plte_entries)
         elif validity_code == 1: 
             if self.num_plte_entries > 0:
-                chunk_data = struct.pack('>H', random.randint(0, 65535)) * (self.num_plte_entries -1 if self.num_plte_entries > 1 else self.num_plte_entries + 1 if self.num_plte_entries > 0 else 2) 
+                chunk_data = struct.pack('>H', self.rng.randint(0, 65535)) * (self.num_plte_entries -1 if self.num_plte_entries > 1 else self.num_plte_entries + 1 if self.num_plte_entries > 0 else 2) 
             else: 
                 chunk_data = b'\x00\x01\x00' 
         else:
@@ -428,17 +533,25 @@ class PNG:
         chunk_type = b'iCCP'
         chunk_data = None
         if validity_code == 0: 
-            profile_name = f"RandICCProfile{random.randint(1,100)}".encode('latin-1')[:79]
+            profile_name = f"RandICCProfile{self.rng.randint(1,100)}".encode('latin-1')[:79]
             null_separator = b'\x00'
             compression_method = b'\x00' 
-            uncompressed_profile_data = f"This is a tiny fake ICC profile data {random.random()}".encode('latin-1')
-            compressed_profile = zlib.compress(uncompressed_profile_data)
+            # 合法的合成 Profile；颜色空间必须与颜色类型相符
+            color_space = 'GRAY' if self.color_type in (0, 4) else 'RGB'
+            tag_types = self.rng.sample(ICC_TAG_TYPES, self.rng.randint(1, len(ICC_TAG_TYPES)))
+            compressed_profile = compressed_icc_profile(
+                tag_count=self.rng.choice([3, 16, 64, 256]),
+                tag_types=sorted(tag_types),
+                data_size=self.rng.choice([0, 4096, 1 << 20]),
+                color_space=color_space,
+                seed=self.rng.randrange(8),
+                compression_profile=self.compression_profile)
             chunk_data = profile_name + null_separator + compression_method + compressed_profile
         elif validity_code == 1: 
             profile_name = b"InvalidCMProfile"
             null_separator = b'\x00'
             compression_method = b'\x01' 
-            compressed_profile = zlib.compress(b"some data")
+            compressed_profile = compress_with_profile(b"some data", self.compression_profile)
             chunk_data = profile_name + null_separator + compression_method + compressed_profile
         else:
             raise ValueError(f"Unknown validity_code '{validity_code}' for iCCP")
@@ -450,23 +563,23 @@ class PNG:
         chunk_data = None
         if validity_code == 0: 
             keywords = [b"Title", b"Author", b"Description", b"Copyright", b"Creation Time", b"Software", b"Disclaimer", b"Warning", b"Source", b"Comment"]
-            keyword = random.choice(keywords)
+            keyword = self.rng.choice(keywords)
             null_sep1 = b'\x00'
-            compression_flag = random.choice([b'\x00', b'\x01']) 
+            compression_flag = self.rng.choice([b'\x00', b'\x01']) 
             compression_method = b'\x00' 
             
             lang_tags = [b"en", b"en-US", b"fr-CA", b"ja", b""]
-            language_tag = random.choice(lang_tags)
+            language_tag = self.rng.choice(lang_tags)
             null_sep2 = b'\x00'
             
             translated_keyword_text = f"{keyword.decode('latin-1')} ({language_tag.decode('latin-1') if language_tag else 'universal'})"
             translated_keyword = translated_keyword_text.encode('utf-8')[:79] 
             null_sep3 = b'\x00'
             
-            text_content = f"UTF-8 text for {keyword.decode('latin-1')}: Some random international characters like éàçüö € and a number {random.randint(1,1000)}.".encode('utf-8')
+            text_content = f"UTF-8 text for {keyword.decode('latin-1')}: Some random international characters like éàçüö € and a number {self.rng.randint(1,1000)}.".encode('utf-8')
             
             if compression_flag == b'\x01':
-                text_to_process = zlib.compress(text_content)
+                text_to_process = compress_with_profile(text_content, self.compression_profile)
             else:
                 text_to_process = text_content
             
@@ -493,7 +606,7 @@ class PNG:
         chunk_type = b'gAMA'
         chunk_data = None
         if validity_code == 0: 
-            gamma_value_scaled = random.randint(50000, 300000) 
+            gamma_value_scaled = self.rng.randint(50000, 300000) 
             chunk_data = struct.pack('>I', gamma_value_scaled) 
         elif validity_code == 1: 
             chunk_data = struct.pack('>H', 22000) 
@@ -520,7 +633,7 @@ class PNG:
         chunk_type = b'dSIG'
         chunk_data = None
         if validity_code == 0: 
-            chunk_data = bytes([random.randint(0,255) for _ in range(random.randint(16,128))])
+            chunk_data = self.entropy.bytes(self.rng.randint(16,128))
         elif validity_code == 1: 
             chunk_data = b'' 
         else:
@@ -532,7 +645,7 @@ class PNG:
         chunk_type = b'cHRM'
         chunk_data = None
         if validity_code == 0: 
-            values = [random.randint(0, 70000) for _ in range(8)] 
+            values = [self.rng.randint(0, 70000) for _ in range(8)] 
             chunk_data = struct.pack('>IIIIIIII', *values)
         elif validity_code == 1: 
             chunk_data = struct.pack('>IIIIIII', 31270, 32900, 64000, 33000, 30000, 60000, 15000) 
@@ -545,10 +658,10 @@ class PNG:
         chunk_type = b'cICP'
         chunk_data = None
         if validity_code == 0: 
-            colour_primaries = random.randint(1,12) 
-            transfer_characteristics = random.randint(1,18) 
-            matrix_coefficients = random.randint(0,12) 
-            video_full_range_flag = random.choice([0,1]) 
+            colour_primaries = self.rng.randint(1,12) 
+            transfer_characteristics = self.rng.randint(1,18) 
+            matrix_coefficients = self.rng.randint(0,12) 
+            video_full_range_flag = self.rng.choice([0,1]) 
             chunk_data = struct.pack('>BBBB', colour_primaries, transfer_characteristics, matrix_coefficients, video_full_range_flag)
         elif validity_code == 1: 
             chunk_data = struct.pack('>BBB', 1, 1, 1) 
@@ -566,20 +679,20 @@ class PNG:
         if validity_code == 0:  
             if self.color_type == 0 or self.color_type == 4:  
                 max_val_bd = (1 << self.bit_depth) -1
-                gray_sample = random.randint(0, max_val_bd)
+                gray_sample = self.rng.randint(0, max_val_bd)
                 chunk_data = struct.pack('>H', gray_sample) 
             elif self.color_type == 2 or self.color_type == 6: 
                 max_val_bd = (1 << self.bit_depth) -1
-                red_sample = random.randint(0, max_val_bd)
-                green_sample = random.randint(0, max_val_bd)
-                blue_sample = random.randint(0, max_val_bd)
+                red_sample = self.rng.randint(0, max_val_bd)
+                green_sample = self.rng.randint(0, max_val_bd)
+                blue_sample = self.rng.randint(0, max_val_bd)
                 chunk_data = struct.pack('>HHH', red_sample, green_sample, blue_sample) 
             elif self.color_type == 3: 
                 if not self.plte_chunk_present or self.num_plte_entries == 0:
                     return
                 palette_index = 0 
                 if self.num_plte_entries > 0:
-                    palette_index = random.randint(0, self.num_plte_entries - 1)
+                    palette_index = self.rng.randint(0, self.num_plte_entries - 1)
                 chunk_data = struct.pack('>B', palette_index) 
             else:
                 return
@@ -598,43 +711,27 @@ class PNG:
         chunk_type = b'IDAT'
         chunk_data = None
         if validity_code == 0: 
-            bytes_per_pixel_approx = 1
-            if self.color_type == 0: 
-                bytes_per_pixel_approx = (self.bit_depth + 7) // 8
-            elif self.color_type == 2: 
-                bytes_per_pixel_approx = 3 * ((self.bit_depth + 7) // 8)
-            elif self.color_type == 3: 
-                 pass 
-            elif self.color_type == 4: 
-                bytes_per_pixel_approx = 2 * ((self.bit_depth + 7) // 8)
-            elif self.color_type == 6: 
-                bytes_per_pixel_approx = 4 * ((self.bit_depth + 7) // 8)
-
-            if self.color_type == 3 : 
-                 scanline_payload_size = (self.width * self.bit_depth + 7) // 8
+            # self.pixels 保留生成时想要的样本值 (按行排列)，供差分测试对照解码结果
+            sample_count = self.width * self.height * CHANNELS[self.color_type]
+            if not self.random_pixels:
+                self.pixels = array('H', bytes(2 * sample_count))
+            elif self.color_type == 3:
+                entries = max(1, self.num_plte_entries)
+                self.pixels = array('H', (value % entries for value in self.entropy.uint8(sample_count)))
+            elif self.bit_depth == 16:
+                self.pixels = self.entropy.uint16be(sample_count)
             else:
-                 scanline_payload_size = self.width * bytes_per_pixel_approx
-            
-            if scanline_payload_size == 0 and self.width > 0 : 
-                scanline_payload_size = 1
+                mask = (1 << self.bit_depth) - 1
+                self.pixels = array('H', (value & mask for value in self.entropy.uint8(sample_count)))
 
-            raw_scanline_payload = b'\x00' * scanline_payload_size 
-            
-            uncompressed_image_data = b''
-            for _ in range(self.height):
-                uncompressed_image_data += b'\x00' 
-                uncompressed_image_data += raw_scanline_payload
+            uncompressed_image_data = encode_scanlines(self.pixels, self.width, self.height, self.color_type,
+                                                       self.bit_depth, self.interlace, self.filter_types)
             
             if not uncompressed_image_data: 
                 uncompressed_image_data = b'\x00' 
 
-            try:
-                chunk_data = zlib.compress(uncompressed_image_data, wbits=-zlib.MAX_WBITS)
-            except AttributeError: 
-                chunk_data = zlib.compress(uncompressed_image_data, wbits=-15)
-            except zlib.error as e:
-                print(f"Zlib compression error for IDAT: {e}. Data: {uncompressed_image_data!r}")
-                chunk_data = b"zlib_error_placeholder" 
+            # IDAT 必须是带 zlib 头的数据流 (不是 raw deflate)
+            chunk_data = compress_with_profile(uncompressed_image_data, self.compression_profile)
         
         elif validity_code == 1: 
             chunk_data = b"This is not valid DEFLATE data for IDAT."
@@ -657,30 +754,134 @@ class PNG:
         if chunk_data is not None:
              self.data += self._create_chunk(chunk_type, chunk_data)
 
-if __name__ == '__main__':
-    critical_chunk_names = ['IHDR', 'PLTE', 'IDAT', 'IEND']
-    ancillary_chunk_names = [
-        'sBIT', 'gAMA', 'cHRM', 'sRGB', 'cICP', 'eXIf', 'iCCP', 'sPLT', 
-        'hIST', 'tRNS', 'bKGD', 'pHYs', 'sTER', 'tEXt', 'zTXt', 'iTXt', 'tIME', 'dSIG' 
-    ]
-    # create directory to save seeds
-    if not os.path.exists(randPNG_save_path):
-        os.mkdir(randPNG_save_path)
-        print(f'Creating directory {randPNG_save_path} to save random seeds')
-    # remove files in the path if any
-    for f in glob.glob(f'{randPNG_save_path}/*'):
+critical_chunk_names = ['IHDR', 'PLTE', 'IDAT', 'IEND']
+ancillary_chunk_names = list(PNG.known_ancillary_chunks_before_plte + PNG.known_ancillary_chunks_after_plte)
+
+def generate_seed(job):
+    """
+    生成一个种子。job = (base_seed, seed_number, compression_profile 参数, profile, trace)。
+    每个种子使用由 (base_seed, seed_number) 派生的独立随机数来源，
+    因此结果与生成顺序、worker 数量无关。
+    """
+    base_seed, seed_number, compression_arg, profile, trace = job
+    rng = (CountingRandom if profile else random.Random)(f'{base_seed}:{seed_number}')
+    random_crit_config = {name: rng.choice([0, 1]) for name in critical_chunk_names}
+    random_anc_config = {name: rng.choice([0, 1, 2]) for name in ancillary_chunk_names}
+    if compression_arg == 'random':
+        compression_profile = rng.choice(compression_profile_sweep())
+    elif compression_arg == 'sweep':
+        presets = compression_profile_sweep()
+        compression_profile = presets[seed_number % len(presets)]
+    else:
+        compression_profile = parse_compression_profile(compression_arg)
+
+    profiler = GenerationProfiler(trace=trace) if profile else None
+    generated_png = PNG(critical_chunk_config=random_crit_config, ancillary_chunk_config=random_anc_config,
+                        compression_profile=compression_profile, rng=rng, profiler=profiler)
+
+    # 文件名含种子编号，相同配置的种子不会互相覆盖
+    output_filename = (f"randPNG_{seed_number:06d}_"
+                       + "".join(str(value) for value in random_crit_config.values()) + "-"
+                       + "".join(str(value) for value in random_anc_config.values()) + ".png")
+    return {
+        'file': output_filename,
+        'data': generated_png.data,
+        'critical': random_crit_config,
+        'ancillary': random_anc_config,
+        'compression_profile': compression_profile.name,
+        'profile_stats': profiler.stats if profiler else None,
+        'trace_events': profiler.trace_events if profiler else None,
+    }
+
+def manifest_record(result):
+    """manifest.jsonl 中一个种子的记录。"""
+    return {
+        'file': result['file'],
+        'critical': result['critical'],
+        'ancillary': result['ancillary'],
+        'compression_profile': result['compression_profile'],
+    }
+
+def clear_output_dir(save_path):
+    """创建输出目录，或删除其中已有的文件。"""
+    if not os.path.exists(save_path):
+        os.mkdir(save_path)
+        print(f'Creating directory {save_path} to save random seeds')
+    for f in glob.glob(f'{save_path}/*'):
         os.remove(f)
-    print(f'Saving seeds to {randPNG_save_path}')
-    for _ in range(10):
-        random_crit_config = {name: random.choice([0, 1]) for name in critical_chunk_names}
-        random_anc_config = {name: random.choice([0, 1, 2]) for name in ancillary_chunk_names}
-
-        generated_png = PNG(critical_chunk_config=random_crit_config, ancillary_chunk_config=random_anc_config)
 
-        output_filename = "randPNG_"+"".join(str(value) for value in random_crit_config.values())+"-"+"".join(str(value) for value in random_anc_config.values())+".png"
+def main():
+    parser = argparse.ArgumentParser(description='Generate random PNG seeds.')
+    parser.add_argument('-n', '--count', type=int, default=10, help='number of seeds to generate')
+    parser.add_argument('-o', '--output', default=randPNG_save_path, help='directory to save seeds')
+    parser.add_argument('--seed', type=int, default=None, help='base random seed')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--compression-profile', default='default',
+                        help="zlib profile such as 'l9-rle-w12-s4096'; "
+                             "'random' picks one per seed, 'sweep' cycles through the presets")
+    parser.add_argument('--index', default=None,
+                        help='SQLite index of seed metadata (default: OUTPUT/index.sqlite)')
+    parser.add_argument('--no-index', action='store_true', help='do not write the SQLite index')
+    parser.add_argument('--profile', action='store_true',
+                        help='record per-chunk generation cost and print a summary table')
+    parser.add_argument('--profile-json', default=None,
+                        help='also write the profile as a Chrome trace JSON file (implies --profile)')
+    args = parser.parse_args()
+
+    if args.compression_profile not in ('random', 'sweep'):
         try:
-            with open(f'{randPNG_save_path}/{output_filename}', "wb") as f:
-                f.write(generated_png.data)
+            parse_compression_profile(args.compression_profile)
+        except ValueError as e:
+            parser.error(str(e))
+    base_seed = args.seed if args.seed is not None else random.randrange(1 << 32)
+    profile = args.profile or args.profile_json is not None
+    save_path = args.output
+    clear_output_dir(save_path)
+    print(f'Saving seeds to {save_path} (base seed {base_seed})')
+    # one JSON object per seed: file name, chunk configs and compression profile
+    manifest = open(os.path.join(save_path, 'manifest.jsonl'), 'w')
+    index = None
+    if not args.no_index:
+        index = SeedIndex(args.index or os.path.join(save_path, 'index.sqlite'))
+    profiler = GenerationProfiler(trace=args.profile_json is not None) if profile else None
+
+    jobs = ((base_seed, seed_number, args.compression_profile, profile, args.profile_json is not None)
+            for seed_number in range(args.count))
+    pool = None
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs)
+        results = pool.imap(generate_seed, jobs, chunksize=64)
+    else:
+        results = map(generate_seed, jobs)
+    for result in results:
+        output_filename = result['file']
+        try:
+            with open(f'{save_path}/{output_filename}', "wb") as f:
+                f.write(result['data'])
             print(f"\nSave as '{output_filename}'")
         except IOError as e:
             print(f"\nFail to save '{output_filename}' {e}")
+            continue
+        manifest.write(json.dumps(manifest_record(result)) + '\n')
+        if index is not None:
+            index.add(seed_record(output_filename, result['data'], result['critical'], result['ancillary'],
+                                  result['compression_profile']))
+        if profiler is not None:
+            profiler.merge(result['profile_stats'], result['trace_events'])
+    if pool is not None:
+        pool.close()
+        pool.join()
+    manifest.close()
+    if index is not None:
+        index.close()
+
+    if profiler is not None:
+        print()
+        print(profiler.summary_table())
+    if args.profile_json:
+        with open(args.profile_json, 'w') as f:
+            json.dump(profiler.chrome_trace(), f)
+        print(f"Profile written to {args.profile_json}")
+
+if __name__ == '__main__':
+    main()
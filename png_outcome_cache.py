@@ -0,0 +1,324 @@
+"""
+缓存语料验证中每个种子的解码结果，键为 (种子内容的 SHA-256, libpng 构建标识)。
+构建标识是库版本号、库文件与 pnglibconf.h 内容 (库旁边有时) 的哈希 (libpng_ctypes.build_identity)，
+所以只有新种子、或换了库/配置选项之后的种子才需要重新解码。
+
+    python png_outcome_cache.py run randPNG_seeds contrib/pngsuite -j 8
+    python png_outcome_cache.py builds
+    python png_outcome_cache.py diff 3f9c 81ab        # 两个构建 (可用前缀) 的结果差异
+"""
+import argparse
+import collections
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+
+# 共享的生成工具位于 contrib/oss-fuzz/png_generator
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'contrib', 'oss-fuzz', 'png_generator'))
+from libpng_ctypes import (LibPNGShim, build_identity, build_shim, find_libpng, loaded_library_path, parse_transforms,
+                           pnglibconf_path)
+from png_generator_utils import iter_files
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    build TEXT PRIMARY KEY,
+    library TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    pnglibconf TEXT NOT NULL,
+    first_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outcomes (
+    sha256 TEXT NOT NULL,
+    build TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    message TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    peak_memory INTEGER NOT NULL,
+    pixels_sha256 TEXT,
+    PRIMARY KEY (sha256, build)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS seed_names (
+    sha256 TEXT PRIMARY KEY,
+    file TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS outcomes_build ON outcomes (build, sha256);
+"""
+
+# 解码结果
+OK = 'ok'
+END_ERROR = 'end_error'  # 像素有效，png_read_end 出错
+ERROR = 'error'
+
+class OutcomeCache:
+    """
+    解码结果的 SQLite 缓存。
+    add() 先缓存记录，每 batch_size 条在一个事务里批量写入。
+    """
+    def __init__(self, path, batch_size=500):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = []
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+
+    def add_build(self, build, library, version, pnglibconf):
+        with self._conn:
+            self._conn.execute('INSERT OR IGNORE INTO builds VALUES (?, ?, ?, ?, ?)',
+                               (build, library, version, pnglibconf, time.time()))
+
+    def builds(self):
+        """[(构建标识, 库路径, 版本号, pnglibconf.h 路径 (没有时为空), 首次使用时间, 结果数), ...]，按首次使用排序。"""
+        self.flush()
+        return self._conn.execute(
+            'SELECT b.build, b.library, b.version, b.pnglibconf, b.first_seen, '
+            '(SELECT COUNT(*) FROM outcomes o WHERE o.build = b.build) '
+            'FROM builds b ORDER BY b.first_seen').fetchall()
+
+    def resolve_build(self, prefix):
+        """由构建标识的前缀得到完整标识；'latest'/'previous' 表示最近/倒数第二个构建。"""
+        builds = [row[0] for row in self.builds()]
+        if prefix in ('latest', 'previous'):
+            index = -1 if prefix == 'latest' else -2
+            if len(builds) < -index:
+                raise ValueError(f"no {prefix} build in the cache")
+            return builds[index]
+        matches = [build for build in builds if build.startswith(prefix)]
+        if len(matches) != 1:
+            raise ValueError(f"build '{prefix}' matches {len(matches)} builds in the cache")
+        return matches[0]
+
+    def cached(self, build, hashes):
+        """hashes 中已有该构建结果的种子哈希集合。"""
+        self.flush()
+        found = set()
+        hashes = list(hashes)
+        for start in range(0, len(hashes), 500):
+            part = hashes[start:start + 500]
+            sql = f"SELECT sha256 FROM outcomes WHERE build = ? AND sha256 IN ({','.join('?' * len(part))})"
+            found.update(row[0] for row in self._conn.execute(sql, [build] + part))
+        return found
+
+    def add(self, record):
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        records, self._pending = self._pending, []
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO outcomes VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(r['sha256'], r['build'], r['outcome'], r['message'], r['seconds'], r['peak_memory'],
+                  r['pixels_sha256']) for r in records])
+            self._conn.executemany('INSERT OR REPLACE INTO seed_names VALUES (?, ?)',
+                                   [(r['sha256'], r['file']) for r in records])
+
+    def outcomes(self, build, hashes=None):
+        """{种子哈希: 结果记录}；hashes 为 None 时返回该构建的全部结果。"""
+        self.flush()
+        sql = ('SELECT o.sha256, o.outcome, o.message, o.seconds, o.peak_memory, o.pixels_sha256, n.file '
+               'FROM outcomes o LEFT JOIN seed_names n ON n.sha256 = o.sha256 WHERE o.build = ?')
+        results = {}
+        for sha256, outcome, message, seconds, peak, pixels, file in self._conn.execute(sql, (build,)):
+            if hashes is None or sha256 in hashes:
+                results[sha256] = {'sha256': sha256, 'build': build, 'outcome': outcome, 'message': message,
+                                   'seconds': seconds, 'peak_memory': peak, 'pixels_sha256': pixels, 'file': file}
+        return results
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def diff_builds(cache, old_build, new_build, memory_threshold=1.5):
+    """
+    比较两个构建都解码过的种子，返回报告 dict：
+    结果或错误信息不同的种子、像素不同的种子、内存峰值增长超过 memory_threshold 倍的种子，
+    以及总解码耗时与内存峰值的变化。
+    """
+    old = cache.outcomes(old_build)
+    new = cache.outcomes(new_build)
+    common = sorted(old.keys() & new.keys())
+    report = {
+        'old_build': old_build,
+        'new_build': new_build,
+        'common': len(common),
+        'only_old': len(old.keys() - new.keys()),
+        'only_new': len(new.keys() - old.keys()),
+        'outcome_changed': [],
+        'message_changed': [],
+        'pixels_changed': [],
+        'memory_grew': [],
+        'transitions': collections.Counter(),
+    }
+    old_seconds = new_seconds = 0.0
+    old_memory = new_memory = 0
+    for sha256 in common:
+        a, b = old[sha256], new[sha256]
+        name = b['file'] or sha256
+        report['transitions'][f"{a['outcome']} -> {b['outcome']}"] += 1
+        old_seconds += a['seconds']
+        new_seconds += b['seconds']
+        old_memory += a['peak_memory']
+        new_memory += b['peak_memory']
+        if a['outcome'] != b['outcome']:
+            report['outcome_changed'].append((name, a['outcome'], b['outcome'], a['message'], b['message']))
+        elif a['message'] != b['message']:
+            report['message_changed'].append((name, a['message'], b['message']))
+        if a['outcome'] != ERROR and b['outcome'] != ERROR and a['pixels_sha256'] != b['pixels_sha256']:
+            report['pixels_changed'].append(name)
+        if a['peak_memory'] and b['peak_memory'] > a['peak_memory'] * memory_threshold:
+            report['memory_grew'].append((name, a['peak_memory'], b['peak_memory']))
+    report['seconds'] = (old_seconds, new_seconds)
+    report['peak_memory'] = (old_memory, new_memory)
+    return report
+
+def print_diff(report, show):
+    old_seconds, new_seconds = report['seconds']
+    old_memory, new_memory = report['peak_memory']
+    print(f"{report['old_build']} -> {report['new_build']}: {report['common']} seeds in both, "
+          f"{report['only_old']} only in the old build, {report['only_new']} only in the new build")
+    if report['common']:
+        print(f"decode time {old_seconds:.2f}s -> {new_seconds:.2f}s "
+              f"({new_seconds / old_seconds if old_seconds else 0:.2f}x), "
+              f"summed peak memory {old_memory / 1e6:.1f} -> {new_memory / 1e6:.1f} MB")
+    for transition, count in sorted(report['transitions'].items()):
+        print(f'  {transition}: {count}')
+    sections = [
+        ('outcome changed', report['outcome_changed'],
+         lambda r: f"{r[0]}: {r[1]} -> {r[2]} ({r[3] or '-'} | {r[4] or '-'})"),
+        ('error message changed', report['message_changed'], lambda r: f"{r[0]}: {r[1]} | {r[2]}"),
+        ('pixels changed', report['pixels_changed'], lambda r: r),
+        ('peak memory grew', report['memory_grew'], lambda r: f"{r[0]}: {r[1]} -> {r[2]} bytes"),
+    ]
+    for title, rows, format_row in sections:
+        if not rows:
+            continue
+        print(f'{title} ({len(rows)}):')
+        for row in rows[:show]:
+            print(f'  {format_row(row)}')
+        if len(rows) > show:
+            print(f'  ... and {len(rows) - show} more')
+
+_shim = None
+_build = None
+_raw = parse_transforms('packing')
+
+def _init_worker(libpng_path, build):
+    global _shim, _build
+    _shim = LibPNGShim(libpng_path)
+    _build = build
+
+def decode_outcome(job):
+    """解码一个种子 (与 LibPNGShim.decode_raw 相同，不做颜色变换)，返回结果记录。"""
+    sha256, path = job
+    with open(path, 'rb') as f:
+        data = f.read()
+    start = time.perf_counter()
+    result = _shim.decode_transformed(data, _raw, keep_pixels=True)
+    seconds = time.perf_counter() - start
+    if result.pixels is None:
+        outcome = ERROR
+    else:
+        outcome = END_ERROR if result.end_error else OK
+    return {
+        'sha256': sha256,
+        'build': _build,
+        'file': path,
+        'outcome': outcome,
+        'message': result.message,
+        'seconds': seconds,
+        'peak_memory': result.peak_memory,
+        'pixels_sha256': hashlib.sha256(result.pixels).hexdigest() if result.pixels is not None else None,
+    }
+
+def _hash_file(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest(), path
+
+def run(cache, paths, libpng_path, jobs, force=False):
+    """验证 paths 下的种子：已缓存的直接取出，其余的并行解码后写入缓存。返回 (构建标识, 结果列表, 解码个数)。"""
+    build = build_identity(libpng_path)
+    build_shim(libpng_path)  # 先在主进程编译好，worker 直接载入缓存
+    cache.add_build(build, os.path.abspath(loaded_library_path(libpng_path)),
+                    LibPNGShim(libpng_path).version(), pnglibconf_path(libpng_path) or '')
+    with multiprocessing.Pool(jobs, initializer=_init_worker, initargs=(libpng_path, build)) as pool:
+        seeds = dict(pool.imap(_hash_file, iter_files(paths), chunksize=64))
+        hits = set() if force else cache.cached(build, seeds)
+        misses = [(sha256, path) for sha256, path in seeds.items() if sha256 not in hits]
+        for record in pool.imap_unordered(decode_outcome, misses, chunksize=16):
+            cache.add(record)
+    results = cache.outcomes(build, seeds.keys())
+    for sha256, path in seeds.items():
+        results[sha256]['file'] = path
+    return build, list(results.values()), len(misses)
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate seeds against libpng, reusing cached decode outcomes.')
+    parser.add_argument('--cache', default='outcomes.sqlite', help='cache database (default: outcomes.sqlite)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='decode the seeds that have no cached outcome for this build')
+    run_parser.add_argument('paths', nargs='+', help='PNG files or directories (searched recursively)')
+    run_parser.add_argument('--libpng', default=None, help='path to the libpng shared library')
+    run_parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of worker processes')
+    run_parser.add_argument('--force', action='store_true', help='decode every seed again')
+    run_parser.add_argument('--report', default=None, help='write one JSON outcome per seed to this file')
+
+    sub.add_parser('builds', help='list the builds in the cache')
+
+    diff = sub.add_parser('diff', help='compare the outcomes of two builds')
+    diff.add_argument('old', nargs='?', default='previous', help="build id or prefix (default: previous)")
+    diff.add_argument('new', nargs='?', default='latest', help="build id or prefix (default: latest)")
+    diff.add_argument('--memory-threshold', type=float, default=1.5,
+                      help='report seeds whose peak memory grew by this factor (default: 1.5)')
+    diff.add_argument('--show', type=int, default=20, help='seeds to print per section')
+    diff.add_argument('--json', default=None, help='also write the report to this file')
+    args = parser.parse_args()
+
+    with OutcomeCache(args.cache) as cache:
+        if args.command == 'builds':
+            for build, library, version, config, first_seen, count in cache.builds():
+                print(f"{build}  libpng {version}  {count:>8} outcomes  "
+                      f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(first_seen))}  {library} ({config or 'no pnglibconf.h'})")
+            return
+        if args.command == 'diff':
+            try:
+                report = diff_builds(cache, cache.resolve_build(args.old), cache.resolve_build(args.new),
+                                     args.memory_threshold)
+            except ValueError as e:
+                parser.error(str(e))
+            print_diff(report, args.show)
+            if args.json:
+                with open(args.json, 'w') as f:
+                    json.dump(report, f, indent=2)
+            return
+
+        libpng_path = find_libpng(args.libpng)
+        start = time.perf_counter()
+        build, results, decoded = run(cache, args.paths, libpng_path, args.jobs, args.force)
+    elapsed = time.perf_counter() - start
+    counts = collections.Counter(record['outcome'] for record in results)
+    print(f"{len(results)} seeds under build {build}: {len(results) - decoded} cached, {decoded} decoded "
+          f"in {elapsed:.1f}s; " + ', '.join(f'{outcome} {count}' for outcome, count in counts.most_common()))
+    if args.report:
+        with open(args.report, 'w') as f:
+            for record in sorted(results, key=lambda record: record['file']):
+                f.write(json.dumps(record) + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seeds (
+    file TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    color_type INTEGER,
+    bit_depth INTEGER,
+    width INTEGER,
+    height INTEGER,
+    chunks TEXT NOT NULL,
+    compression_profile TEXT
+);
+CREATE TABLE IF NOT EXISTS seed_chunks (
+    file TEXT NOT NULL,
+    chunk TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (file, chunk)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS seed_validity (
+    file TEXT NOT NULL,
+    chunk TEXT NOT NULL,
+    code INTEGER NOT NULL,
+    PRIMARY KEY (file, chunk)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS seeds_format ON seeds (color_type, bit_depth);
+CREATE INDEX IF NOT EXISTS seeds_sha256 ON seeds (sha256);
+CREATE INDEX IF NOT EXISTS seed_chunks_chunk ON seed_chunks (chunk, file);
+CREATE INDEX IF NOT EXISTS seed_validity_code ON seed_validity (chunk, code, file);
+"""
+
+def parse_chunk_list(data):
+    """返回 (数据块类型列表, IHDR 字段或 None)；遇到截断的数据块时停止。"""
+    chunks = []
+    ihdr = None
+    pos = 8
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+        chunk_type = chunk_type.decode('latin-1')
+        chunks.append(chunk_type)
+        if chunk_type == 'IHDR' and ihdr is None and length >= 13 and pos + 21 <= len(data):
+            width, height, bit_depth, color_type = struct.unpack('>IIBB', data[pos + 8:pos + 18])
+            ihdr = {'width': width, 'height': height, 'bit_depth': bit_depth, 'color_type': color_type}
+        pos += 12 + length
+    return chunks, ihdr
+
+def seed_record(file, data, critical=None, ancillary=None, compression_profile=None):
+    """由种子文件内容和生成配置得到一条索引记录。"""
+    chunks, ihdr = parse_chunk_list(data)
+    ihdr = ihdr or {}
+    validity = {}
+    validity.update(critical or {})
+    validity.update(ancillary or {})
+    return {
+        'file': file,
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'size': len(data),
+        'color_type': ihdr.get('color_type'),
+        'bit_depth': ihdr.get('bit_depth'),
+        'width': ihdr.get('width'),
+        'height': ihdr.get('height'),
+        'chunks': chunks,
+        'compression_profile': compression_profile,
+        'validity': validity,
+    }
+
+class SeedIndex:
+    """
+    种子元数据的 SQLite 索引。
+    add() 先缓存记录，每 batch_size 条在一个事务里批量写入。
+    """
+    def __init__(self, path, batch_size=500):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = []
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+
+    def add(self, record):
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        records, self._pending = self._pending, []
+        files = [(r['file'],) for r in records]
+        chunk_rows = []
+        for r in records:
+            counts = {}
+            for chunk in r['chunks']:
+                counts[chunk] = counts.get(chunk, 0) + 1
+            chunk_rows += [(r['file'], chunk, count) for chunk, count in counts.items()]
+        with self._conn:
+            # 同名文件会被覆盖，旧的数据块/合法性记录一并删除
+            self._conn.executemany('DELETE FROM seed_chunks WHERE file = ?', files)
+            self._conn.executemany('DELETE FROM seed_validity WHERE file = ?', files)
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO seeds VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(r['file'], r['sha256'], r['size'], r['color_type'], r['bit_depth'], r['width'],
+                  r['height'], ','.join(r['chunks']), r['compression_profile']) for r in records])
+            self._conn.executemany('INSERT INTO seed_chunks VALUES (?, ?, ?)', chunk_rows)
+            self._conn.executemany(
+                'INSERT INTO seed_validity VALUES (?, ?, ?)',
+                [(r['file'], chunk, code) for r in records for chunk, code in r['validity'].items()])
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def query(self, color_type=None, bit_depth=None, has_chunks=(), without_chunks=(),
+              validity=(), where=None, limit=None):
+        """
+        按条件查询种子文件名。
+        has_chunks/without_chunks: 必须包含/不能包含的数据块类型
+        validity: (数据块名, 合法性代码) 列表，0 合法 1 非法 2 未使用
+        where: 附加的 SQL 条件 (作用于 seeds 表)
+        """
+        self.flush()
+        sql = 'SELECT file FROM seeds WHERE 1'
+        params = []
+        if color_type is not None:
+            sql += ' AND color_type = ?'
+            params.append(color_type)
+        if bit_depth is not None:
+            sql += ' AND bit_depth = ?'
+            params.append(bit_depth)
+        for chunk in has_chunks:
+            sql += ' AND file IN (SELECT file FROM seed_chunks WHERE chunk = ?)'
+            params.append(chunk)
+        for chunk in without_chunks:
+            sql += ' AND file NOT IN (SELECT file FROM seed_chunks WHERE chunk = ?)'
+            params.append(chunk)
+        for chunk, code in validity:
+            sql += ' AND file IN (SELECT file FROM seed_validity WHERE chunk = ? AND code = ?)'
+            params += [chunk, code]
+        if where:
+            sql += f' AND ({where})'
+        sql += ' ORDER BY file'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [row[0] for row in self._conn.execute(sql, params)]
+
+def materialize(files, seed_dir, output_dir):
+    """把查询结果放进一个新的语料目录，能硬链接时不复制。"""
+    os.makedirs(output_dir, exist_ok=True)
+    for file in files:
+        src = os.path.join(seed_dir, file)
+        dst = os.path.join(output_dir, file)
+        if os.path.exists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+def rebuild_index(index_path, seed_dir):
+    """根据 manifest.jsonl 与种子文件重建索引 (用于旧的种子目录)。"""
+    count = 0
+    with SeedIndex(index_path) as index, open(os.path.join(seed_dir, 'manifest.jsonl')) as manifest:
+        for line in manifest:
+            entry = json.loads(line)
+            path = os.path.join(seed_dir, entry['file'])
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            index.add(seed_record(entry['file'], data, entry.get('critical'), entry.get('ancillary'),
+                                  entry.get('compression_profile')))
+            count += 1
+    return count
+
+def _validity_arg(text):
+    chunk, sep, code = text.partition('=')
+    if not sep or code not in ('0', '1', '2'):
+        raise argparse.ArgumentTypeError(f"expected CHUNK=0|1|2, got '{text}'")
+    return chunk, int(code)
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the SQLite index of generated PNG seeds.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    query = sub.add_parser('query', help='select seeds and optionally copy them into a corpus directory')
+    query.add_argument('index', help='index database (e.g. randPNG_seeds/index.sqlite)')
+    query.add_argument('--seeds', default=None, help='seed directory (default: the directory of the index)')
+    query.add_argument('--color-type', type=int, default=None)
+    query.add_argument('--bit-depth', type=int, default=None)
+    query.add_argument('--has', dest='has_chunks', action='append', default=[], metavar='CHUNK',
+                       help='seed must contain this chunk type (repeatable)')
+    query.add_argument('--without', dest='without_chunks', action='append', default=[], metavar='CHUNK',
+                       help='seed must not contain this chunk type (repeatable)')
+    query.add_argument('--validity', action='append', default=[], type=_validity_arg, metavar='CHUNK=CODE',
+                       help='generator validity code: 0 legal, 1 illegal, 2 unused (repeatable)')
+    query.add_argument('--where', default=None, help='extra SQL condition on the seeds table')
+    query.add_argument('--limit', type=int, default=None)
+    query.add_argument('-o', '--output', default=None, help='materialize the matching seeds into this directory')
+
+    rebuild = sub.add_parser('rebuild', help='index an existing seed directory from its manifest.jsonl')
+    rebuild.add_argument('seeds', help='seed directory')
+    rebuild.add_argument('--index', default=None, help='index database (default: SEEDS/index.sqlite)')
+
+    args = parser.parse_args()
+    if args.command == 'rebuild':
+        index_path = args.index or os.path.join(args.seeds, 'index.sqlite')
+        print(f"Indexed {rebuild_index(index_path, args.seeds)} seeds into {index_path}")
+        return
+
+    if not os.path.exists(args.index):
+        parser.error(f"index not found: {args.index}")
+    seed_dir = args.seeds or os.path.dirname(os.path.abspath(args.index))
+    with SeedIndex(args.index) as index:
+        try:
+            files = index.query(color_type=args.color_type, bit_depth=args.bit_depth,
+                                has_chunks=args.has_chunks, without_chunks=args.without_chunks,
+                                validity=args.validity, where=args.where, limit=args.limit)
+        except sqlite3.Error as e:
+            parser.error(f"bad query: {e}")
+    if args.output:
+        materialize(files, seed_dir, args.output)
+        print(f"Materialized {len(files)} seeds into {args.output}", file=sys.stderr)
+    else:
+        for file in files:
+            print(file)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+# 共享的生成工具位于 contrib/oss-fuzz/png_generator
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'contrib', 'oss-fuzz', 'png_generator'))
+from png_generator1 import PNG
+from png_seed_index import SeedIndex, seed_record
+from png_generator_utils import VALID_BIT_DEPTHS, parse_compression_profile, parse_range, png_chunk, run_seed_jobs
+
+unknownPNG_save_path = 'unknownPNG_seeds'
+
+# 未知数据块的种类：(辅助块?, 可安全复制?)，对应类型名第 1、4 个字母的大小写
+CHUNK_KINDS = {
+    'ancillary-safe': (True, True),
+    'ancillary-unsafe': (True, False),
+    'critical-safe': (False, True),
+    'critical-unsafe': (False, False),
+}
+
+# 未知数据块可以放的位置，按在文件中的先后顺序排列
+PLACEMENTS = ('before_plte', 'after_plte', 'after_idat')
+
+_LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+def chunk_name(rng, kind, reserved_fault=False):
+    """
+    随机的私有数据块类型名。第 2 个字母小写 (私有位)，因此不会与 libpng 认识的公共数据块重名；
+    第 3 个字母按规范大写 (保留位)，reserved_fault 时故意用小写。
+    """
+    ancillary, safe_to_copy = CHUNK_KINDS[kind]
+    letters = [rng.choice(_LETTERS) for _ in range(4)]
+    letters[0] = letters[0] if ancillary else letters[0].upper()
+    letters[2] = letters[2] if reserved_fault else letters[2].upper()
+    letters[3] = letters[3] if safe_to_copy else letters[3].upper()
+    return ''.join(letters).encode('ascii')
+
+def plan_unknown_chunks(rng, count, payload, kinds, names, reserved_faults=0.0):
+    """
+    按文件中的先后顺序返回 count 个 (位置, 类型名, 种类, 数据长度)。类型名取自 names 个随机名字，
+    同名的数据块可以出现多次；数据长度在 payload 范围内随机。
+    """
+    pool = []
+    for _ in range(names):
+        kind = rng.choice(kinds)
+        pool.append((chunk_name(rng, kind, rng.random() < reserved_faults), kind))
+    plan = []
+    for _ in range(count):
+        name, kind = rng.choice(pool)
+        plan.append((rng.choice(PLACEMENTS), name, kind, rng.randint(*payload)))
+    plan.sort(key=lambda entry: PLACEMENTS.index(entry[0]))
+    return plan
+
+def generate_unknown_seed(job):
+    """
+    生成一个带大量私有/未知数据块的种子并直接写入文件，数据块的内容在写入时才生成，
+    内存占用只与单个数据块大小有关。
+    job = (base_seed, seed_number, 输出目录, 选项 dict)。返回 manifest 记录。
+    """
+    base_seed, seed_number, output_dir, options = job
+    rng = random.Random(f'{base_seed}:{seed_number}')
+    color_type = rng.choice(options['color_types'])
+    bit_depth = rng.choice(VALID_BIT_DEPTHS[color_type])
+    width, height = rng.randint(*options['width']), rng.randint(*options['height'])
+    count = rng.randint(*options['count'])
+    kinds = options['kinds']
+    if rng.random() >= options['critical']:
+        # 未知的关键数据块会让 libpng 报错，默认只在一部分种子里出现
+        kinds = [kind for kind in kinds if CHUNK_KINDS[kind][0]] or kinds
+    names = max(1, min(count, rng.randint(*options['names'])))
+    plan = plan_unknown_chunks(rng, count, options['payload'], kinds, names, options['reserved_faults'])
+    base = PNG.empty(color_type, bit_depth, options['compression_profile'], rng=rng,
+                     width=width, height=height, random_pixels=True)
+    name = f'unknownPNG_{seed_number:06d}_ct{color_type}-bd{bit_depth}-{width}x{height}-c{count}.png'
+    path = os.path.join(output_dir, name)
+    size = 0
+    kind_counts = dict.fromkeys(kinds, 0)
+    with open(path, 'wb') as f:
+        def write(chunk):
+            nonlocal size
+            f.write(chunk)
+            size += len(chunk)
+
+        def write_unknown(placement):
+            for chunk_placement, chunk_type, kind, length in plan:
+                if chunk_placement == placement:
+                    kind_counts[kind] += 1
+                    write(png_chunk(chunk_type, rng.randbytes(length)))
+
+        write(base.data)
+        write(base.chunk_bytes('IHDR'))
+        write_unknown('before_plte')
+        if base.plte_chunk_present:
+            write(base.chunk_bytes('PLTE'))
+        write_unknown('after_plte')
+        write(base.chunk_bytes('IDAT'))
+        write_unknown('after_idat')
+        write(base.chunk_bytes('IEND'))
+    return {
+        'file': name,
+        'size': size,
+        'chunks': count,
+        'names': names,
+        'payload_bytes': sum(entry[3] for entry in plan),
+        'kinds': kind_counts,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate seeds with many private/unknown chunks.')
+    parser.add_argument('-n', '--count', type=int, default=10, help='number of seeds to generate')
+    parser.add_argument('-o', '--output', default=unknownPNG_save_path, help='directory to save seeds')
+    parser.add_argument('--seed', type=int, default=None, help='base random seed')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--chunks', default='1-256',
+                        help="unknown chunks per seed, or range 'MIN-MAX' (default: 1-256)")
+    parser.add_argument('--payload', default='0-4096',
+                        help="data bytes per unknown chunk, or range 'MIN-MAX' (default: 0-4096)")
+    parser.add_argument('--names', default='1-16',
+                        help="distinct chunk names per seed, or range 'MIN-MAX' (default: 1-16)")
+    parser.add_argument('--kinds', default=','.join(CHUNK_KINDS),
+                        help=f"comma-separated chunk kinds ({', '.join(CHUNK_KINDS)})")
+    parser.add_argument('--critical', type=float, default=0.1,
+                        help='fraction of seeds that may also contain unknown critical chunks')
+    parser.add_argument('--reserved-faults', type=float, default=0.0,
+                        help='probability that a chunk name has the reserved bit set')
+    parser.add_argument('--width', default='1-64', help="image width, or range 'MIN-MAX' (default: 1-64)")
+    parser.add_argument('--height', default='1-64', help="image height, or range 'MIN-MAX' (default: 1-64)")
+    parser.add_argument('--color-types', default='0,2,3,4,6', help='comma-separated color types')
+    parser.add_argument('--compression-profile', default='default', help="zlib profile such as 'l9-rle-w12'")
+    parser.add_argument('--index', action='store_true', help='also write OUTPUT/index.sqlite')
+    args = parser.parse_args()
+
+    try:
+        compression_profile = parse_compression_profile(args.compression_profile)
+    except ValueError as e:
+        parser.error(str(e))
+    kinds = args.kinds.split(',')
+    for kind in kinds:
+        if kind not in CHUNK_KINDS:
+            parser.error(f"unknown chunk kind '{kind}'; choose from {', '.join(CHUNK_KINDS)}")
+    options = {
+        'count': parse_range(args.chunks),
+        'payload': parse_range(args.payload),
+        'names': parse_range(args.names),
+        'kinds': kinds,
+        'critical': args.critical,
+        'reserved_faults': args.reserved_faults,
+        'width': parse_range(args.width),
+        'height': parse_range(args.height),
+        'color_types': [int(value) for value in args.color_types.split(',')],
+        'compression_profile': compression_profile,
+    }
+    base_seed = args.seed if args.seed is not None else random.randrange(1 << 32)
+    os.makedirs(args.output, exist_ok=True)
+    print(f"Base seed: {base_seed}")
+
+    jobs = [(base_seed, number, args.output, options) for number in range(args.count)]
+    index = SeedIndex(os.path.join(args.output, 'index.sqlite')) if args.index else None
+    start = time.perf_counter()
+    total_chunks = total_size = 0
+    index_seed = None
+    if index is not None:
+        def index_seed(name, data):
+            index.add(seed_record(name, data, compression_profile=compression_profile.name))
+    for record in run_seed_jobs(generate_unknown_seed, jobs, args.output, args.jobs, index_seed):
+        total_chunks += record['chunks']
+        total_size += record['size']
+    if index is not None:
+        index.close()
+    elapsed = time.perf_counter() - start
+    print(f"Generated {args.count} seeds, {total_chunks} unknown chunks, {total_size / 1e6:.1f} MB "
+          f"in {elapsed:.1f}s in '{args.output}'")
+
+if __name__ == "__main__":
+    main()